@@ -3,6 +3,10 @@ ASGI config for Social project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server, e.g. ``uvicorn Social.asgi:application --workers 4``.
+The read endpoints under /app/async/ (app/async_views.py) then run on the
+event loop; the other endpoints still run in Django's thread pool.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
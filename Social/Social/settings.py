@@ -1,4 +1,5 @@
 from pathlib import Path
+from importlib.util import find_spec
 from decouple import config
 import os
 from datetime import timedelta
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.PerformanceMiddleware',  # first, so it times everything below it
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,18 +63,47 @@ WSGI_APPLICATION = 'Social.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 port_value = config('DB_PORT', default='3306').strip()
-print(f"DB_PORT: '{port_value}'")  # Add this print statement
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST', default='localhost'),
-        'PORT': int(port_value),  
-    }
+# DB_ENGINE=sqlite runs against a local SQLite file instead of MySQL (development, benchmarks).
+# DB_POOL=True borrows connections from an in-process pool of DB_POOL_SIZE per worker process
+# (see app/db/pool.py); otherwise connections persist for DB_CONN_MAX_AGE seconds.
+DB_ENGINE = config('DB_ENGINE', default='mysql')
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+_DB_BACKENDS = {
+    ('mysql', False): 'django.db.backends.mysql',
+    ('mysql', True): 'app.db.backends.mysql',
+    ('sqlite', False): 'django.db.backends.sqlite3',
+    ('sqlite', True): 'app.db.backends.sqlite3',
 }
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': _DB_BACKENDS[DB_ENGINE, DB_POOL],
+            'NAME': config('DB_NAME', default=os.path.join(BASE_DIR, 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': _DB_BACKENDS[DB_ENGINE, DB_POOL],
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD'),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': int(port_value),  
+        }
+    }
+DATABASES['default'].update({
+    # With the pool, Django returns the connection after every request and the pool keeps it open
+    'CONN_MAX_AGE': 0 if DB_POOL else config('DB_CONN_MAX_AGE', default=60, cast=int),
+    'CONN_HEALTH_CHECKS': True,  # ping a persistent connection before reusing it for a new request
+    'POOL': {
+        'MAX_SIZE': config('DB_POOL_SIZE', default=10, cast=int),
+        'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=int),  # seconds to wait for a free connection
+        'RECYCLE': config('DB_POOL_RECYCLE', default=3600, cast=int),  # seconds before a connection is reopened
+    },
+})
 SECRET_KEY = config('SECRET_KEY')
 
 
@@ -97,6 +128,24 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing (see app/hashers.py). New passwords use PASSWORD_HASHER ('argon2' needs the
+# argon2-cffi package); other stored hashes are rehashed with it on the user's next login.
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='argon2' if find_spec('argon2') else 'pbkdf2')
+ARGON2_TIME_COST = config('ARGON2_TIME_COST', default=2, cast=int)
+ARGON2_MEMORY_COST = config('ARGON2_MEMORY_COST', default=19456, cast=int)  # KiB
+ARGON2_PARALLELISM = config('ARGON2_PARALLELISM', default=1, cast=int)
+PBKDF2_ITERATIONS = config('PBKDF2_ITERATIONS', default=600000, cast=int)
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)  # concurrent hashes per process
+_PREFERRED_HASHERS = {
+    'argon2': ['app.hashers.TunedArgon2PasswordHasher', 'app.hashers.TunedPBKDF2PasswordHasher'],
+    'pbkdf2': ['app.hashers.TunedPBKDF2PasswordHasher', 'app.hashers.TunedArgon2PasswordHasher'],
+}
+PASSWORD_HASHERS = _PREFERRED_HASHERS[PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -133,11 +182,97 @@ AUTH_USER_MODEL = 'app.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'app.authentication.ClaimsJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'app.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Reverse proxies in front of the app. Client IPs for throttling come from X-Forwarded-For only
+    # past this many trusted hops; 0 uses REMOTE_ADDR, since a client can send any header it likes
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
+BLACKLIST_SYNC_INTERVAL = config('BLACKLIST_SYNC_INTERVAL', default=5, cast=int)  # seconds between refresh token blacklist top-ups
+BLACKLIST_RELOAD_INTERVAL = config('BLACKLIST_RELOAD_INTERVAL', default=3600, cast=int)  # seconds between full reloads that drop expired ids
+USER_CACHE_TTL = config('USER_CACHE_TTL', default=300, cast=int)  # seconds a lazily loaded user row stays cached
+OTP_TTL = config('OTP_TTL', default=600, cast=int)  # seconds an emailed passcode stays valid
+OTP_MAX_ATTEMPTS = config('OTP_MAX_ATTEMPTS', default=5, cast=int)  # wrong guesses before a passcode is rejected outright
+
+# Throttling of the auth endpoints (see app/throttling.py). The local store keeps buckets per process;
+# use app.throttling.CacheWindowStore with a shared cache (memcached/Redis) to limit across workers.
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool)
+THROTTLE_STORE = config('THROTTLE_STORE', default='app.throttling.LocalBucketStore')
+THROTTLE_CACHE = config('THROTTLE_CACHE', default='default')
+THROTTLE_RATES = {
+    'login': config('THROTTLE_LOGIN_RATE', default='10/min'),
+    'register': config('THROTTLE_REGISTER_RATE', default='5/hour'),
+    'verify_email': config('THROTTLE_VERIFY_EMAIL_RATE', default='5/min'),
+    'password_reset': config('THROTTLE_PASSWORD_RESET_RATE', default='3/hour'),
+    'resend_otp': config('THROTTLE_RESEND_OTP_RATE', default='3/hour'),
+}
+
+# Request metrics (see app/middleware.py), served to admins in Prometheus format at app/metrics/
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=False, cast=bool)  # add a Server-Timing header to responses
+METRICS_DUPLICATE_THRESHOLD = config('METRICS_DUPLICATE_THRESHOLD', default=5, cast=int)  # log requests repeating a query this often
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'app': {'handlers': ['console'], 'level': config('APP_LOG_LEVEL', default='INFO')},
+    },
+}
+
+# Keyset pagination for list endpoints (see app/pagination.py)
+PAGE_SIZE = config('PAGE_SIZE', default=20, cast=int)
+MAX_PAGE_SIZE = config('MAX_PAGE_SIZE', default=100, cast=int)
+STREAM_CHUNK_SIZE = config('STREAM_CHUNK_SIZE', default=500, cast=int)  # rows per fetch for ?stream=ndjson exports
+FAST_READ_PATH = config('FAST_READ_PATH', default=True, cast=bool)  # serve plain (non ?expand=) list pages through app.fastpath
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='social'),
+    }
+}
+CATEGORY_CACHE_TTL = config('CATEGORY_CACHE_TTL', default=30, cast=int)  # seconds the newest page of a category is cached
+OBJECT_CACHE_TTL = config('OBJECT_CACHE_TTL', default=300, cast=int)  # seconds a serialized post/profile/comment is cached
+
+# Post/comment search (see app/search.py); use app.search.MySQLFullTextBackend to search with MySQL FULLTEXT
+SEARCH_BACKEND = config('SEARCH_BACKEND', default='app.search.InvertedIndexBackend')
+SEARCH_INDEX_PATH = config('SEARCH_INDEX_PATH', default=os.path.join(BASE_DIR, 'search_index'))
+SEARCH_JOURNAL_MAX_BYTES = config('SEARCH_JOURNAL_MAX_BYTES', default=16 * 1024 * 1024, cast=int)  # folded into the snapshot past this size
+TEST_RUNNER = 'app.testing.TestRunner'  # keeps tests off SEARCH_INDEX_PATH
+
+# Home feed (see app/timeline.py)
+FEED_FANOUT_LIMIT = config('FEED_FANOUT_LIMIT', default=10000, cast=int)  # authors with more followers are merged at read time
+FEED_BACKFILL_SIZE = config('FEED_BACKFILL_SIZE', default=200, cast=int)  # posts copied into a feed on follow
+FEED_BATCH_SIZE = config('FEED_BATCH_SIZE', default=1000, cast=int)
+
+# Who-to-follow suggestions (see app/recommendations.py), recomputed by `manage.py refresh_suggestions`
+SUGGESTION_METHOD = config('SUGGESTION_METHOD', default='mutual')  # 'mutual' or 'adamic_adar'
+SUGGESTION_COUNT = config('SUGGESTION_COUNT', default=20, cast=int)  # suggestions stored per user
+SUGGESTION_HUB_DEGREE = config('SUGGESTION_HUB_DEGREE', default=5000, cast=int)  # followed accounts following more than this are ignored
+SUGGESTION_BATCH_SIZE = config('SUGGESTION_BATCH_SIZE', default=1000, cast=int)  # users recomputed per transaction
+
+COMMENT_PREVIEW_SIZE = config('COMMENT_PREVIEW_SIZE', default=3, cast=int)  # comments per post from posts/comments/preview/
+
+BULK_MAX_IDS = config('BULK_MAX_IDS', default=1000, cast=int)  # user ids accepted by the bulk follow/relationship endpoints
+
+# Mail is queued in OutgoingEmail and sent by `manage.py send_queued_mail`.
+# Set EMAIL_BACKEND to the console, locmem or filebased backend to run without SMTP.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=os.path.join(BASE_DIR, 'sent_emails'))
+OUTBOX_BATCH_SIZE = config('OUTBOX_BATCH_SIZE', default=100, cast=int)
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+OUTBOX_RETRY_DELAY = config('OUTBOX_RETRY_DELAY', default=60, cast=int)  # seconds before the first retry, doubled after each failure
+OUTBOX_LEASE = config('OUTBOX_LEASE', default=300, cast=int)  # seconds a claimed batch is reserved before another worker may take it over
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_PORT = config('EMAIL_PORT')
 EMAIL_USE_TLS = config('EMAIL_USE_TLS')
@@ -150,6 +285,10 @@ DEFAULT_FROM_EMAIL = config('EMAIL_HOST_USER')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded images are re-encoded to WebP variants in a process pool (see app/images.py)
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=2, cast=int)
+IMAGE_WEBP_QUALITY = config('IMAGE_WEBP_QUALITY', default=80, cast=int)
+
 
 
 
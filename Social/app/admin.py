@@ -1,12 +1,36 @@
 from django.contrib import admin
-from .models import User, Profile, Post, Comment,OneTimePassword
+from .models import User, Profile, Post, Comment,OneTimePassword, OutgoingEmail, FollowSuggestion
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_active', 'is_staff')
     search_fields = ('email', 'first_name', 'last_name')
 
-admin.site.register(Profile)
-admin.site.register(Post)
-admin.site.register(Comment)
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)  # __str__ reads user.email
+
+
+@admin.register(Post)
+class PostAdmin(admin.ModelAdmin):
+    list_select_related = ('author',)  # __str__ reads author.full_name
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_select_related = ('user', 'post__author')  # __str__ reads the user and the post's __str__
+
 admin.site.register(OneTimePassword)
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+
+
+@admin.register(FollowSuggestion)
+class FollowSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'suggested', 'rank', 'mutual_count', 'score', 'computed_at')
+    list_select_related = ('user', 'suggested')
+    raw_id_fields = ('user', 'suggested')
@@ -0,0 +1,177 @@
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+
+from .authentication import ClaimsJWTAuthentication
+from .caching import acached_object_response, aget_category_page, aset_category_page
+from .fastpath import COMMENT_ROWS, FOLLOW_ROWS, POST_ROWS, PROFILE_ROWS, astream_rows
+from .models import Comment, Follow, Post, Profile
+from .pagination import KeysetPaginator, astream_ndjson, wants_stream
+from .renderers import FastJSONRenderer
+from .serializers import CommentSerializer, FollowSerializer, PostSerializer, ProfileSerializer
+from .views import comment_queryset, fast_path, newest_posts_query, post_queryset, requested_expansions
+
+# Async versions of the read endpoints, mounted under app/async/. They are plain
+# Django async views (DRF's @api_view is sync only), so under ASGI a request runs
+# on the event loop from start to finish instead of hopping to a worker thread.
+
+_authentication = ClaimsJWTAuthentication()
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # Same bytes DRF's JSONRenderer produces for the sync endpoints
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def async_api_view(authenticated=False):
+    """
+    The parts of @api_view these views need: GET only, JWT authentication
+    and APIException (NotFound, AuthenticationFailed, ...) turned into JSON.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+            try:
+                result = await _authentication.aauthenticate(request)
+                # Replaces the session user, which would be loaded with a sync query
+                request.user = result[0] if result else AnonymousUser()
+                if authenticated and not request.user.is_authenticated:
+                    raise NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                response = json_response({'detail': exc.detail}, exc.status_code)
+                if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                    response['WWW-Authenticate'] = _authentication.authenticate_header(request)
+                return response
+        return wrapper
+    return decorator
+
+
+async def aget_object_or_404(queryset, **lookup):
+    try:
+        return await queryset.aget(**lookup)
+    except queryset.model.DoesNotExist:
+        raise NotFound()
+
+
+def arender_object(queryset, serializer_class, modified_field):
+    # Used by acached_object_response on a cache miss
+    async def render():
+        obj = await aget_object_or_404(queryset)
+        return JSONRenderer().render(serializer_class(obj).data), getattr(obj, modified_field)
+    return render
+
+
+async def paginated_response(request, paginator, queryset, serializer_class, context=None):
+    page = await paginator.apaginate(request, queryset)
+    return json_response(paginator.get_payload(serializer_class(page, many=True, context=context or {}).data))
+
+
+async def paginated_rows(request, paginator, queryset, row_serializer):
+    # paginated_response on the fast path
+    page = await paginator.apaginate(request, row_serializer.project(queryset))
+    return json_response(paginator.get_payload(row_serializer.many(page)))
+
+
+@async_api_view()
+async def list_posts(request, post_id=None):
+    expand = requested_expansions(request)
+    if post_id and not expand:
+        posts = Post.objects.filter(id=post_id)
+        return await acached_object_response(request, 'post', post_id, arender_object(posts, PostSerializer, 'updated_at'))
+    if post_id:
+        post = await aget_object_or_404(post_queryset(expand), id=post_id)
+        return json_response(PostSerializer(post, context={'expand': expand}).data)
+
+    if 'category' in request.GET or 'since' in request.GET:
+        return await list_posts_by_category(request, expand)
+    posts = post_queryset(expand)
+    if fast_path(expand):
+        if wants_stream(request):
+            return astream_rows(posts.order_by('id'), POST_ROWS)
+        return await paginated_rows(request, KeysetPaginator(ordering=('id',)), posts, POST_ROWS)
+    if wants_stream(request):
+        return astream_ndjson(posts.order_by('id'), PostSerializer, context={'expand': expand})
+    return await paginated_response(request, KeysetPaginator(ordering=('id',)), posts, PostSerializer, {'expand': expand})
+
+
+async def list_posts_by_category(request, expand):
+    # views.list_posts_by_category, sharing its parsing and its cached newest page
+    error, posts, cache_category = newest_posts_query(request.GET, expand)
+    if error:
+        return json_response({"error": error}, status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPaginator(ordering=('-created_at', '-id'))
+    if cache_category:
+        cached = await aget_category_page(cache_category)
+        if cached is not None:
+            results, next_cursor = cached
+            paginator.restore(request, next_cursor)
+            return json_response(paginator.get_payload(results))
+
+    if fast_path(expand):
+        results = POST_ROWS.many(await paginator.apaginate(request, POST_ROWS.project(posts)))
+    else:
+        page = await paginator.apaginate(request, posts)
+        results = PostSerializer(page, many=True, context={'expand': expand}).data
+    if cache_category:
+        await aset_category_page(cache_category, results, paginator.next_cursor)
+    return json_response(paginator.get_payload(results))
+
+
+@async_api_view()
+async def view_profile(request, profile_id=None):
+    profiles = Profile.objects.select_related('user')
+    if profile_id:
+        return await acached_object_response(
+            request, 'profile', profile_id, arender_object(profiles.filter(id=profile_id), ProfileSerializer, 'updated_at')
+        )
+    if fast_path():
+        if wants_stream(request):
+            return astream_rows(Profile.objects.order_by('id'), PROFILE_ROWS)
+        return await paginated_rows(request, KeysetPaginator(ordering=('id',)), Profile.objects.all(), PROFILE_ROWS)
+    if wants_stream(request):
+        return astream_ndjson(profiles.order_by('id'), ProfileSerializer)
+    return await paginated_response(request, KeysetPaginator(ordering=('id',)), profiles, ProfileSerializer)
+
+
+@async_api_view()
+async def list_comments(request, comment_id=None):
+    expand = requested_expansions(request)
+    if comment_id and not expand:
+        comments = Comment.objects.filter(id=comment_id)
+        return await acached_object_response(request, 'comment', comment_id, arender_object(comments, CommentSerializer, 'created_at'))
+    if comment_id:
+        comment = await aget_object_or_404(comment_queryset(expand), id=comment_id)
+        return json_response(CommentSerializer(comment, context={'expand': expand}).data)
+
+    comments = comment_queryset(expand)
+    if fast_path(expand):
+        if wants_stream(request):
+            return astream_rows(comments.order_by('id'), COMMENT_ROWS)
+        return await paginated_rows(request, KeysetPaginator(ordering=('id',)), comments, COMMENT_ROWS)
+    if wants_stream(request):
+        return astream_ndjson(comments.order_by('id'), CommentSerializer, context={'expand': expand})
+    return await paginated_response(request, KeysetPaginator(ordering=('id',)), comments, CommentSerializer, {'expand': expand})
+
+
+@async_api_view(authenticated=True)
+async def get_followers(request):
+    if fast_path():
+        return json_response(FOLLOW_ROWS.many([row async for row in FOLLOW_ROWS.project(Follow.objects.filter(following=request.user))]))
+    followers = [follow async for follow in Follow.objects.filter(following=request.user)]
+    return json_response(FollowSerializer(followers, many=True).data)
+
+
+@async_api_view(authenticated=True)
+async def get_following(request):
+    if fast_path():
+        return json_response(FOLLOW_ROWS.many([row async for row in FOLLOW_ROWS.project(Follow.objects.filter(follower=request.user))]))
+    following = [follow async for follow in Follow.objects.filter(follower=request.user)]
+    return json_response(FollowSerializer(following, many=True).data)
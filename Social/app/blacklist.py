@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def _cache_key(jti):
+    return f'blacklist:{jti}'
+
+
+class BlacklistFilter:
+    """
+    In-process set of blacklisted token ids (jti) that are not yet expired.
+
+    Filled from the table on first use, then topped up with rows blacklisted
+    since the last sync every BLACKLIST_SYNC_INTERVAL seconds, and rebuilt
+    from scratch every BLACKLIST_RELOAD_INTERVAL seconds to drop expired ids.
+    Tokens blacklisted by this process are added immediately, and are also
+    written to the shared cache so other processes see them before their
+    next sync.
+    """
+
+    def __init__(self):
+        self._jtis = set()
+        self._lock = threading.Lock()
+        self._synced_at = None   # database time of the last sync
+        self._checked_at = 0.0   # monotonic time of the last sync
+        self._loaded_at = 0.0    # monotonic time of the last full reload
+
+    def _sync(self):
+        now = time.monotonic()
+        if self._synced_at is not None and now - self._checked_at < settings.BLACKLIST_SYNC_INTERVAL:
+            return
+        with self._lock:
+            if self._synced_at is not None and now - self._checked_at < settings.BLACKLIST_SYNC_INTERVAL:
+                return  # another thread synced while we waited
+            started = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=started)
+            full_reload = self._synced_at is None or now - self._loaded_at >= settings.BLACKLIST_RELOAD_INTERVAL
+            if not full_reload:
+                # Overlap by a second so rows committed during the last sync are not missed
+                rows = rows.filter(blacklisted_at__gte=self._synced_at - timedelta(seconds=1))
+            jtis = set(rows.values_list('token__jti', flat=True))
+            if full_reload:
+                self._jtis = jtis
+                self._loaded_at = now
+            else:
+                self._jtis |= jtis
+            self._synced_at = started
+            self._checked_at = now
+
+    def add(self, jti, expires_at=None):
+        self._jtis.add(jti)
+        timeout = None
+        if expires_at is not None:
+            timeout = max(1, int((expires_at - timezone.now()).total_seconds()))
+        cache.set(_cache_key(jti), True, timeout)
+
+    def __contains__(self, jti):
+        self._sync()
+        return jti in self._jtis or bool(cache.get(_cache_key(jti)))
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check reads the in-memory filter instead of the table.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_filter:
+            raise TokenError(_('Token is blacklisted'))
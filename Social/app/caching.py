@@ -0,0 +1,150 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from .models import Profile
+
+
+def category_page_key(category):
+    return f'posts:category:{category}:newest'
+
+
+def get_category_page(category):
+    """
+    Returns the cached newest page of a category as (results, next_cursor), or None.
+    """
+    return cache.get(category_page_key(category))
+
+
+def set_category_page(category, results, next_cursor):
+    cache.set(category_page_key(category), (results, next_cursor), settings.CATEGORY_CACHE_TTL)
+
+
+async def aget_category_page(category):
+    return await cache.aget(category_page_key(category))
+
+
+async def aset_category_page(category, results, next_cursor):
+    await cache.aset(category_page_key(category), (results, next_cursor), settings.CATEGORY_CACHE_TTL)
+
+
+def invalidate_category_pages(*categories):
+    # Called whenever a post enters, changes in or leaves a category
+    keys = [category_page_key(category) for category in set(categories) if category]
+    if keys:
+        cache.delete_many(keys)
+
+
+def _version_key(name, pk):
+    return f'object:{name}:{pk}:version'
+
+
+def object_version(name, pk):
+    """
+    Returns the current version token of a cached object, creating one if needed.
+
+    Tokens are random rather than counters, so a version evicted from the
+    cache can never come back and match an old stored response.
+    """
+    key = _version_key(name, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_object(name, *pks):
+    cache.set_many({_version_key(name, pk): uuid.uuid4().hex for pk in pks}, None)
+
+
+def invalidate_profiles_of(*user_ids):
+    # Profiles embed their user's counters, so they go stale on follows and new posts
+    profile_ids = Profile.objects.filter(user_id__in=user_ids).values_list('id', flat=True)
+    invalidate_object('profile', *profile_ids)
+
+
+async def aobject_version(name, pk):
+    key = _version_key(name, pk)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        version = await cache.aget(key)
+    return version
+
+
+def _etag_matches(request, etag):
+    # Only a listed ETag proves the object exists; If-None-Match: * must wait for the stored response
+    return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if last_modified is not None:
+        since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+        return since is not None and int(last_modified) <= since
+    return False
+
+
+def cached_object_response(request, name, pk, render):
+    """
+    Serves one serialized object from the cache, keyed by name, pk and version.
+
+    render() returns (JSON bytes, last modified datetime) and only runs on a
+    cache miss. The ETag is the version token itself, so an If-None-Match
+    request is answered with 304 from a single cache read: no database query
+    and no serialization. If-None-Match: * is answered from the stored
+    response instead, which render() only creates for an object that exists.
+    """
+    version = object_version(name, pk)
+    etag = f'"{name}-{pk}-{version}"'
+    if _etag_matches(request, etag):
+        return _object_response(request, etag, None)
+
+    key = f'object:{name}:{pk}:{version}'
+    entry = cache.get(key)
+    if entry is None:
+        body, modified = render()
+        entry = (body, modified.timestamp() if modified else None)
+        cache.set(key, entry, settings.OBJECT_CACHE_TTL)
+    return _object_response(request, etag, entry)
+
+
+async def acached_object_response(request, name, pk, arender):
+    # cached_object_response for async views; arender is a coroutine function
+    version = await aobject_version(name, pk)
+    etag = f'"{name}-{pk}-{version}"'
+    if _etag_matches(request, etag):
+        return _object_response(request, etag, None)
+
+    key = f'object:{name}:{pk}:{version}'
+    entry = await cache.aget(key)
+    if entry is None:
+        body, modified = await arender()
+        entry = (body, modified.timestamp() if modified else None)
+        await cache.aset(key, entry, settings.OBJECT_CACHE_TTL)
+    return _object_response(request, etag, entry)
+
+
+def _object_response(request, etag, entry):
+    # entry is (JSON bytes, last modified timestamp), or None for a 304 on the ETag alone
+    if entry is None:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    body, last_modified = entry
+
+    if _not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
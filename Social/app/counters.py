@@ -0,0 +1,81 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ClaimsUser, Comment, Follow, Post, User
+
+
+def _plus(name, delta):
+    # Counters are unsigned on MySQL, where even an intermediate 0 - 1 is an
+    # out of range error, so a decrement only applies when the result stays >= 0
+    if delta > 0:
+        return F(name) + delta
+    return Case(When(**{f'{name}__gte': -delta}, then=F(name) + delta), default=Value(0))
+
+
+def _forget_cached_users(model, pks):
+    # QuerySet.update() skips post_save, so drop the cached rows of token-authenticated users here
+    if issubclass(model, User):
+        pks = list(pks)
+        transaction.on_commit(lambda: ClaimsUser.forget(pks))
+
+
+def adjust_counters(model, pk, **deltas):
+    """
+    Atomically adds deltas to counter columns, e.g. adjust_counters(User, 1, post_count=1).
+
+    Runs as a single UPDATE with F() expressions so concurrent requests never
+    lose increments. Values are clamped at zero; any drift is repaired by the
+    reconcile_counters command.
+    """
+    updates = {name: _plus(name, delta) for name, delta in deltas.items() if delta}
+    if updates:
+        model.objects.filter(pk=pk).update(**updates)
+        _forget_cached_users(model, [pk])
+
+
+def adjust_counters_bulk(model, pks, **deltas):
+    updates = {name: _plus(name, delta) for name, delta in deltas.items() if delta}
+    if updates and pks:
+        pks = list(pks)
+        model.objects.filter(pk__in=pks).update(**updates)
+        _forget_cached_users(model, pks)
+
+
+def _count_of(model, field):
+    # Correlated COUNT(*) of `model` rows whose `field` points at the outer row
+    rows = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(total=Count('pk'))
+    return Coalesce(Subquery(rows.values('total')), 0)
+
+
+def expected_counters():
+    """
+    Returns {model: {counter column: expression computing its true value}}.
+    """
+    return {
+        User: {
+            'follower_count': _count_of(Follow, 'following'),
+            'following_count': _count_of(Follow, 'follower'),
+            'post_count': _count_of(Post, 'author'),
+        },
+        Post: {
+            'comment_count': _count_of(Comment, 'post'),
+        },
+    }
+
+
+def reconcile_counters(model, columns, start, stop):
+    """
+    Repairs the counters of rows with start <= pk < stop and returns how many drifted.
+    """
+    rows = model.objects.filter(pk__gte=start, pk__lt=stop)
+    aliases = {f'expected_{name}': expression for name, expression in columns.items()}
+    drifted = list(
+        rows.annotate(**aliases)
+        .exclude(**{name: F(f'expected_{name}') for name in columns})
+        .values_list('pk', flat=True)
+    )
+    if drifted:
+        model.objects.filter(pk__in=drifted).update(**columns)
+        _forget_cached_users(model, drifted)
+    return len(drifted)
@@ -0,0 +1,8 @@
+from django.db.backends.sqlite3 import base
+
+from app.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    # Only file databases are pooled; Django never closes in-memory ones
+    pass
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+from contextlib import closing
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded set of open DB-API connections shared by the threads of one process.
+
+    Connections are handed out last-in first-out, so a steady load keeps
+    reusing the same few and the rest age out after `recycle` seconds.
+    When all `max_size` connections are in use, acquire() waits up to
+    `timeout` seconds for one to be released.
+    """
+
+    def __init__(self, max_size=10, timeout=10, recycle=3600):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = deque()
+        self._born = {}  # id(connection) -> monotonic time it was opened
+        self._open = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._counters = {
+            'checkouts': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+            'connects': 0, 'connect_seconds': 0.0, 'discarded': 0,
+        }
+
+    def _reserve(self, waiting_since):
+        # Returns an idle connection, None to open a new one, or raises PoolTimeout
+        with self._condition:
+            while True:
+                if self._idle or self._open < self.max_size:
+                    if waiting_since is not None:
+                        self._counters['wait_seconds'] += time.monotonic() - waiting_since
+                    self._in_use += 1
+                    if self._idle:
+                        return self._idle.pop()
+                    self._open += 1
+                    return None
+                if waiting_since is None:
+                    waiting_since = time.monotonic()
+                    self._counters['waits'] += 1
+                remaining = self.timeout - (time.monotonic() - waiting_since)
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection free after {self.timeout}s ({self.max_size} in use)')
+                self._condition.wait(remaining)
+
+    def acquire(self, connect, check):
+        """
+        Returns a connection that passed check(connection), or a new one from connect().
+        """
+        while True:
+            connection = self._reserve(None)
+            if connection is None:
+                connect_started = time.perf_counter()
+                try:
+                    connection = connect()
+                except BaseException:
+                    self._forget(None)
+                    raise
+                with self._condition:
+                    self._counters['connects'] += 1
+                    self._counters['connect_seconds'] += time.perf_counter() - connect_started
+                self._born[id(connection)] = time.monotonic()
+                break
+            # Checked outside the lock, it is a round trip to the server
+            if time.monotonic() - self._born.get(id(connection), 0) < self.recycle and check(connection):
+                break
+            self._discard(connection)
+
+        with self._condition:
+            self._counters['checkouts'] += 1
+        return connection
+
+    def release(self, connection, reusable=True):
+        if not reusable:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._born.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass  # already broken, which is why it is discarded
+        self._forget(connection)
+
+    def _forget(self, connection):
+        with self._condition:
+            self._open -= 1
+            self._in_use -= 1
+            if connection is not None:
+                self._counters['discarded'] += 1
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counters, max_size=self.max_size, open=self._open, in_use=self._in_use, idle=len(self._idle))
+        stats['wait_seconds'] = round(stats['wait_seconds'], 6)
+        stats['connect_seconds'] = round(stats['connect_seconds'], 6)
+        return stats
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        if alias not in _pools:
+            options = settings_dict.get('POOL') or {}
+            _pools[alias] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 10),
+                recycle=options.get('RECYCLE', 3600),
+            )
+        return _pools[alias]
+
+
+def pool_stats():
+    # {alias: stats} for every pooled database this process has used
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Makes a Django database backend borrow connections from a ConnectionPool.
+
+    Django still "connects" and "closes" around each request (use
+    CONN_MAX_AGE=0), but those now check a connection out of and back into
+    the pool instead of opening a new socket and authenticating.
+    """
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias, self.settings_dict)
+        try:
+            return pool.acquire(lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params), self._ping)
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error))
+
+    def _ping(self, connection):
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except self.Database.Error:
+            return False
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Django keeps its reference to a connection closed inside atomic(), so never share that one
+        reusable = not self.in_atomic_block
+        if reusable:
+            try:
+                self.connection.rollback()  # hand it back without an open transaction
+            except self.Database.Error:
+                reusable = False
+        get_pool(self.alias, self.settings_dict).release(self.connection, reusable)
@@ -0,0 +1,176 @@
+from datetime import timedelta
+from functools import cached_property
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+
+from .images import srcset
+from .metrics import serialization_timer
+from .models import Post, Profile
+from .pagination import _ndjson_response
+from .renderers import FastJSONRenderer
+from .serializers import CommentSerializer, FollowSerializer, PostSerializer, ProfileSerializer
+
+# Read-only fast path for the list endpoints. A RowSerializer reads the columns a
+# serializer needs with .values() and turns each row into the same dict the DRF
+# serializer would build, with a function generated once per serializer instead
+# of model instances and a to_representation() call per field per row.
+
+_ZERO = timedelta(0)
+
+# Field types whose representation of a database value is the value itself
+_PASSTHROUGH = (
+    serializers.BooleanField, serializers.CharField, serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField, serializers.ReadOnlyField,
+)
+
+
+def _datetime(field):
+    to_representation = field.to_representation
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or getattr(field_timezone, 'key', None) != 'UTC':
+        return lambda value: to_representation(value) if value else None
+
+    # The app never activates another timezone, so this is decided once per serializer
+    def iso_utc(value):
+        # DateTimeField.to_representation for UTC values (what the database returns), without the timezone round trip
+        if not value:
+            return None
+        if value.utcoffset() != _ZERO:
+            return to_representation(value)
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return iso_utc
+
+
+def _file(field, model):
+    # FileField only sets use_url when it is passed explicitly
+    if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+        return lambda name: name or None
+    # The hot views serialize without a request in the context, so urls stay relative
+    storage = model._meta.get_field(field.source).storage
+    return lambda name: storage.url(name) if name else None
+
+
+def _choice(field):
+    if all(isinstance(key, str) for key in field.choices):
+        return None
+    return lambda value: field.to_representation(value) if value is not None else None
+
+
+class RowSerializer:
+    """
+    Compiled, read-only equivalent of a ModelSerializer's plain representation
+    (no ?expand=, no request in the context).
+
+    methods maps each SerializerMethodField to (columns, function of those
+    column values). A field type the compiler does not know raises
+    ImproperlyConfigured, so a serializer change cannot silently drift from
+    the fast path.
+    """
+
+    def __init__(self, serializer_class, methods=None):
+        self.serializer_class = serializer_class
+        self.methods = methods or {}
+
+    @cached_property
+    def compiled(self):
+        model = self.serializer_class.Meta.model
+        columns, items, namespace = [], [], {}
+
+        def column(source):
+            lookup = source.replace('.', '__')
+            if lookup not in columns:
+                columns.append(lookup)
+            return f'row[{lookup!r}]'
+
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in self.methods:
+                    raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} needs a fast path method')
+                sources, function = self.methods[name]
+                converter, arguments = function, ', '.join(column(source) for source in sources)
+            elif isinstance(field, serializers.DateTimeField):
+                converter, arguments = _datetime(field), column(field.source)
+            elif isinstance(field, serializers.FileField):
+                converter, arguments = _file(field, model), column(field.source)
+            elif isinstance(field, serializers.ChoiceField):
+                converter, arguments = _choice(field), column(field.source)
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is not None:
+                raise ImproperlyConfigured(f'{self.serializer_class.__name__}.{name} has a pk_field')
+            elif isinstance(field, _PASSTHROUGH):
+                converter, arguments = None, column(field.source)
+            else:
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{name} ({type(field).__name__}) has no fast path'
+                )
+            if converter is None:
+                items.append(f'{name!r}: {arguments}')
+            else:
+                namespace[f'c{len(namespace)}'] = converter
+                items.append(f'{name!r}: c{len(namespace) - 1}({arguments})')
+
+        source = 'def to_dict(row):\n    return {' + ', '.join(items) + '}\n'
+        exec(compile(source, f'<fastpath {self.serializer_class.__name__}>', 'exec'), namespace)
+        return tuple(columns), namespace['to_dict']
+
+    @property
+    def columns(self):
+        return self.compiled[0]
+
+    @property
+    def to_dict(self):
+        return self.compiled[1]
+
+    def project(self, queryset):
+        return queryset.values(*self.columns)
+
+    def many(self, rows):
+        to_dict = self.to_dict
+        rows = list(rows)  # a queryset runs its query here, outside the timer
+        with serialization_timer():
+            return [to_dict(row) for row in rows]
+
+
+def _storage(model, name):
+    return model._meta.get_field(name).storage
+
+
+POST_ROWS = RowSerializer(PostSerializer, methods={
+    'image_srcset': (('image_variants',), lambda variants: srcset(variants, _storage(Post, 'image'))),
+})
+COMMENT_ROWS = RowSerializer(CommentSerializer)
+FOLLOW_ROWS = RowSerializer(FollowSerializer)
+PROFILE_ROWS = RowSerializer(ProfileSerializer, methods={
+    'profile_picture_srcset': (('picture_variants',), lambda variants: srcset(variants, _storage(Profile, 'profile_picture'))),
+})
+
+
+def stream_rows(queryset, row_serializer, chunk_size=None):
+    # stream_ndjson on the fast path
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    renderer = FastJSONRenderer()
+    to_dict = row_serializer.to_dict
+
+    def rows():
+        for row in row_serializer.project(queryset).iterator(chunk_size=chunk_size):
+            yield renderer.render_json(to_dict(row)) + b'\n'
+
+    return _ndjson_response(rows())
+
+
+def astream_rows(queryset, row_serializer, chunk_size=None):
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    renderer = FastJSONRenderer()
+    to_dict = row_serializer.to_dict
+
+    async def rows():
+        async for row in row_serializer.project(queryset).aiterator(chunk_size=chunk_size):
+            yield renderer.render_json(to_dict(row)) + b'\n'
+
+    return _ndjson_response(rows())
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, PBKDF2PasswordHasher, get_hasher, identify_hasher, is_password_usable, make_password,
+)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2id with the cost set by ARGON2_TIME_COST, ARGON2_MEMORY_COST (KiB)
+    and ARGON2_PARALLELISM. Changing them rehashes each password on its
+    user's next login.
+    """
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = settings.PBKDF2_ITERATIONS
+
+
+_executor = None
+
+
+def _get_executor():
+    # argon2-cffi and hashlib release the GIL while hashing, so threads use separate cores
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+    return _executor
+
+
+def check_encoded(password, encoded):
+    """
+    Returns (matches, needs_rehash) for a raw password against a stored hash.
+
+    When there is no usable hash (unknown user, unusable password) the
+    password is hashed anyway, so the response time does not reveal which
+    accounts exist.
+    """
+    # is_password_usable(None) is True, so an unknown account has to be tested for first
+    if password is None or encoded is None or not is_password_usable(encoded):
+        make_password(password or '')
+        return False, False
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        make_password(password)
+        return False, False
+
+    preferred = get_hasher('default')
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    matches = hasher.verify(password, encoded)
+    if not matches and not hasher_changed and must_update:
+        # Same as django.contrib.auth.hashers.check_password: equalize the work for old hashes
+        hasher.harden_runtime(password, encoded)
+    return matches, matches and must_update
+
+
+def verify_password(user, password):
+    """
+    Checks `password` for `user` (None for an unknown account) on the bounded
+    hashing pool and rehashes it with the preferred hasher when needed.
+
+    The pool caps how many hashes run at once at PASSWORD_HASH_WORKERS, so a
+    burst of logins cannot take every core away from other requests. The
+    rehash is saved from the calling thread, inside its connection.
+    """
+    executor = _get_executor()
+    matches, rehash = executor.submit(check_encoded, password, user.password if user else None).result()
+    if rehash:
+        user.password = executor.submit(make_password, password).result()
+        user.save(update_fields=['password'])
+    return matches
+
+
+async def averify_password(user, password):
+    # Awaits the pool instead of blocking the event loop for the length of a hash
+    executor = _get_executor()
+    matches, rehash = await asyncio.wrap_future(
+        executor.submit(check_encoded, password, user.password if user else None)
+    )
+    if rehash:
+        user.password = await asyncio.wrap_future(executor.submit(make_password, password))
+        await user.asave(update_fields=['password'])
+    return matches
@@ -0,0 +1,101 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+
+# Longest side in pixels; None keeps the original size and only re-encodes to WebP
+VARIANTS = {
+    'thumbnail': 150,
+    'medium': 600,
+    'original': None,
+}
+
+_executor = None
+
+
+def render_variants(source_path, media_root, base_name, variants, quality):
+    """
+    Writes one WebP file per variant under media_root/variants/ and returns
+    {variant: {'name': storage name, 'width': px, 'height': px}}.
+
+    Runs inside a worker process, so it must not touch Django models or the
+    database: only the file paths and settings values are passed in.
+    """
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.join(media_root, 'variants'), exist_ok=True)
+    results = {}
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        # Largest first, so each smaller variant is resized from the previous one
+        ordered = sorted(variants.items(), key=lambda item: -(item[1] or max(image.size)))
+        current = image
+        for variant, size in ordered:
+            if size and max(current.size) > size:
+                current = current.copy()
+                current.thumbnail((size, size), Image.LANCZOS)
+            name = f'variants/{base_name}_{variant}.webp'
+            current.save(os.path.join(media_root, name), 'WEBP', quality=quality, method=4)
+            results[variant] = {'name': name, 'width': current.size[0], 'height': current.size[1]}
+    return results
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def _store_variants(model, pk, file_field, name, variants_field, cache_name, future):
+    # Runs on the executor's result thread once the worker is done
+    from .caching import invalidate_object
+
+    if future.exception() is not None:
+        return  # the original upload is still served; the variants can be regenerated later
+    try:
+        # Only while the row still points at the rendered file: a newer upload has its own job
+        model.objects.filter(pk=pk, **{file_field: name}).update(**{variants_field: future.result()})
+    finally:
+        connection.close()  # no request cycle closes this thread's connection, so use a fresh one per write
+    invalidate_object(cache_name, pk)
+
+
+def schedule_variants(instance, file_field, variants_field, cache_name):
+    """
+    Queues resizing of an uploaded image in the process pool once the current
+    transaction commits, and returns immediately.
+
+    When the worker finishes, the variant paths are saved to `variants_field`
+    and the cached serialized object named `cache_name` is invalidated.
+    Callers saving a new image clear `variants_field` in the same save.
+    """
+    upload = getattr(instance, file_field)
+    if not upload:
+        return
+    base_name = os.path.splitext(os.path.basename(upload.name))[0]
+    store = partial(_store_variants, type(instance), instance.pk, file_field, upload.name, variants_field, cache_name)
+
+    def submit():
+        future = _get_executor().submit(
+            render_variants, upload.path, str(settings.MEDIA_ROOT), base_name, VARIANTS, settings.IMAGE_WEBP_QUALITY
+        )
+        future.add_done_callback(store)
+
+    transaction.on_commit(submit)
+
+
+def srcset(variants, storage):
+    """
+    Builds an HTML srcset value ("url 150w, url 600w, ...") from stored variants.
+    """
+    if not variants:
+        return None
+    ordered = sorted(variants.values(), key=lambda variant: variant['width'])
+    return ', '.join(f"{storage.url(variant['name'])} {variant['width']}w" for variant in ordered)
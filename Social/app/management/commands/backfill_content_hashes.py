@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from app.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Fills in content_hash for posts saved before it existed, so the duplicate check covers them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Posts hashed per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        filled = duplicates = 0
+        last_pk = 0
+
+        while True:
+            batch = list(
+                Post.objects.filter(content_hash__isnull=True, pk__gt=last_pk)
+                .only('id', 'author_id', 'content', 'image')
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            for post in batch:
+                content_hash = Post.compute_content_hash(post.content, post.image)
+                if options['dry_run']:
+                    filled += 1
+                    continue
+                try:
+                    # update() rather than save(): a backfill must not bump updated_at
+                    with transaction.atomic():
+                        filled += Post.objects.filter(pk=post.pk, content_hash__isnull=True).update(content_hash=content_hash)
+                except IntegrityError:
+                    # The author already has this exact post; leave the older copy unhashed rather than delete anything
+                    duplicates += 1
+                    self.stderr.write(f'post {post.pk} duplicates another post by user {post.author_id}, left without a hash')
+
+        action = 'would fill' if options['dry_run'] else 'filled'
+        self.stdout.write(f'{action} {filled} content hash(es), {duplicates} duplicate(s) left without one')
@@ -0,0 +1,57 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from app.authentication import ClaimsJWTAuthentication
+from app.bench import dump, git_revision, summarize
+from app.models import ClaimsUser, User
+
+
+class Command(BaseCommand):
+    help = 'Compares queries and time per authenticated request for the stock and claims-based JWT authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def run(self, authentication, token, requests, touch):
+        factory = RequestFactory()
+        latencies = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                request = factory.get('/app/feed/', HTTP_AUTHORIZATION=f'Bearer {token}')
+                started = time.perf_counter()
+                user, _ = authentication.authenticate(request)
+                touch(user)
+                latencies.append(time.perf_counter() - started)
+        return {'queries_per_request': round(len(queries) / requests, 3), 'latency': summarize(latencies)}
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        scenarios = {
+            # What most views need: the id for filters and FK assignment
+            'claims_only': lambda user: (user.pk, user.is_active, user.is_verified),
+            # A view that also reads a non-claim column such as the email
+            'reads_email': lambda user: user.email,
+        }
+        report = {'revision': git_revision(), 'requests': requests, 'results': {}}
+
+        # Everything runs in a transaction that is rolled back, so no bench user is left behind
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=f'bench-{uuid.uuid4().hex[:12]}@example.com', password=None, first_name='Bench', last_name='User'
+            )
+            token = user.tokens()['access']
+            for name, authentication in (('JWTAuthentication', JWTAuthentication()), ('ClaimsJWTAuthentication', ClaimsJWTAuthentication())):
+                for scenario, touch in scenarios.items():
+                    cache.delete(ClaimsUser.cache_key(user.pk))  # every scenario starts cold
+                    report['results'][f'{name}/{scenario}'] = self.run(authentication, token, requests, touch)
+            transaction.set_rollback(True)
+
+        dump(report, self.stdout, options['output'])
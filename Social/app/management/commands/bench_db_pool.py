@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from app.bench import dump, git_revision, summarize
+from app.db.pool import pool_stats
+
+# Environment for each mode; the database settings are read once at startup, so every mode runs in its own process
+MODES = {
+    'no_reuse': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'pooled': {'DB_POOL': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares requests/sec through the full WSGI request cycle with a new connection per request, '
+        'persistent connections (CONN_MAX_AGE) and the in-process pool. Uses the configured database; '
+        'set DB_ENGINE=sqlite to run against a local SQLite file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/app/list_posts/')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent requests, like the threads of one worker')
+        parser.add_argument('--mode', action='append', choices=sorted(MODES), help='Modes to run (default: all)')
+        parser.add_argument('--child', action='store_true', help='Internal: measure the current settings and print JSON')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def measure(self, path, requests, threads):
+        # Calls the WSGI handler like a server would, so request_finished closes (or returns) connections
+        handler = WSGIHandler()
+        environ = RequestFactory(SERVER_NAME='localhost')._base_environ(PATH_INFO=path, REQUEST_METHOD='GET')
+
+        def request(_):
+            statuses = []
+            started = time.perf_counter()
+            body = handler(dict(environ), lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                for _chunk in body:
+                    pass
+            finally:
+                body.close()
+            return time.perf_counter() - started, int(statuses[0].split()[0])
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(request, range(requests)))
+        elapsed = time.perf_counter() - started
+
+        summary = summarize([latency for latency, code in results], elapsed)
+        summary['errors'] = sum(1 for _, code in results if code >= 400)
+        summary['pool'] = pool_stats()
+        return summary
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure(options['path'], options['requests'], options['threads'])))
+            return
+
+        report = {
+            'revision': git_revision(),
+            'path': options['path'],
+            'requests': options['requests'],
+            'threads': options['threads'],
+            'results': {},
+        }
+        for mode in options['mode'] or list(MODES):
+            command = [
+                sys.executable, sys.argv[0], 'bench_db_pool', '--child', '--path', options['path'],
+                '--requests', str(options['requests']), '--threads', str(options['threads']),
+            ]
+            result = subprocess.run(command, env={**os.environ, **MODES[mode]}, capture_output=True, text=True)
+            if result.returncode:
+                raise CommandError(f'{mode} run failed:\n{result.stderr}')
+            report['results'][mode] = json.loads(result.stdout.strip().splitlines()[-1])
+
+        dump(report, self.stdout, options['output'])
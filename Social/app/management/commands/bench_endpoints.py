@@ -0,0 +1,305 @@
+import json
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from django.urls import URLPattern
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from app import urls as app_urls
+from app.bench import dump, git_revision, summarize
+from app.models import Comment, Follow, Post, Profile, User
+from app.seeding import CATEGORIES, WORDS, dataset_users, delete_dataset, seed_dataset
+
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+# Reads run first, then writes, then deletes, so every phase sees the seeded data it expects.
+# Deleting posts also deletes their comments and so runs last.
+READ, WRITE, DELETE, CASCADE = 0, 1, 2, 3
+
+
+class Scenario:
+    """
+    How to call one route: `build(fixture, i)` returns the URL kwargs, body and query string of request i.
+    Responses outside `expect` (default any 2xx or 3xx) are counted as errors.
+    """
+
+    def __init__(self, name, route, method, build, auth='user', phase=READ, expect=None):
+        self.name = name
+        self.route = route
+        self.method = method
+        self.build = build
+        self.auth = auth
+        self.phase = phase
+        self.expect = expect
+
+    def expected(self, code):
+        return code in self.expect if self.expect else 200 <= code < 400
+
+
+class Fixture:
+    """
+    Ids, tokens and credentials from the seeded dataset, handed out deterministically per request index.
+    """
+
+    def __init__(self, prefix, password, random_seed):
+        self.password = password
+        self.run = uuid.uuid4().hex[:8]  # keeps created emails and contents unique across runs
+        self.rng = random.Random(random_seed)
+        users = dataset_users(prefix).order_by('id')
+        self.user_ids = list(users.values_list('id', flat=True))
+        self.staff_id = users.filter(is_staff=True).values_list('id', flat=True).first()
+        self.profile_ids = list(Profile.objects.filter(user_id__in=self.user_ids).order_by('id').values_list('id', flat=True))
+        self.post_ids = list(Post.objects.filter(author_id__in=self.user_ids).order_by('id').values_list('id', flat=True))
+        self.comment_ids = list(Comment.objects.filter(post_id__in=self.post_ids).order_by('id').values_list('id', flat=True))
+        self.edges = list(Follow.objects.filter(follower_id__in=self.user_ids).order_by('id').values_list('follower_id', 'following_id'))
+        self._followed = set(self.edges)
+        self._tokens = {}
+        self._users = {}
+
+    def pick(self, items, i):
+        return items[(i * 7919) % len(items)]  # spreads consecutive requests over the table
+
+    def take(self, items, i):
+        # Distinct rows for destructive requests, from the end so earlier phases keep their rows
+        return items[-1 - i] if i < len(items) else 0
+
+    def actor(self, i):
+        return self.pick(self.user_ids, i)
+
+    def stranger(self, i):
+        # A user the actor of request i does not follow yet
+        actor = self.actor(i)
+        for n in range(1, len(self.user_ids)):
+            user_id = self.pick(self.user_ids, i + n)
+            if user_id != actor and (actor, user_id) not in self._followed:
+                self._followed.add((actor, user_id))
+                return user_id
+        return actor
+
+    def user(self, user_id):
+        if user_id not in self._users:
+            self._users[user_id] = User.objects.get(pk=user_id)
+        return self._users[user_id]
+
+    def tokens(self, user_id):
+        if user_id not in self._tokens:
+            self._tokens[user_id] = self.user(user_id).tokens()
+        return self._tokens[user_id]
+
+    def email(self, user_id):
+        return self.user(user_id).email
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def sample_users(self, count):
+        return self.rng.sample(self.user_ids, min(count, len(self.user_ids)))
+
+
+def reset_token(fixture, i):
+    user = fixture.user(fixture.actor(i))
+    return urlsafe_base64_encode(force_bytes(user.pk)), PasswordResetTokenGenerator().make_token(user)
+
+
+def build_set_new_password(fixture, i):
+    uidb64, token = reset_token(fixture, i)
+    password = fixture.password
+    return {'data': {'password': password, 'confirm_password': password, 'uidb64': uidb64, 'token': token}}
+
+
+SCENARIOS = [
+    # Auth
+    Scenario('register', 'register/', 'POST', lambda fx, i: {'data': {
+        'email': f'bench-{fx.run}-{i}@example.org', 'first_name': 'Load', 'last_name': 'Test',
+        'password': fx.password, 'password2': fx.password,
+    }}, auth=None, phase=WRITE),
+    Scenario('login', 'login/', 'POST', lambda fx, i: {'data': {'email': fx.email(fx.actor(i)), 'password': fx.password}}, auth=None),
+    Scenario('verify-email (wrong code)', 'verify-email/', 'POST', lambda fx, i: {'data': {'email': fx.email(fx.actor(i)), 'otp': '000000'}},
+             auth=None, expect=(404,)),
+    Scenario('resend-otp', 'resend-otp/', 'POST', lambda fx, i: {'data': {'email': fx.email(fx.actor(i))}}, auth=None, phase=WRITE),
+    Scenario('set-new-password', 'set-new-password/', 'POST', build_set_new_password, auth=None, phase=WRITE),
+    Scenario('password-reset-request', 'password-reset-request/', 'POST', lambda fx, i: {'data': {'email': fx.email(fx.actor(i))}}, auth=None, phase=WRITE),
+    Scenario('password-reset-confirm', 'password-reset-confirm/<str:uidb64>/<str:token>/', 'POST',
+             lambda fx, i: {'kwargs': dict(zip(('uidb64', 'token'), reset_token(fx, i)))}, auth=None),
+    Scenario('logout', 'logout/', 'POST', lambda fx, i: {'data': {'refresh_token': fx.user(fx.actor(i)).tokens()['refresh']}}, phase=WRITE),
+    Scenario('token-refresh', 'token/refresh/', 'POST', lambda fx, i: {'data': {'refresh': fx.user(fx.actor(i)).tokens()['refresh']}}, auth=None, phase=WRITE),
+    # Profiles
+    Scenario('create-profile (exists)', 'create-profile/', 'POST', lambda fx, i: {'data': {'email': fx.email(fx.actor(i)), 'bio': 'x'}},
+             auth=None, phase=WRITE, expect=(400,)),
+    Scenario('view-profile', 'view-profile/', 'GET', lambda fx, i: {}),
+    Scenario('view-profile/<id>', 'view-profile/<int:profile_id>/', 'GET', lambda fx, i: {'kwargs': {'profile_id': fx.pick(fx.profile_ids, i)}}),
+    Scenario('update-profile', 'update-profile/<int:profile_id>/', 'PUT',
+             lambda fx, i: {'kwargs': {'profile_id': fx.pick(fx.profile_ids, i)}, 'data': {'bio': f'{fx.run} {i} {fx.words(6)}'}}, phase=WRITE),
+    # Posts
+    Scenario('creating_post', 'creating_post/', 'POST',
+             lambda fx, i: {'data': {'content': f'{fx.run} {i} {fx.words(20)}', 'categories': fx.rng.choice(CATEGORIES)}}, phase=WRITE),
+    Scenario('list_posts', 'list_posts/', 'GET', lambda fx, i: {}),
+    Scenario('list_posts ?expand=author', 'list_posts/', 'GET', lambda fx, i: {'query': {'expand': 'author'}}),
+    Scenario('list_posts ?category', 'list_posts/', 'GET', lambda fx, i: {'query': {'category': fx.pick(CATEGORIES, i)}}),
+    Scenario('list_posts/<id>', 'list_posts/<int:post_id>/', 'GET', lambda fx, i: {'kwargs': {'post_id': fx.pick(fx.post_ids, i)}}),
+    Scenario('update_posts', 'update_posts/<int:post_id>/', 'PUT', lambda fx, i: {
+        'kwargs': {'post_id': fx.pick(fx.post_ids, i)},
+        'data': {'content': f'{fx.run} {i} {fx.words(20)}', 'categories': fx.rng.choice(CATEGORIES)},
+    }, phase=WRITE),
+    Scenario('delete_post', 'delete_post/<int:post_id>/', 'DELETE', lambda fx, i: {'kwargs': {'post_id': fx.take(fx.post_ids, i)}}, phase=CASCADE),
+    # Comments
+    Scenario('post_comment', 'comments/<int:post_id>/', 'POST',
+             lambda fx, i: {'kwargs': {'post_id': fx.pick(fx.post_ids, i)}, 'data': {'comments': fx.words(12)}}, phase=WRITE),
+    Scenario('list_comments', 'list_comments/', 'GET', lambda fx, i: {}),
+    Scenario('list_comments/<id>', 'list_comments/<int:comment_id>/', 'GET', lambda fx, i: {'kwargs': {'comment_id': fx.pick(fx.comment_ids, i)}}),
+    Scenario('delete_comment', 'delete_comment/<int:comment_id>/', 'DELETE', lambda fx, i: {'kwargs': {'comment_id': fx.take(fx.comment_ids, i)}}, phase=DELETE),
+    Scenario('post_comments', 'posts/<int:post_id>/comments/', 'GET', lambda fx, i: {'kwargs': {'post_id': fx.pick(fx.post_ids, i)}}),
+    Scenario('comment_previews', 'posts/comments/preview/', 'GET',
+             lambda fx, i: {'query': {'post_ids': ','.join(str(fx.pick(fx.post_ids, i + n)) for n in range(20))}}),
+    # Follows
+    Scenario('follow-user', 'follow/<int:user_id>/', 'POST', lambda fx, i: {'kwargs': {'user_id': fx.stranger(i)}}, phase=WRITE),
+    Scenario('unfollow-user', 'unfollow/<int:user_id>/', 'DELETE',
+             lambda fx, i: {'kwargs': {'user_id': fx.take(fx.edges, i)[1]}, 'as': fx.take(fx.edges, i)[0]}, phase=DELETE),
+    Scenario('bulk-follow', 'follow/bulk/', 'POST', lambda fx, i: {'data': {'user_ids': fx.sample_users(50)}}, phase=WRITE),
+    Scenario('bulk-unfollow', 'unfollow/bulk/', 'DELETE', lambda fx, i: {'data': {'user_ids': fx.sample_users(50)}}, phase=DELETE),
+    Scenario('relationships', 'relationships/', 'POST', lambda fx, i: {'data': {'user_ids': fx.sample_users(100)}}),
+    Scenario('followers', 'followers/', 'GET', lambda fx, i: {}),
+    Scenario('following', 'following/', 'GET', lambda fx, i: {}),
+    Scenario('suggestions', 'suggestions/', 'GET', lambda fx, i: {}),
+    # Feed and search
+    Scenario('feed', 'feed/', 'GET', lambda fx, i: {}),
+    Scenario('search', 'search/', 'GET', lambda fx, i: {'query': {'q': fx.words(2)}}),
+    # Operations
+    Scenario('db-pool-status', 'db/pool/', 'GET', lambda fx, i: {}, auth='admin'),
+    Scenario('metrics', 'metrics/', 'GET', lambda fx, i: {}, auth='admin'),
+    # Async read endpoints
+    Scenario('async view-profile', 'async/view-profile/', 'GET', lambda fx, i: {}),
+    Scenario('async view-profile/<id>', 'async/view-profile/<int:profile_id>/', 'GET', lambda fx, i: {'kwargs': {'profile_id': fx.pick(fx.profile_ids, i)}}),
+    Scenario('async list_posts', 'async/list_posts/', 'GET', lambda fx, i: {}),
+    Scenario('async list_posts/<id>', 'async/list_posts/<int:post_id>/', 'GET', lambda fx, i: {'kwargs': {'post_id': fx.pick(fx.post_ids, i)}}),
+    Scenario('async list_comments', 'async/list_comments/', 'GET', lambda fx, i: {}),
+    Scenario('async list_comments/<id>', 'async/list_comments/<int:comment_id>/', 'GET', lambda fx, i: {'kwargs': {'comment_id': fx.pick(fx.comment_ids, i)}}),
+    Scenario('async followers', 'async/followers/', 'GET', lambda fx, i: {}),
+    Scenario('async following', 'async/following/', 'GET', lambda fx, i: {}),
+]
+
+
+def app_routes():
+    # route string -> URL name for every pattern in app/urls.py
+    return {str(pattern.pattern): pattern.name for pattern in app_urls.urlpatterns if isinstance(pattern, URLPattern)}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a synthetic dataset and drives every route in app/urls.py at a fixed concurrency, '
+        'reporting latency percentiles, requests/sec, status codes and queries per request as JSON. '
+        'Writes to the configured database: point it at a stand-in (e.g. DB_ENGINE=sqlite).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=int, default=5)
+        parser.add_argument('--comments-per-post', type=int, default=2)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--alpha', type=float, default=1.1, help='Zipf exponent of the follower distribution')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the data and the requests')
+        parser.add_argument('--prefix', default='bench', help='Seeded users are <prefix>-<n>@example.com')
+        parser.add_argument('--reuse', action='store_true', help='Keep an existing dataset instead of reseeding it')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--only', action='append', default=[], help='Run scenarios whose name contains this (repeatable)')
+        parser.add_argument('--read-only', action='store_true', help='Skip scenarios that write or delete')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def build_environ(self, factory, fixture, scenario, i):
+        spec = scenario.build(fixture, i)
+        path = '/app/' + scenario.route
+        for key, value in (spec.get('kwargs') or {}).items():
+            path = re.sub(rf'<(?:\w+:)?{key}>', str(value), path)
+        if spec.get('query'):
+            path = f"{path}?{urlencode(spec['query'])}"
+
+        headers = {}
+        user_id = spec.get('as') or (fixture.staff_id if scenario.auth == 'admin' else fixture.actor(i) if scenario.auth else None)
+        if user_id:
+            headers['HTTP_AUTHORIZATION'] = f"Bearer {fixture.tokens(user_id)['access']}"
+        body = json.dumps(spec['data']) if 'data' in spec else ''
+        return factory.generic(scenario.method, path, body, content_type='application/json', **headers).environ
+
+    def run(self, handler, scenario, environs, concurrency):
+        def request(environ):
+            statuses = []
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append((status, dict(headers))))
+            try:
+                for _chunk in response:
+                    pass
+            finally:
+                response.close()
+            elapsed = time.perf_counter() - started
+            status, headers = statuses[0]
+            match = QUERIES_RE.search(headers.get('Server-Timing', ''))
+            return elapsed, int(status.split()[0]), int(match.group(1)) if match else None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, environs))
+        summary = summarize([latency for latency, _, _ in results], time.perf_counter() - started)
+        queries = [count for _, _, count in results if count is not None]
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2) if queries else None
+        statuses = Counter(code for _, code, _ in results)
+        summary['statuses'] = {str(code): count for code, count in sorted(statuses.items())}
+        # Latencies of failed requests say nothing about the endpoint
+        summary['errors'] = sum(count for code, count in statuses.items() if not scenario.expected(code))
+        return summary
+
+    def handle(self, *args, **options):
+        dataset = {name: options[name] for name in ('users', 'posts_per_user', 'comments_per_post', 'follows_per_user', 'alpha', 'seed')}
+        if not (options['reuse'] and dataset_users(options['prefix']).exists()):
+            delete_dataset(options['prefix'])
+            started = time.perf_counter()
+            counts = seed_dataset(
+                users=options['users'], posts_per_user=options['posts_per_user'],
+                comments_per_post=options['comments_per_post'], follows_per_user=options['follows_per_user'],
+                alpha=options['alpha'], random_seed=options['seed'], prefix=options['prefix'],
+            )
+            self.stderr.write(f'seeded {counts} in {time.perf_counter() - started:.1f}s')
+
+        routes = app_routes()
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if (not options['only'] or any(part in scenario.name for part in options['only']))
+            and not (options['read_only'] and scenario.phase != READ)
+        ]
+        report = {
+            'revision': git_revision(),
+            'dataset': dataset,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            # Routes added to app/urls.py without a scenario show up here
+            'uncovered_routes': sorted(set(routes) - {scenario.route for scenario in SCENARIOS}),
+            'results': {},
+        }
+
+        fixture = Fixture(options['prefix'], 'bench-password', options['seed'])
+        factory = RequestFactory(SERVER_NAME='localhost')
+        handler = WSGIHandler()
+        # Server-Timing carries the per-request query count back from PerformanceMiddleware
+        with override_settings(THROTTLE_ENABLED=False, METRICS_SERVER_TIMING=True):
+            for scenario in sorted(scenarios, key=lambda scenario: scenario.phase):
+                environs = [self.build_environ(factory, fixture, scenario, i) for i in range(options['requests'])]
+                result = self.run(handler, scenario, environs, options['concurrency'])
+                result.update(method=scenario.method, route=scenario.route)
+                report['results'][scenario.name] = result
+                errors = f", {result['errors']} unexpected statuses {result['statuses']}" if result['errors'] else ''
+                self.stderr.write(f"{scenario.name}: {result['per_second']} req/s, p99 {result['p99_ms']} ms{errors}")
+
+        report['failed'] = [name for name, result in report['results'].items() if result['errors']]
+        dump(report, self.stdout, options['output'])
+        if report['failed']:
+            raise CommandError(f"Unexpected responses from {len(report['failed'])} scenarios: {', '.join(report['failed'])}")
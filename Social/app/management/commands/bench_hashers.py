@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher, BCryptSHA256PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher,
+)
+from django.core.management.base import BaseCommand
+
+from app.bench import dump, git_revision, summarize
+from app.hashers import TunedArgon2PasswordHasher, TunedPBKDF2PasswordHasher
+
+PASSWORD = 'correct horse battery staple'
+
+
+def argon2_hasher(spec):
+    # '2,19456,1' -> Argon2 hasher with time_cost=2, memory_cost=19456 KiB, parallelism=1
+    time_cost, memory_cost, parallelism = (int(part) for part in spec.split(','))
+    return type('Argon2', (Argon2PasswordHasher,), {
+        'time_cost': time_cost, 'memory_cost': memory_cost, 'parallelism': parallelism,
+    })()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures password verifications (the CPU cost of a login) per second per core for each '
+        'hasher configuration, on one thread and on a pool of --workers threads'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help='Verifications per configuration and run')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument(
+            '--argon2', action='append', default=[], metavar='T,M,P',
+            help='Extra Argon2 configuration as time_cost,memory_cost_kib,parallelism (repeatable)',
+        )
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def configurations(self, argon2_specs):
+        configurations = {
+            'pbkdf2_sha256/django': PBKDF2PasswordHasher(),
+            'pbkdf2_sha256/settings': TunedPBKDF2PasswordHasher(),
+            'argon2/django': Argon2PasswordHasher(),
+            'argon2/settings': TunedArgon2PasswordHasher(),
+            'bcrypt_sha256/django': BCryptSHA256PasswordHasher(),
+            'scrypt/django': ScryptPasswordHasher(),
+        }
+        for spec in argon2_specs:
+            configurations[f'argon2/{spec}'] = argon2_hasher(spec)
+        return configurations
+
+    def measure(self, hasher, encoded, logins, workers):
+        def verify(_):
+            started = time.perf_counter()
+            hasher.verify(PASSWORD, encoded)
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            latencies = list(pool.map(verify, range(logins)))
+        return summarize(latencies, time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        cores = min(workers, os.cpu_count() or 1)
+        report = {'revision': git_revision(), 'logins': options['logins'], 'workers': workers, 'results': {}}
+
+        for name, hasher in self.configurations(options['argon2']).items():
+            try:
+                encoded = hasher.encode(PASSWORD, hasher.salt())
+            except ValueError as error:  # optional library (argon2-cffi, bcrypt) not installed
+                report['results'][name] = {'skipped': str(error)}
+                continue
+            single = self.measure(hasher, encoded, options['logins'], 1)
+            pooled = self.measure(hasher, encoded, options['logins'], workers)
+            report['results'][name] = {
+                'hash_length': len(encoded),
+                'single_thread': single,
+                'pool': pooled,
+                'logins_per_second_per_core': round(pooled['per_second'] / cores, 1),
+            }
+
+        dump(report, self.stdout, options['output'])
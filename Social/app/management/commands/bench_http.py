@@ -0,0 +1,78 @@
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import dump, git_revision, summarize
+
+# Paths relative to each target's base URL: /app/ on the WSGI server, /app/async/ on the ASGI one
+DEFAULT_PATHS = ['list_posts/', 'view-profile/', 'list_comments/', 'followers/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests running servers at a fixed concurrency and reports throughput and latency '
+        'percentiles per target and path, e.g. --target wsgi=http://127.0.0.1:8000/app/ '
+        '--target asgi=http://127.0.0.1:8001/app/async/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=BASE_URL')
+        parser.add_argument('--path', action='append', help=f'Path under each base URL (default: {DEFAULT_PATHS})')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per target and path')
+        parser.add_argument('--concurrency', type=int, default=32, help='Requests in flight at once')
+        parser.add_argument('--warmup', type=int, default=50, help='Unmeasured requests sent first')
+        parser.add_argument('--token', help='Access token sent as a Bearer Authorization header')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def fetch(self, url, headers, timeout):
+        request = urllib.request.Request(url, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                response.read()
+                code = response.status
+        except urllib.error.HTTPError as error:
+            code = error.code
+        except (urllib.error.URLError, OSError):
+            code = None
+        return time.perf_counter() - started, code
+
+    def run(self, url, options, headers):
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(lambda _: self.fetch(url, headers, options['timeout']), range(options['warmup'])))
+            started = time.perf_counter()
+            results = list(pool.map(lambda _: self.fetch(url, headers, options['timeout']), range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, code in results if code is not None and code < 400]
+        summary = summarize(latencies, elapsed)
+        summary['errors'] = len(results) - len(latencies)
+        return summary
+
+    def handle(self, *args, **options):
+        targets = {}
+        for target in options['target']:
+            name, separator, base_url = target.partition('=')
+            if not separator or not base_url:
+                raise CommandError(f'--target must look like NAME=BASE_URL, got {target!r}')
+            targets[name] = base_url if base_url.endswith('/') else f'{base_url}/'
+
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Bearer {options['token']}"
+
+        report = {
+            'revision': git_revision(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'results': {},
+        }
+        for path in options['path'] or DEFAULT_PATHS:
+            for name, base_url in targets.items():
+                report['results'][f'{name}/{path}'] = self.run(base_url + path.lstrip('/'), options, headers)
+
+        dump(report, self.stdout, options['output'])
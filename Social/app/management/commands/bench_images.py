@@ -0,0 +1,52 @@
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.bench import dump, git_revision
+from app.images import VARIANTS, render_variants
+
+
+class Command(BaseCommand):
+    help = 'Measures image variant throughput per core and peak worker memory on synthetic photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=6000)
+        parser.add_argument('--height', type=int, default=4000)
+        parser.add_argument('--images', type=int, default=24, help='Images processed per run')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as workdir:
+            # Noise defeats JPEG compression, so decoding costs as much as a real photo
+            source = os.path.join(workdir, 'source.jpg')
+            Image.effect_noise((options['width'], options['height']), 64).convert('RGB').save(source, quality=90)
+
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                futures = [
+                    pool.submit(render_variants, source, workdir, f'bench{number}', VARIANTS, settings.IMAGE_WEBP_QUALITY)
+                    for number in range(options['images'])
+                ]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+
+        per_second = options['images'] / elapsed
+        dump({
+            'revision': git_revision(),
+            'source_pixels': options['width'] * options['height'],
+            'workers': options['workers'],
+            'images_per_second': round(per_second, 2),
+            'images_per_second_per_core': round(per_second / options['workers'], 2),
+            # Linux reports ru_maxrss in KiB: the largest resident set of any finished worker
+            'peak_worker_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            'seconds': round(elapsed, 2),
+        }, self.stdout, options['output'])
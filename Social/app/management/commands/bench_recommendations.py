@@ -0,0 +1,110 @@
+import random
+import time
+from array import array
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import dump, git_revision, summarize
+from app.recommendations import METHODS, FollowGraph, numpy
+from app.seeding import DEGREE_DISTRIBUTIONS, follow_targets, out_degree
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the who-to-follow batch job: building the CSR follow graph and scoring users with each '
+        'ranking and backend. The default synthetic graph has about 10M edges and is generated in memory '
+        'with the seed_social distributions; --source database loads the Follow table instead'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=('synthetic', 'database'), default='synthetic')
+        parser.add_argument('--users', type=int, default=500000, help='Synthetic graph size')
+        parser.add_argument('--follows-per-user', type=int, default=20, help='Mean accounts followed per user')
+        parser.add_argument('--degree', choices=DEGREE_DISTRIBUTIONS, default='pareto')
+        parser.add_argument('--alpha', type=float, default=1.1, help='Zipf exponent for who gets followed')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--sample', type=int, default=1000, help='Users scored per ranking and backend')
+        parser.add_argument('--limit', type=int, help='Suggestions per user (default SUGGESTION_COUNT)')
+        parser.add_argument('--hub-degree', type=int, help='Default SUGGESTION_HUB_DEGREE')
+        parser.add_argument('--method', action='append', choices=METHODS, help='Ranking to measure (repeatable, default all)')
+        parser.add_argument('--backend', action='append', choices=('python', 'numpy'), help='Default all installed')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def synthetic_graph(self, options, report):
+        # Same edges as seed_social with the same options, kept as node numbers
+        rng = random.Random(f"{options['seed']}:follows")
+        users = options['users']
+        sources, targets = array('i'), array('i')
+        started = time.perf_counter()
+        for follower in range(users):
+            degree = out_degree(rng, options['degree'], options['follows_per_user'], users - 1)
+            followed = sorted(follow_targets(rng, follower, users, degree, options['alpha']))
+            sources.extend([follower] * len(followed))
+            targets.extend(followed)
+        report['generate_seconds'] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        graph = FollowGraph.from_dense(users, sources, targets)
+        report['build_seconds'] = round(time.perf_counter() - started, 3)
+        return graph
+
+    def database_graph(self, report):
+        started = time.perf_counter()
+        graph = FollowGraph.load()
+        report['load_seconds'] = round(time.perf_counter() - started, 3)
+        return graph
+
+    def handle(self, *args, **options):
+        backends = options['backend'] or (['python', 'numpy'] if numpy is not None else ['python'])
+        if 'numpy' in backends and numpy is None:
+            raise CommandError('NumPy is not installed')
+        methods = options['method'] or list(METHODS)
+
+        graph_report = {}
+        if options['source'] == 'synthetic':
+            graph = self.synthetic_graph(options, graph_report)
+        else:
+            graph = self.database_graph(graph_report)
+        if not graph.edge_count:
+            raise CommandError('The graph has no edges (see seed_social)')
+        seconds = graph_report.get('build_seconds', graph_report.get('load_seconds'))
+        graph_report.update({
+            'users': len(graph),
+            'edges': graph.edge_count,
+            'bytes': graph.nbytes,
+            'bytes_per_edge': round(graph.nbytes / graph.edge_count, 2),
+            'edges_per_second': round(graph.edge_count / seconds, 1) if seconds else None,
+        })
+
+        rng = random.Random(options['seed'])
+        active = [node for node in rng.sample(range(len(graph)), min(len(graph), options['sample'] * 2)) if len(graph.following(node))]
+        sample = active[:options['sample']]
+
+        results, tops = {}, {}
+        for backend in backends:
+            for method in methods:
+                latencies, found = [], []
+                for node in sample:
+                    started = time.perf_counter()
+                    top = graph.top(node, method, options['limit'], options['hub_degree'], backend)
+                    latencies.append(time.perf_counter() - started)
+                    found.append(top)
+                summary = summarize(latencies)
+                summary['mean_suggestions'] = round(sum(len(top) for top in found) / len(found), 2) if found else 0.0
+                # One process scoring every user of the graph at this rate
+                summary['full_rebuild_seconds'] = round(len(graph) / summary['per_second'], 1) if summary['per_second'] else None
+                results[f'{backend}/{method}'] = summary
+                tops[backend, method] = [[(node, mutual) for node, _, mutual in top] for top in found]
+
+        report = {
+            'revision': git_revision(),
+            'source': options['source'],
+            'options': {name: options[name] for name in ('users', 'follows_per_user', 'degree', 'alpha', 'seed', 'sample')},
+            'graph': graph_report,
+            'sampled_users': len(sample),
+            'results': results,
+        }
+        if len(backends) > 1:
+            # Mutual counts are integers, so both backends must rank exactly alike
+            report['backends_agree'] = tops['python', 'mutual'] == tops['numpy', 'mutual'] if 'mutual' in methods else None
+        dump(report, self.stdout, options['output'])
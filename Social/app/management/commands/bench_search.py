@@ -0,0 +1,47 @@
+import random
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+
+from app.bench import dump, git_revision, summarize
+from app.search import InvertedIndex
+
+
+class Command(BaseCommand):
+    help = 'Measures BM25 query latency of the in-memory index on synthetic posts (no database needed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=30, help='Tokens per document')
+        parser.add_argument('--vocabulary', type=int, default=50_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = [f'w{rank}' for rank in range(options['vocabulary'])]
+        # Zipf-like word frequencies, like natural text
+        weights = list(accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+        index = InvertedIndex()
+        started = time.perf_counter()
+        for pk in range(options['docs']):
+            index.add(('post', pk), ' '.join(rng.choices(vocabulary, cum_weights=weights, k=options['words'])))
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        for _ in range(options['queries']):
+            query = ' '.join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(1, 3)))
+            started = time.perf_counter()
+            index.search(query, limit=20)
+            latencies.append(time.perf_counter() - started)
+
+        dump({
+            'revision': git_revision(),
+            'documents': len(index),
+            'terms': len(index.postings),
+            'build_seconds': round(build_seconds, 2),
+            'query': summarize(latencies),
+        }, self.stdout, options['output'])
@@ -0,0 +1,99 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from app.bench import dump, git_revision
+from app.fastpath import COMMENT_ROWS, FOLLOW_ROWS, POST_ROWS, PROFILE_ROWS
+from app.models import Comment, Follow, Post, Profile
+from app.renderers import FastJSONRenderer, orjson
+
+# name -> (queryset the list views serialize, row serializer); querysets as the views build them
+TARGETS = {
+    'post': (lambda: Post.objects.order_by('id'), POST_ROWS),
+    'comment': (lambda: Comment.objects.order_by('id'), COMMENT_ROWS),
+    'follow': (lambda: Follow.objects.order_by('id'), FOLLOW_ROWS),
+    'profile': (lambda: Profile.objects.select_related('user').order_by('id'), PROFILE_ROWS),
+}
+
+
+def best_of(repeat, function):
+    # Fastest of `repeat` runs, the least disturbed by the rest of the machine
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Rows per second through each DRF serializer and its app.fastpath row serializer, split into '
+        'fetch, to-dict and render, and whether both paths produce the same bytes. Needs existing rows '
+        '(see seed_social)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows per serializer')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the fastest is reported')
+        parser.add_argument('--only', action='append', choices=sorted(TARGETS), help='Serializer to measure (repeatable)')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def measure(self, queryset, row_serializer, limit, repeat):
+        serializer_class = row_serializer.serializer_class
+        drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+
+        fetch, objects = best_of(repeat, lambda: list(queryset[:limit]))
+        fetch_rows, rows = best_of(repeat, lambda: list(row_serializer.project(queryset)[:limit]))
+        if not objects:
+            return None
+        count = len(objects)
+
+        serialize, data = best_of(repeat, lambda: serializer_class(objects, many=True).data)
+        render, drf_bytes = best_of(repeat, lambda: drf_renderer.render(data))
+        to_dict, fast_data = best_of(repeat, lambda: row_serializer.many(rows))
+        fast_render, fast_bytes = best_of(repeat, lambda: fast_renderer.render_json(fast_data))
+
+        drf_total, fast_total = fetch + serialize + render, fetch_rows + to_dict + fast_render
+        return {
+            'rows': count,
+            'identical': drf_bytes == fast_bytes,
+            'bytes': len(drf_bytes),
+            'drf': {
+                'fetch_rows_per_second': rate(count, fetch),
+                'serialize_rows_per_second': rate(count, serialize),
+                'render_rows_per_second': rate(count, render),
+                'rows_per_second': rate(count, drf_total),
+            },
+            'fast': {
+                'fetch_rows_per_second': rate(count, fetch_rows),
+                'serialize_rows_per_second': rate(count, to_dict),
+                'render_rows_per_second': rate(count, fast_render),
+                'rows_per_second': rate(count, fast_total),
+            },
+            'speedup': round(drf_total / fast_total, 2) if fast_total else None,
+        }
+
+    def handle(self, *args, **options):
+        report = {
+            'revision': git_revision(),
+            'renderer': 'orjson' if orjson else 'json',
+            'rows': options['rows'],
+            'repeat': options['repeat'],
+            'results': {},
+        }
+        for name in options['only'] or TARGETS:
+            queryset, row_serializer = TARGETS[name]
+            result = self.measure(queryset(), row_serializer, options['rows'], options['repeat'])
+            report['results'][name] = result or {'skipped': 'no rows, run seed_social first'}
+
+        if not any('rows' in result for result in report['results'].values()):
+            raise CommandError('Nothing to measure, the tables are empty (see seed_social)')
+        if not all(result.get('identical', True) for result in report['results'].values()):
+            self.stderr.write('The fast path output differs from the DRF serializers, see "identical"')
+        dump(report, self.stdout, options['output'])
@@ -0,0 +1,42 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from app.models import MediaBlob, Post, Profile
+from app.storage import content_addressed, delete_media_files
+
+
+class Command(BaseCommand):
+    help = 'Recounts references to content-addressed media and deletes files nothing points at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without deleting')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        references = Counter()
+        for name in Post.objects.exclude(image='').exclude(image=None).values_list('image', flat=True).iterator(chunk_size=chunk_size):
+            references[name] += 1
+        for name in Profile.objects.exclude(profile_picture='').exclude(profile_picture=None).values_list('profile_picture', flat=True).iterator(chunk_size=chunk_size):
+            references[name] += 1
+
+        deleted = corrected = 0
+        for blob in MediaBlob.objects.iterator(chunk_size=chunk_size):
+            expected = references.pop(blob.name, 0)
+            if expected == 0:
+                deleted += 1
+                if not options['dry_run']:
+                    blob.delete()
+                    delete_media_files(blob.name)
+            elif expected != blob.ref_count:
+                corrected += 1
+                if not options['dry_run']:
+                    MediaBlob.objects.filter(pk=blob.pk).update(ref_count=expected)
+
+        # Stored files referenced by rows but missing a MediaBlob (e.g. a crash between file and row write)
+        missing = {name: count for name, count in references.items() if content_addressed(name)}
+        if missing and not options['dry_run']:
+            MediaBlob.objects.bulk_create([MediaBlob(name=name, ref_count=count) for name, count in missing.items()], ignore_conflicts=True)
+
+        self.stdout.write(f'orphans deleted: {deleted}, counts corrected: {corrected}, blobs recreated: {len(missing)}')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from app.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the post and comment search index from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = backend.rebuild(options['chunk_size'])
+        self.stdout.write(f'{type(backend).__name__}: indexed {total} document(s)')
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.recommendations import METHODS, rebuild_suggestions, refresh_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes who-to-follow suggestions for users whose follows changed since the last run, '
+        'or for everyone with --full'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every user from one load of the whole follow graph')
+        parser.add_argument('--method', choices=METHODS, help='Ranking (default SUGGESTION_METHOD)')
+        parser.add_argument('--batch-size', type=int, help='Users per transaction (default SUGGESTION_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing instead of exiting when nothing is stale')
+        parser.add_argument('--interval', type=float, default=30.0, help='Seconds to sleep between runs in --loop mode')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            started = time.perf_counter()
+            users, written = rebuild_suggestions(options['method'], options['batch_size'])
+            self.stdout.write(f'rebuilt {users} users, {written} suggestions in {time.perf_counter() - started:.1f}s')
+            return
+
+        while True:
+            users, written = refresh_suggestions(options['method'], options['batch_size'])
+            if users:
+                self.stdout.write(f'refreshed {users} users, {written} suggestions')
+            if not options['loop']:
+                break
+            # Each run takes every user marked so far, so there is nothing to do until more are marked
+            time.sleep(options['interval'])
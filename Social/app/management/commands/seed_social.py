@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.bench import dump, git_revision
+from app.models import Comment, Follow, Post, Profile, User
+from app.seeding import DEGREE_DISTRIBUTIONS, StreamingSeeder, dataset_users, delete_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads a large synthetic dataset (users, profiles, follows, posts, comments) with batched bulk inserts '
+        'and reports rows/sec per table. Home feed timelines are not filled; run rebuild_search_index afterwards '
+        'to make the posts searchable.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts-per-user', type=int, default=10, help='Mean posts per user')
+        parser.add_argument('--comments-per-post', type=int, default=3, help='Mean comments per post')
+        parser.add_argument('--follows-per-user', type=int, default=30, help='Mean accounts followed per user')
+        parser.add_argument('--degree', choices=DEGREE_DISTRIBUTIONS, default='pareto', help='Distribution of accounts followed per user')
+        parser.add_argument('--alpha', type=float, default=1.1, help='Zipf exponent for who gets followed (0 = uniform)')
+        parser.add_argument('--days', type=int, default=365, help='Spread timestamps over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT')
+        parser.add_argument('--transaction-batches', type=int, default=20, help='INSERTs per transaction')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same options produce the same rows')
+        parser.add_argument('--prefix', default='seed', help='Users are <prefix>-<n>@example.com')
+        parser.add_argument('--password', default='seed-password', help='Password shared by every seeded user')
+        parser.add_argument('--replace', action='store_true', help='Delete an existing dataset with the same prefix first')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if dataset_users(options['prefix']).exists():
+            if not options['replace']:
+                raise CommandError(f"A dataset with prefix {options['prefix']!r} exists; pass --replace or another --prefix")
+            delete_dataset(options['prefix'])
+
+        seeder = StreamingSeeder(
+            users=options['users'], posts_per_user=options['posts_per_user'],
+            comments_per_post=options['comments_per_post'], follows_per_user=options['follows_per_user'],
+            degree=options['degree'], alpha=options['alpha'], days=options['days'], random_seed=options['seed'],
+            prefix=options['prefix'], password=options['password'], batch_size=options['batch_size'],
+            transaction_batches=options['transaction_batches'],
+        )
+        # Order matters: later generators use ids and arrays filled by earlier ones
+        phases = [
+            ('users', lambda: seeder.load(User, seeder.user_rows())),
+            ('profiles', lambda: seeder.load(Profile, seeder.profile_rows())),
+            ('follows', lambda: seeder.load(Follow, seeder.follow_rows())),
+            ('posts', lambda: seeder.load(Post, seeder.post_rows())),
+            ('comments', lambda: seeder.load(Comment, seeder.comment_rows())),
+            ('follow_counts', seeder.reconcile_follow_counts),
+        ]
+
+        report = {'revision': git_revision(), 'options': {
+            name: options[name] for name in (
+                'users', 'posts_per_user', 'comments_per_post', 'follows_per_user', 'degree', 'alpha',
+                'batch_size', 'transaction_batches', 'seed',
+            )
+        }, 'phases': {}}
+        started = time.perf_counter()
+        inserted = 0
+        for name, run in phases:
+            phase_started = time.perf_counter()
+            rows = run()
+            elapsed = time.perf_counter() - phase_started
+            report['phases'][name] = {'rows': rows, 'seconds': round(elapsed, 2), 'rows_per_second': round(rows / elapsed) if elapsed else None}
+            if name != 'follow_counts':
+                inserted += rows
+            self.stderr.write(f"{name}: {rows} rows in {elapsed:.1f}s")
+
+        elapsed = time.perf_counter() - started
+        report['total'] = {'rows': inserted, 'seconds': round(elapsed, 2), 'rows_per_second': round(inserted / elapsed) if elapsed else None}
+        dump(report, self.stdout, options['output'])
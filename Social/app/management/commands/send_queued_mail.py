@@ -0,0 +1,43 @@
+import logging
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from app.outbox import drain_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Sends queued emails in batches over one reused mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Emails claimed per batch (default OUTBOX_BATCH_SIZE)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep between polls in --loop mode')
+
+    def handle(self, *args, **options):
+        connection = get_connection()
+        try:
+            while True:
+                try:
+                    sent, failed = drain_outbox(connection, options['batch_size'])
+                except Exception:
+                    if not options['loop']:
+                        raise
+                    # Database or mail server trouble; keep the worker alive and try again after a pause
+                    logger.exception('Draining the outbox failed')
+                    connection.close()
+                    time.sleep(options['interval'])
+                    continue
+                if sent or failed:
+                    self.stdout.write(f'sent {sent}, failed {failed}')
+                    continue
+                if not options['loop']:
+                    break
+                # Do not hold an idle SMTP session open between polls
+                connection.close()
+                time.sleep(options['interval'])
+        finally:
+            connection.close()
@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import OneTimePassword
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired one-time passcodes in batches. Meant to run from cron, e.g. every few minutes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Passcodes deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.05, help='Seconds to sleep between batches')
+        parser.add_argument('--grace', type=int, default=86400,
+                            help='Keep passcodes this many seconds past expiry, so verifying one still says it expired')
+
+    def handle(self, *args, **options):
+        # Walks otp_expires_idx, so each batch reads only expired rows
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        expired = OneTimePassword.objects.filter(expires_at__lt=cutoff).order_by('expires_at')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            OneTimePassword.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+            time.sleep(options['pause'])
+        self.stdout.write(f'deleted {deleted} expired passcode(s)')
@@ -0,0 +1,153 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .db.pool import pool_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            row = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[index] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(row) for labels, row in self._values.items()}
+        for labels, row in sorted(values.items()):
+            for bound, count in zip(self.buckets, row):
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {count}'
+            yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {row[-2]}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(row[-1])}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {row[-2]}'
+
+
+REQUESTS = Counter('social_requests_total', 'Requests served, by view, method and status code', ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram('social_request_duration_seconds', 'Time to produce a response, by view', ('view', 'method'))
+DB_QUERIES = Histogram('social_db_queries_per_request', 'SQL queries run per request, by view', ('view',), QUERY_COUNT_BUCKETS)
+DB_TIME = Counter('social_db_query_seconds_total', 'Time spent executing SQL, by view', ('view',))
+DUPLICATE_QUERIES = Counter('social_db_duplicate_queries_total', 'Queries that repeated an earlier query of the same request', ('view',))
+SERIALIZATION_TIME = Counter('social_serialization_seconds_total', 'Time spent building and rendering response bodies, by view', ('view',))
+
+REGISTRY = [REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_TIME, DUPLICATE_QUERIES, SERIALIZATION_TIME]
+
+
+class RequestStats:
+    """
+    What one request spent its time on, filled in by the DB execute wrapper, the serializers and the renderer.
+    """
+
+    def __init__(self):
+        self.queries = {}  # SQL with placeholders -> times executed
+        self.query_count = 0
+        self.db_seconds = 0.0
+        self.serialization_seconds = 0.0
+
+    @property
+    def duplicate_queries(self):
+        return sum(count - 1 for count in self.queries.values())
+
+
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+def record_serialization(seconds):
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.serialization_seconds += seconds
+
+
+_serializing = ContextVar('_serializing', default=False)
+
+
+@contextmanager
+def serialization_timer():
+    # Times turning objects into response data; only the outermost call counts,
+    # so a serializer nested in another one is not added twice
+    if _serializing.get() or current_request_stats.get() is None:
+        yield
+        return
+    token = _serializing.set(True)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _serializing.reset(token)
+        record_serialization(time.perf_counter() - started)
+
+
+def render_prometheus():
+    """
+    All metrics of this process in the Prometheus text exposition format.
+
+    Every worker process keeps its own numbers; scrape each one, or sum them.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+
+    pools = pool_stats()
+    if pools:
+        for key in ('open', 'in_use', 'idle', 'max_size'):
+            lines.append(f'# TYPE social_db_pool_{key} gauge')
+            lines.extend(f'social_db_pool_{key}{_labels(("alias",), (alias,))} {stats[key]}' for alias, stats in pools.items())
+        for key in ('checkouts', 'waits', 'timeouts', 'connects', 'discarded', 'wait_seconds', 'connect_seconds'):
+            lines.append(f'# TYPE social_db_pool_{key}_total counter')
+            lines.extend(f'social_db_pool_{key}_total{_labels(("alias",), (alias,))} {_number(stats[key])}' for alias, stats in pools.items())
+    return '\n'.join(lines) + '\n'
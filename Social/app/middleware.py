@@ -0,0 +1,106 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import (
+    DB_QUERIES, DB_TIME, DUPLICATE_QUERIES, REQUEST_DURATION, REQUESTS, SERIALIZATION_TIME, RequestStats,
+    current_request_stats,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def record_query(execute, sql, params, many, context):
+    # Installed on every connection; only counts while a request is being measured
+    stats = current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_seconds += time.perf_counter() - started
+        stats.query_count += 1
+        stats.queries[sql] = stats.queries.get(sql, 0) + 1
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # A context variable rather than a per-request execute_wrapper(), so queries that async
+    # views run through sync_to_async on another thread are counted for the right request
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class PerformanceMiddleware:
+    """
+    Records latency, SQL query count and time, rendering time and duplicate
+    queries per view into app.metrics, served at app/metrics/.
+
+    Requests that repeat the same SQL at least METRICS_DUPLICATE_THRESHOLD
+    times are logged with the repeated statement (usually an N+1 loop). With
+    METRICS_SERVER_TIMING on, the numbers are also sent back in a
+    Server-Timing header for the browser's network panel. Streaming
+    responses are timed until their first byte.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        # Connections opened before the first request (e.g. by checks) miss connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, started = RequestStats(), time.perf_counter()
+        token = current_request_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats, started = RequestStats(), time.perf_counter()
+        token = current_request_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, elapsed):
+        match = getattr(request, 'resolver_match', None)
+        # URL names keep the label set small; unmatched paths share one label
+        view = (match.view_name or match._func_path) if match else '<unmatched>'
+
+        REQUESTS.inc((view, request.method, str(response.status_code)))
+        REQUEST_DURATION.observe((view, request.method), elapsed)
+        DB_QUERIES.observe((view,), stats.query_count)
+        DB_TIME.inc((view,), stats.db_seconds)
+        SERIALIZATION_TIME.inc((view,), stats.serialization_seconds)
+
+        duplicates = stats.duplicate_queries
+        if duplicates:
+            DUPLICATE_QUERIES.inc((view,), duplicates)
+            sql, count = max(stats.queries.items(), key=lambda item: item[1])
+            if count >= settings.METRICS_DUPLICATE_THRESHOLD:
+                logger.warning('%s ran the same query %d times in one request: %s', view, count, sql)
+
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.query_count} queries"',
+                f'ser;dur={stats.serialization_seconds * 1000:.2f}',
+                f'total;dur={elapsed * 1000:.2f}',
+            ])
+        return response
@@ -1,7 +1,13 @@
-from django.db import models
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, router
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.utils.translation import gettext_lazy as _
 from .managers import UserManager
+from .storage import content_storage, image_digest
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import AuthenticationFailed
 
@@ -16,6 +22,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     date_joined = models.DateTimeField(auto_now_add=True)
     last_login = models.DateTimeField(null=True, blank=True)
+    # Denormalized counters, kept in step by app.counters and fixed by `manage.py reconcile_counters`
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
@@ -30,9 +40,14 @@ class User(AbstractBaseUser, PermissionsMixin):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    # Copied into every token, so ClaimsJWTAuthentication can authenticate without a query
+    TOKEN_CLAIMS = ('is_active', 'is_verified')
+
     def tokens(self):
         try:
             refresh = RefreshToken.for_user(self)
+            for claim in self.TOKEN_CLAIMS:
+                refresh[claim] = getattr(self, claim)
             return {
                 'refresh': str(refresh),
                 'access': str(refresh.access_token)
@@ -42,10 +57,64 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 
 
+class ClaimsUser(User):
+    """
+    A User rebuilt from access token claims by app.authentication.
+
+    Only id, is_active and is_verified are loaded. Reading any other column
+    loads them all at once, from the cache when possible, so a request that
+    never touches them never queries the user table. The password hash and
+    the privilege flags are never cached; they are always read from the
+    database, so revoking staff access takes effect on the next request.
+    """
+
+    UNCACHED_FIELDS = frozenset({'password', 'is_staff', 'is_superuser'})
+
+    class Meta:
+        proxy = True
+
+    @classmethod
+    def cache_key(cls, pk):
+        return f'user:{pk}:row'
+
+    @classmethod
+    def forget(cls, pks):
+        # For writes that bypass post_save, such as QuerySet.update()
+        cache.delete_many([cls.cache_key(pk) for pk in pks])
+
+    @classmethod
+    def from_claims(cls, pk, claims):
+        values = {'id': pk, **{claim: claims[claim] for claim in User.TOKEN_CLAIMS}}
+        names = [field.attname for field in cls._meta.concrete_fields if field.attname in values]
+        return cls.from_db(router.db_for_read(cls), names, [values[name] for name in names])
+
+    def _cached_row(self):
+        key = self.cache_key(self.pk)
+        row = cache.get(key)
+        if row is None:
+            columns = [field.attname for field in self._meta.concrete_fields if field.attname not in self.UNCACHED_FIELDS]
+            row = User.objects.filter(pk=self.pk).values(*columns).first()
+            if row is None:
+                raise User.DoesNotExist
+            cache.set(key, row, settings.USER_CACHE_TTL)
+        return row
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and not self.UNCACHED_FIELDS.intersection(fields) and set(fields) <= deferred:
+            row = self._cached_row()
+            for name in deferred & set(row):
+                setattr(self, name, row[name])
+            return
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, null=True)
-    profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    profile_picture = models.ImageField(upload_to='profile_pics/', storage=content_storage, blank=True, null=True)
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)  # Resized WebP copies, see app.images
     location = models.CharField(max_length=100, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -80,15 +149,62 @@ class Post(models.Model):
     ]
 
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
-    image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='post_images/', storage=content_storage, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Resized WebP copies, see app.images
     title = models.CharField(max_length=255) 
     content = models.TextField()
     categories = models.CharField(max_length=50, choices=CATEGORY_CHOICES) 
+    comment_count = models.PositiveIntegerField(default=0)  # Denormalized, see app.counters
+    content_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)  # Duplicate check, see compute_content_hash
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        unique_together = ('author', 'content_hash')  # an author cannot publish the same post twice
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),  # feed merge and backfill
+            models.Index(fields=['categories', '-created_at', '-id'], name='post_category_recent_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.author.full_name()} - {self.content[:20]}"
+        return f"{self.author.full_name} - {self.content[:20]}"
+
+    @staticmethod
+    def compute_content_hash(content, image=None):
+        """
+        SHA-256 of the post text and the image bytes, so duplicates are found with an index probe.
+        """
+        digest = hashlib.sha256(content.encode('utf-8'))
+        if image:
+            try:
+                digest.update(b'\0' + image_digest(image).encode('ascii'))
+            except FileNotFoundError:
+                pass  # the stored file is gone; the text alone still identifies the post
+        return digest.hexdigest()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the stored content_hash was computed from; deferred fields count as unknown
+        instance._hashed = (instance.__dict__.get('content'), instance.__dict__.get('image'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Hashing reads the whole image unless it is content-addressed, so only
+        # when the content or image changed (or is being written explicitly)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            stale = not {'content', 'image'}.isdisjoint(update_fields)
+        else:
+            stale = (self.content_hash is None or not self.image._committed
+                     or getattr(self, '_hashed', None) != (self.content, self.image.name))
+        if stale:
+            self.content_hash = self.compute_content_hash(self.content, self.image)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
+        self._hashed = (self.content, self.image.name)
 
 
 class Comment(models.Model):
@@ -97,18 +213,86 @@ class Comment(models.Model):
     comments = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f"Comment by {self.user.full_name} on {self.post}"
 
 
 class OneTimePassword(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
-    code = models.CharField(max_length=6, unique=True)
-    created_at = models.CharField(max_length=6)
+    EMAIL_VERIFICATION = 'email_verification'
+    PURPOSE_CHOICES = [
+        (EMAIL_VERIFICATION, 'Email verification'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='one_time_passwords')
+    purpose = models.CharField(max_length=32, choices=PURPOSE_CHOICES, default=EMAIL_VERIFICATION)
+    code = models.CharField(max_length=6)  # Only unique per (user, purpose), looked up through that key
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    attempts = models.PositiveSmallIntegerField(default=0)  # Wrong guesses against this code
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        unique_together = ('user', 'purpose')
+        indexes = [
+            # Range scan for `manage.py sweep_otps`
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.first_name} - {self.purpose} passcode"
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)  # Storage name, cas/<2 hex>/<sha256>.<ext>
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)  # Posts and profiles pointing at this file
+    created_at = models.DateTimeField(auto_now_add=True)
+
     def __str__(self):
-        return f"{self.user.first_name} - passcode"
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+
+class OutgoingEmail(models.Model):
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.TextField()  # Comma separated recipients
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)  # Pushed back after each failed attempt; lease expiry while sending
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
 
 
 
@@ -119,7 +303,54 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following') #prevent a user from  following the same person twice
+        indexes = [
+            models.Index(fields=['following', 'follower'], name='follow_following_idx'),  # followers of a user, read from the index alone
+        ]
 
-        def __str__(self):
-            return f'{self.follower.email} follows {self.following.email}'
+    def __str__(self):
+        return f'{self.follower.email} follows {self.following.email}'
          
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(User, related_name='timeline', on_delete=models.CASCADE)  # The user whose home feed this row belongs to
+    post = models.ForeignKey(Post, related_name='timeline_entries', on_delete=models.CASCADE)
+    created_at = models.DateTimeField()  # Copy of post.created_at so the feed can be read from this table alone
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} in feed of {self.owner_id}'
+
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(User, related_name='follow_suggestions', on_delete=models.CASCADE)  # The user the suggestion is shown to
+    suggested = models.ForeignKey(User, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()  # Mutual count or Adamic-Adar, see SUGGESTION_METHOD
+    mutual_count = models.PositiveIntegerField()  # Accounts the user follows that follow `suggested`
+    rank = models.PositiveSmallIntegerField()  # 0 is the best suggestion
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='suggestion_user_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.suggested_id} suggested to {self.user_id} (#{self.rank})'
+
+
+
+class SuggestionRefresh(models.Model):
+    # A user whose suggestions are out of date since they followed or unfollowed someone, see app.recommendations
+    user = models.OneToOneField(User, related_name='+', on_delete=models.CASCADE)
+    marked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'suggestions of {self.user_id} marked stale at {self.marked_at}'
@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    """
+    Stores an email for the send_queued_mail worker instead of sending it in the request.
+    """
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(to),
+    )
+
+
+def _message(email, connection):
+    return EmailMessage(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to.split(','),
+        connection=connection,
+    )
+
+
+def _retry_later(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.status = OutgoingEmail.PENDING
+        # Exponential backoff: delay, 2x delay, 4x delay, ...
+        email.next_attempt_at = now + timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def _claim(batch_size, now):
+    """
+    Reserves a batch of due emails and commits before anything is sent.
+
+    Claimed rows are marked SENDING with next_attempt_at as the lease expiry,
+    so a batch left behind by a crashed worker is picked up again once the
+    lease runs out.
+    """
+    with transaction.atomic():
+        batch = list(
+            OutgoingEmail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[OutgoingEmail.PENDING, OutgoingEmail.SENDING], next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if batch:
+            OutgoingEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                status=OutgoingEmail.SENDING,
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE),
+            )
+    return batch
+
+
+def drain_outbox(connection=None, batch_size=None):
+    """
+    Sends one batch of due emails over a single mail connection.
+
+    The batch is claimed in a short transaction of its own, with SELECT ...
+    FOR UPDATE SKIP LOCKED, so several workers can drain the same table
+    without sending anything twice. Each message is then marked sent as soon
+    as the server accepts it; a crash can only repeat the one message that
+    was in flight, never the ones already delivered.
+    Returns (sent, failed) counts for the batch.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    connection = connection or get_connection()
+    now = timezone.now()
+    sent = failed = 0
+
+    batch = _claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    try:
+        connection.open()  # no-op when the connection is already open
+    except Exception as error:
+        # Mail server down or refusing us: the whole batch backs off, nothing was sent
+        for email in batch:
+            _retry_later(email, error, now)
+        return 0, len(batch)
+
+    for email in batch:
+        try:
+            _message(email, connection).send(fail_silently=False)
+        except Exception as error:
+            _retry_later(email, error, now)
+            failed += 1
+            # The server may have dropped us; start the next message on a fresh connection
+            connection.close()
+            try:
+                connection.open()
+            except Exception:
+                pass  # the next send retries the connect and fails on its own
+            continue
+        OutgoingEmail.objects.filter(pk=email.pk, status=OutgoingEmail.SENDING).update(
+            status=OutgoingEmail.SENT, sent_at=timezone.now(),
+        )
+        sent += 1
+
+    return sent, failed
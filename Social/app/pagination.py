@@ -0,0 +1,205 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _query_params(request):
+    # DRF requests expose query_params, plain Django requests only GET
+    return getattr(request, 'query_params', request.GET)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed ordering, e.g. ('id',) or ('-created_at', '-id').
+
+    The last field of the ordering must be unique so every row has a stable
+    position. Cursors are opaque base64 strings holding the ordering values of
+    the row a page starts after, so each page is a single index range scan
+    instead of an OFFSET that grows with the table.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, ordering=('id',), page_size=None, max_page_size=None):
+        self.ordering = tuple(ordering)
+        self.page_size = page_size or settings.PAGE_SIZE
+        self.max_page_size = max_page_size or settings.MAX_PAGE_SIZE
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.request = None
+
+    def get_page_size(self, request):
+        value = _query_params(request).get(self.page_size_query_param)
+        try:
+            size = int(value) if value else self.page_size
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values, reverse=False):
+        # isoformat() keeps microseconds, which the DRF encoder would truncate
+        payload = json.dumps({'v': values, 'r': int(reverse)}, default=lambda value: value.isoformat())
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, model, cursor):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+            reverse = bool(payload['r'])
+            if len(values) != len(self.ordering):
+                raise ValueError
+            # Turn the JSON values back into python values (datetimes, ints)
+            values = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+        except Exception:
+            raise NotFound('Invalid cursor')
+        return values, reverse
+
+    def _row_values(self, row):
+        names = [name.lstrip('-') for name in self.ordering]
+        if isinstance(row, dict):
+            return [row[name] for name in names]
+        return [getattr(row, name) for name in names]
+
+    def _keyset_filter(self, values, reverse, ordering):
+        # (a, b) after (x, y)  ==  a > x OR (a = x AND b > y)
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            clause = Q(**{f'{name}__{"lt" if descending else "gt"}': values[index]})
+            for previous, value in zip(ordering[:index], values):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def _ordering(self, reverse, ordering):
+        if not reverse:
+            return ordering
+        return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+    def read_cursor(self, request, model):
+        """
+        Returns (page_size, cursor, values, reverse) for the incoming request.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = _query_params(request).get(self.cursor_query_param)
+        if not cursor:
+            return page_size, None, None, False
+        values, reverse = self.decode_cursor(model, cursor)
+        return page_size, cursor, values, reverse
+
+    def window(self, queryset, values, reverse, ordering=None):
+        """
+        Filters and orders a queryset to the rows after the cursor position.
+
+        ordering lets a second source (e.g. a denormalized table) be paged with
+        the same cursor under its own column names.
+        """
+        ordering = tuple(ordering or self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, reverse, ordering))
+        return queryset.order_by(*self._ordering(reverse, ordering))
+
+    def _prepare(self, request, queryset):
+        page_size, cursor, values, reverse = self.read_cursor(request, queryset.model)
+        # Fetch one extra row to know whether another page exists
+        return self.window(queryset, values, reverse)[:page_size + 1], page_size, cursor, reverse
+
+    def finish(self, rows, page_size, cursor, reverse):
+        """
+        Trims the page_size + 1 rows fetched for a page and sets the cursors.
+        """
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+
+        self.next_cursor = self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(self._row_values(rows[-1]))
+        if rows and has_previous:
+            self.previous_cursor = self.encode_cursor(self._row_values(rows[0]), reverse=True)
+        return rows
+
+    def paginate(self, request, queryset):
+        queryset, page_size, cursor, reverse = self._prepare(request, queryset)
+        return self.finish(list(queryset), page_size, cursor, reverse)
+
+    async def apaginate(self, request, queryset):
+        queryset, page_size, cursor, reverse = self._prepare(request, queryset)
+        return self.finish([row async for row in queryset], page_size, cursor, reverse)
+
+    def restore(self, request, next_cursor=None, previous_cursor=None):
+        # Rebuilds the paginator state for a page served from cache
+        self.request = request
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_payload(self, data):
+        return {
+            'next': self.get_link(self.next_cursor),
+            'previous': self.get_link(self.previous_cursor),
+            'results': data,
+        }
+
+    def get_response(self, data):
+        return Response(self.get_payload(data), status=status.HTTP_200_OK)
+
+
+def wants_stream(request):
+    return _query_params(request).get('stream', '').lower() in ('1', 'true', 'ndjson')
+
+
+def stream_ndjson(queryset, serializer_class, context=None, chunk_size=None):
+    """
+    Export a queryset as newline delimited JSON, one serialized row per line.
+
+    Rows are pulled with .iterator() so at most one chunk is held in memory.
+    """
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    renderer = JSONRenderer()
+
+    def rows():
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            yield renderer.render(serializer_class(obj, context=context).data) + b'\n'
+
+    return _ndjson_response(rows())
+
+
+def astream_ndjson(queryset, serializer_class, context=None, chunk_size=None):
+    # stream_ndjson for async views, fetching with .aiterator() on the event loop
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    renderer = JSONRenderer()
+
+    async def rows():
+        async for obj in queryset.aiterator(chunk_size=chunk_size):
+            yield renderer.render(serializer_class(obj, context=context).data) + b'\n'
+
+    return _ndjson_response(rows())
+
+
+def _ndjson_response(rows):
+    response = StreamingHttpResponse(rows, content_type='application/x-ndjson')
+    response['X-Accel-Buffering'] = 'no'  # let nginx pass lines through as they are produced
+    return response
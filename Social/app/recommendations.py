@@ -0,0 +1,284 @@
+import heapq
+import math
+from array import array
+from functools import cached_property
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Follow, FollowSuggestion, SuggestionRefresh
+
+try:
+    import numpy
+except ImportError:  # optional, scoring then runs in pure Python over the same arrays
+    numpy = None
+
+# Who-to-follow: accounts followed by the accounts a user follows ("friends of
+# friends"), ranked by how many of them do (MUTUAL) or by Adamic-Adar, where a
+# mutual account that follows few others counts for more than one that follows
+# thousands. Suggestions are computed in batches and stored in FollowSuggestion;
+# follow and unfollow only mark users stale (SuggestionRefresh) for
+# `manage.py refresh_suggestions` to recompute.
+
+MUTUAL = 'mutual'
+ADAMIC_ADAR = 'adamic_adar'
+METHODS = (MUTUAL, ADAMIC_ADAR)
+
+_IN_BATCH = 1000  # ids per IN (...) clause, under SQLite's variable limit
+_DTYPES = {'q': 'int64', 'i': 'int32'}
+
+
+def _chunks(values, size=_IN_BATCH):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _to_array(typecode, values):
+    # NumPy result -> compact stdlib array of the same numbers
+    result = array(typecode)
+    result.frombytes(numpy.ascontiguousarray(values, dtype=_DTYPES[typecode]).tobytes())
+    return result
+
+
+class FollowGraph:
+    """
+    The follow graph in compressed sparse row form.
+
+    Users are numbered 0..n-1 in user id order (ids[i] is the user id of node
+    i). The accounts node i follows are targets[offsets[i]:offsets[i + 1]],
+    sorted. Held in `array`s, so 10M edges take 40MB of targets plus 8 bytes
+    per user, and NumPy (when installed) reads them without a copy.
+    """
+
+    def __init__(self, ids, offsets, targets):
+        self.ids = ids  # array('q')
+        self.offsets = offsets  # array('q'), len(ids) + 1
+        self.targets = targets  # array('i')
+
+    @classmethod
+    def from_dense(cls, node_count, sources, targets, ids=None):
+        """
+        Builds the graph from node numbers, edges sorted by source.
+        """
+        if numpy is not None:
+            counts = numpy.bincount(numpy.frombuffer(sources, dtype=numpy.int32), minlength=node_count)
+            offsets = _to_array('q', numpy.concatenate(([0], numpy.cumsum(counts))))
+        else:
+            offsets = array('q', [0]) * (node_count + 1)
+            for source in sources:
+                offsets[source + 1] += 1
+            for node in range(node_count):
+                offsets[node + 1] += offsets[node]
+        return cls(ids if ids is not None else array('q', range(node_count)), offsets, targets)
+
+    @classmethod
+    def from_edges(cls, sources, targets):
+        """
+        Builds the graph from user id edges (two array('q')) sorted by source.
+        """
+        if numpy is not None:
+            source_ids = numpy.frombuffer(sources, dtype=numpy.int64)
+            target_ids = numpy.frombuffer(targets, dtype=numpy.int64)
+            ids = numpy.unique(numpy.concatenate((source_ids, target_ids)))
+            dense_sources = _to_array('i', numpy.searchsorted(ids, source_ids))
+            dense_targets = _to_array('i', numpy.searchsorted(ids, target_ids))
+            ids = _to_array('q', ids)
+        else:
+            ids = array('q', sorted(set(sources).union(targets)))
+            index = {user_id: node for node, user_id in enumerate(ids)}
+            dense_sources = array('i', (index[user_id] for user_id in sources))
+            dense_targets = array('i', (index[user_id] for user_id in targets))
+        return cls.from_dense(len(ids), dense_sources, dense_targets, ids)
+
+    @classmethod
+    def load(cls, follower_ids=None, chunk_size=None):
+        """
+        Reads the Follow table, or only the rows of follower_ids, which is
+        enough to score any user whose followed accounts are all in there.
+        """
+        chunk_size = chunk_size or settings.SUGGESTION_BATCH_SIZE * 10
+        rows = Follow.objects.order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+        querysets = [rows] if follower_ids is None else (
+            rows.filter(follower_id__in=chunk) for chunk in _chunks(sorted(follower_ids))
+        )
+        sources, targets = array('q'), array('q')
+        for queryset in querysets:
+            for follower_id, following_id in queryset.iterator(chunk_size=chunk_size):
+                sources.append(follower_id)
+                targets.append(following_id)
+        return cls.from_edges(sources, targets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @property
+    def nbytes(self):
+        return sum(len(values) * values.itemsize for values in (self.ids, self.offsets, self.targets))
+
+    @cached_property
+    def index(self):
+        return {user_id: node for node, user_id in enumerate(self.ids)}
+
+    @cached_property
+    def numpy_arrays(self):
+        return numpy.frombuffer(self.offsets, dtype=numpy.int64), numpy.frombuffer(self.targets, dtype=numpy.int32)
+
+    def following(self, node):
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def top(self, node, method=MUTUAL, limit=None, hub_degree=None, backend=None):
+        """
+        Best `limit` suggestions for a node as (node, score, mutual count),
+        best first; ties go to the higher mutual count, then the older user.
+
+        Followed accounts that follow more than hub_degree others (bots,
+        mass-followers) are skipped; they would add thousands of weak
+        candidates each.
+        """
+        limit = limit or settings.SUGGESTION_COUNT
+        hub_degree = hub_degree or settings.SUGGESTION_HUB_DEGREE
+        backend = backend or ('numpy' if numpy is not None else 'python')
+        if backend == 'numpy':
+            return self._top_numpy(node, method, limit, hub_degree)
+        return self._top_python(node, method, limit, hub_degree)
+
+    def _top_python(self, node, method, limit, hub_degree):
+        offsets, targets = self.offsets, self.targets
+        followed = self.following(node)
+        mutual, scores = {}, {}
+        for via in followed:
+            start, end = offsets[via], offsets[via + 1]
+            degree = end - start
+            if not degree or degree > hub_degree:
+                continue
+            weight = 1 / math.log1p(degree) if method == ADAMIC_ADAR else 1.0
+            for candidate in targets[start:end]:
+                mutual[candidate] = mutual.get(candidate, 0) + 1
+                scores[candidate] = scores.get(candidate, 0.0) + weight
+
+        excluded = set(followed)
+        excluded.add(node)
+        best = heapq.nsmallest(
+            limit, (candidate for candidate in scores if candidate not in excluded),
+            key=lambda candidate: (-scores[candidate], -mutual[candidate], candidate),
+        )
+        return [(candidate, scores[candidate], mutual[candidate]) for candidate in best]
+
+    def _top_numpy(self, node, method, limit, hub_degree):
+        offsets, targets = self.numpy_arrays
+        followed = targets[offsets[node]:offsets[node + 1]]
+        degrees = offsets[followed + 1] - offsets[followed]
+        keep = (degrees > 0) & (degrees <= hub_degree)
+        via, degrees = followed[keep], degrees[keep]
+        total = int(degrees.sum())
+        if not total:
+            return []
+
+        # The following lists of every `via` account end to end, without a Python loop
+        starts = numpy.repeat(offsets[via] - numpy.cumsum(degrees) + degrees, degrees)
+        reached = targets[starts + numpy.arange(total)]
+        candidates, inverse, mutual = numpy.unique(reached, return_inverse=True, return_counts=True)
+        if method == ADAMIC_ADAR:
+            scores = numpy.bincount(inverse, weights=numpy.repeat(1 / numpy.log1p(degrees), degrees))
+        else:
+            scores = mutual.astype(numpy.float64)
+
+        eligible = (candidates != node) & ~numpy.isin(candidates, followed)
+        candidates, scores, mutual = candidates[eligible], scores[eligible], mutual[eligible]
+        order = numpy.lexsort((candidates, -mutual, -scores))[:limit]
+        return [(int(candidates[i]), float(scores[i]), int(mutual[i])) for i in order]
+
+
+def _write(graph, user_ids, method, computed_at):
+    """
+    Replaces the stored suggestions of user_ids; users outside the graph end up with none.
+    """
+    rows = []
+    for user_id in user_ids:
+        node = graph.index.get(user_id)
+        if node is None:
+            continue
+        for rank, (candidate, score, mutual) in enumerate(graph.top(node, method)):
+            rows.append(FollowSuggestion(
+                user_id=user_id, suggested_id=graph.ids[candidate], score=round(score, 6),
+                mutual_count=mutual, rank=rank, computed_at=computed_at,
+            ))
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(rows, batch_size=settings.SUGGESTION_BATCH_SIZE)
+    return len(rows)
+
+
+def rebuild_suggestions(method=None, batch_size=None):
+    """
+    Recomputes the suggestions of every user from one load of the whole graph.
+
+    Returns (users, suggestions) written.
+    """
+    method = method or settings.SUGGESTION_METHOD
+    batch_size = batch_size or settings.SUGGESTION_BATCH_SIZE
+    started = timezone.now()
+    graph = FollowGraph.load()
+
+    written = 0
+    for start in range(0, len(graph), batch_size):
+        written += _write(graph, graph.ids[start:start + batch_size].tolist(), method, started)
+    # Users who follow nobody any more
+    FollowSuggestion.objects.filter(computed_at__lt=started).delete()
+    SuggestionRefresh.objects.filter(marked_at__lte=started).delete()
+    return len(graph), written
+
+
+def refresh_suggestions(method=None, batch_size=None):
+    """
+    Recomputes the suggestions that follows and unfollows since the last run
+    made stale: those of the users who followed or unfollowed, and of their
+    followers, whose friends of friends changed with them.
+
+    Each batch loads only the follow rows it needs, two hops around its users.
+    Returns (users, suggestions) written.
+    """
+    method = method or settings.SUGGESTION_METHOD
+    batch_size = batch_size or settings.SUGGESTION_BATCH_SIZE
+    started = timezone.now()
+    stale = list(SuggestionRefresh.objects.filter(marked_at__lte=started).values_list('user_id', flat=True))
+    if not stale:
+        return 0, 0
+
+    affected = set(stale)
+    for chunk in _chunks(stale):
+        affected.update(Follow.objects.filter(following_id__in=chunk).values_list('follower_id', flat=True))
+
+    written = 0
+    for batch in _chunks(sorted(affected), batch_size):
+        followed = set()
+        for chunk in _chunks(batch):
+            followed.update(Follow.objects.filter(follower_id__in=chunk).values_list('following_id', flat=True))
+        graph = FollowGraph.load(follower_ids=followed.union(batch))
+        written += _write(graph, batch, method, started)
+
+    for chunk in _chunks(stale):
+        # Users marked again while this ran stay stale for the next run
+        SuggestionRefresh.objects.filter(user_id__in=chunk, marked_at__lte=started).delete()
+    return len(affected), written
+
+
+def mark_stale(*user_ids):
+    # Called after a user follows or unfollows someone. Moves the mark of users
+    # already queued (upserts need unique_fields on SQLite and refuse them on MySQL)
+    now = timezone.now()
+    SuggestionRefresh.objects.filter(user_id__in=user_ids).update(marked_at=now)
+    SuggestionRefresh.objects.bulk_create(
+        [SuggestionRefresh(user_id=user_id, marked_at=now) for user_id in user_ids], ignore_conflicts=True,
+    )
+
+
+def forget_suggestions(user_id, followed_ids):
+    # Accounts the user just followed stop being suggested before the next refresh
+    FollowSuggestion.objects.filter(user_id=user_id, suggested_id__in=list(followed_ids)).delete()
@@ -0,0 +1,52 @@
+import time
+
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import record_serialization
+
+try:
+    import orjson
+except ImportError:  # optional, FastJSONRenderer then renders like JSONRenderer
+    orjson = None
+
+
+class TimedJSONRenderer(JSONRenderer):
+    # JSONRenderer that reports its rendering time to PerformanceMiddleware
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        try:
+            return self.render_json(data, accepted_media_type, renderer_context)
+        finally:
+            record_serialization(time.perf_counter() - started)
+
+    def render_json(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class FastJSONRenderer(TimedJSONRenderer):
+    """
+    Renders with orjson, byte for byte like JSONRenderer for the payloads of
+    the fast path views: compact, UTF-8, U+2028/U+2029 escaped, and anything
+    orjson has no native type for (lazy strings, Decimal, datetime) handed to
+    DRF's encoder.
+
+    Not the default renderer: orjson writes floats in its own shortest form
+    (1e16, not 1e+16), so views that return floats keep JSONRenderer.
+    """
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+    encoder = JSONEncoder()
+
+    def render_json(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render_json(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=self.options)
+        except TypeError:  # orjson.JSONEncodeError; JSONRenderer raises its own error, or copes
+            return super().render_json(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+# For @renderer_classes on the fast path views, in place of DEFAULT_RENDERER_CLASSES
+FAST_RENDERER_CLASSES = [FastJSONRenderer, BrowsableAPIRenderer]
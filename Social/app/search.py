@@ -0,0 +1,324 @@
+import fcntl
+import heapq
+import json
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from operator import itemgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connection
+from django.dispatch import receiver
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOP_WORDS = frozenset('a an and are as at be by for from in is it of on or that the this to was with'.split())
+KINDS = ('post', 'comment')
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def post_text(post):
+    return f'{post.title}\n{post.content}'
+
+
+def comment_text(comment):
+    return comment.comments
+
+
+def iter_documents(chunk_size):
+    """
+    Yields (kind, id, text) for every post and comment, chunk_size rows per fetch.
+    """
+    for pk, title, content in Post.objects.order_by().values_list('id', 'title', 'content').iterator(chunk_size=chunk_size):
+        yield 'post', pk, f'{title}\n{content}'
+    for pk, text in Comment.objects.order_by().values_list('id', 'comments').iterator(chunk_size=chunk_size):
+        yield 'comment', pk, text
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index ranked with Okapi BM25.
+
+    Documents are keyed by (kind, id). Only term frequencies and document
+    lengths are kept, never the text itself.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = {}     # term -> {doc key: term frequency}
+        self.doc_terms = {}    # doc key -> tuple of distinct terms, needed to remove a document
+        self.doc_lengths = {}  # doc key -> number of tokens
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, key, text):
+        self.remove(key)
+        counts = Counter(tokenize(text))
+        if not counts:
+            return
+        for term, frequency in counts.items():
+            self.postings.setdefault(term, {})[key] = frequency
+        length = sum(counts.values())
+        self.doc_terms[key] = tuple(counts)
+        self.doc_lengths[key] = length
+        self.total_length += length
+
+    def remove(self, key):
+        terms = self.doc_terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[key]
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(key)
+
+    def search(self, query, kinds=KINDS, limit=20):
+        """
+        Returns up to `limit` (kind, id, score) tuples, best match first.
+        """
+        count = len(self.doc_lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count
+
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, frequency in postings.items():
+                if key[0] not in kinds:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[key] / average_length)
+                scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [(kind, pk, score) for (kind, pk), score in best]
+
+
+class BaseSearchBackend:
+    def index_document(self, kind, pk, text):
+        raise NotImplementedError
+
+    def remove_document(self, kind, pk):
+        raise NotImplementedError
+
+    def search(self, query, kinds=KINDS, limit=20):
+        raise NotImplementedError
+
+    def rebuild(self, chunk_size):
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Pure Python BM25 index persisted under SEARCH_INDEX_PATH.
+
+    Writes append one JSON line to journal.jsonl, so saving a post never
+    touches the index itself. Every process keeps its own copy in memory,
+    loads index.pickle once and replays new journal lines before each query.
+    rebuild() writes a fresh snapshot from the tables and empties the journal;
+    compact() does the same from the snapshot and journal, and runs by itself
+    once the journal grows past SEARCH_JOURNAL_MAX_BYTES.
+    """
+
+    def __init__(self, path=None, journal_max_bytes=None):
+        self.path = Path(path or settings.SEARCH_INDEX_PATH)
+        self.journal_max_bytes = journal_max_bytes or settings.SEARCH_JOURNAL_MAX_BYTES
+        self.snapshot_path = self.path / 'index.pickle'
+        self.journal_path = self.path / 'journal.jsonl'
+        self.index = None
+        self._offset = 0
+        self._snapshot_mtime = None
+        self._mutex = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        # Serializes journal writes and compaction across processes
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / 'lock', 'w') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._file_lock(), open(self.journal_path, 'a', encoding='utf-8') as journal:
+            journal.write(line)
+            size = journal.tell()
+        if size > self.journal_max_bytes:
+            self.compact()
+
+    def _apply(self, index, entry):
+        key = (entry['kind'], entry['id'])
+        if entry['op'] == 'add':
+            index.add(key, entry['text'])
+        else:
+            index.remove(key)
+
+    def _replay(self, index, offset):
+        if not self.journal_path.exists():
+            return 0
+        with open(self.journal_path, 'rb') as journal:
+            journal.seek(offset)
+            for line in journal:
+                if not line.endswith(b'\n'):
+                    break  # a write still in progress, pick it up next time
+                self._apply(index, json.loads(line))
+                offset += len(line)
+        return offset
+
+    def _snapshot_stamp(self):
+        try:
+            return self.snapshot_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        with self._mutex:
+            stamp = self._snapshot_stamp()
+            journal_size = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+            if self.index is None or stamp != self._snapshot_mtime or journal_size < self._offset:
+                # First use, or another process compacted the index
+                self.index = InvertedIndex()
+                if stamp is not None:
+                    with open(self.snapshot_path, 'rb') as snapshot:
+                        self.index = pickle.load(snapshot)
+                self._snapshot_mtime = stamp
+                self._offset = 0
+            self._offset = self._replay(self.index, self._offset)
+            return self.index
+
+    def index_document(self, kind, pk, text):
+        self._append({'op': 'add', 'kind': kind, 'id': pk, 'text': text})
+
+    def remove_document(self, kind, pk):
+        self._append({'op': 'remove', 'kind': kind, 'id': pk})
+
+    def search(self, query, kinds=KINDS, limit=20):
+        return self._refresh().search(query, kinds, limit)
+
+    def _write_snapshot(self, index):
+        # Callers hold the file lock
+        temporary = self.snapshot_path.with_suffix('.tmp')
+        with open(temporary, 'wb') as snapshot:
+            pickle.dump(index, snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.snapshot_path)
+        open(self.journal_path, 'w').close()
+
+    def compact(self):
+        """
+        Folds the journal into the snapshot and empties it. Returns False when
+        another process compacted it first.
+        """
+        with self._file_lock():
+            if not self.journal_path.exists() or self.journal_path.stat().st_size <= self.journal_max_bytes:
+                return False
+            index = self._refresh()  # writers wait on the lock, so this replays every line
+            with self._mutex:
+                self._write_snapshot(index)
+                self._snapshot_mtime = self._snapshot_stamp()
+                self._offset = 0
+        return True
+
+    def rebuild(self, chunk_size):
+        self.path.mkdir(parents=True, exist_ok=True)
+        start = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+
+        index = InvertedIndex()
+        for kind, pk, text in iter_documents(chunk_size):
+            index.add((kind, pk), text)
+
+        with self._file_lock():
+            # Saves and deletes that happened while the tables were read
+            self._replay(index, start)
+            self._write_snapshot(index)
+        return len(index)
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """
+    Delegates to MySQL FULLTEXT indexes, which the server keeps up to date itself.
+    """
+    indexes = {
+        'post': (Post, 'post_fulltext_idx', ('title', 'content')),
+        'comment': (Comment, 'comment_fulltext_idx', ('comments',)),
+    }
+
+    def index_document(self, kind, pk, text):
+        pass
+
+    def remove_document(self, kind, pk):
+        pass
+
+    def search(self, query, kinds=KINDS, limit=20):
+        results = []
+        for kind in kinds:
+            model, _, columns = self.indexes[kind]
+            match = 'MATCH ({}) AGAINST (%s IN NATURAL LANGUAGE MODE)'.format(
+                ', '.join(connection.ops.quote_name(column) for column in columns)
+            )
+            rows = (
+                model.objects.annotate(score=RawSQL(match, (query,)))
+                .filter(score__gt=0)
+                .order_by('-score')
+                .values_list('id', 'score')[:limit]
+            )
+            results.extend((kind, pk, score) for pk, score in rows)
+        return sorted(results, key=itemgetter(2), reverse=True)[:limit]
+
+    def rebuild(self, chunk_size):
+        # Creates any missing FULLTEXT index; MySQL builds it from the table
+        with connection.cursor() as cursor:
+            for model, name, columns in self.indexes.values():
+                table = model._meta.db_table
+                cursor.execute(
+                    'SELECT 1 FROM information_schema.statistics WHERE table_schema = DATABASE() '
+                    'AND table_name = %s AND index_name = %s',
+                    [table, name],
+                )
+                if cursor.fetchone() is None:
+                    cursor.execute('ALTER TABLE {} ADD FULLTEXT INDEX {} ({})'.format(
+                        connection.ops.quote_name(table),
+                        connection.ops.quote_name(name),
+                        ', '.join(connection.ops.quote_name(column) for column in columns),
+                    ))
+        return Post.objects.count() + Comment.objects.count()
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.SEARCH_BACKEND)()
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    # override_settings(SEARCH_INDEX_PATH=...) in tests gets a backend on that path
+    global _backend
+    if setting.startswith('SEARCH_'):
+        _backend = None
@@ -0,0 +1,295 @@
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+from heapq import nsmallest
+from itertools import groupby, islice
+from math import gcd
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import expected_counters, reconcile_counters
+from .models import Comment, Follow, Post, Profile, TimelineEntry, User
+from .search import get_search_backend
+
+WORDS = (
+    'nairobi matatu market rain river coffee football election startup budget climate forest safari '
+    'music fashion school hospital vaccine rocket satellite battery solar wind traffic road bridge '
+    'stadium coach league goal festival museum mountain beach island harbour railway airport phone '
+    'software cloud data privacy court policy trade export farmer harvest drought flood storm ocean'
+).split()
+CATEGORIES = [value for value, _ in Post.CATEGORY_CHOICES]
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def zipf_rank(rng, count, alpha):
+    """
+    Draws a rank in [0, count) with P(rank) ~ 1 / (rank + 1) ** alpha.
+
+    Inverts the CDF of the continuous power law, so it needs no table and
+    works the same for a thousand or ten million users.
+    """
+    u = rng.random()
+    if abs(alpha - 1.0) < 1e-9:
+        x = count ** u
+    else:
+        x = ((count ** (1 - alpha) - 1) * u + 1) ** (1 / (1 - alpha))
+    return min(count - 1, max(0, int(x) - 1))
+
+
+@lru_cache(maxsize=None)
+def _stride(count):
+    stride = 2654435761 % count or 1
+    while gcd(stride, count) != 1:
+        stride += 1
+    return stride
+
+
+def scatter(rank, count):
+    # Bijection of [0, count), so the most popular ranks land on users spread over the whole id range
+    return (rank * _stride(count) + count // 3) % count
+
+
+DEGREE_DISTRIBUTIONS = ('pareto', 'uniform', 'fixed')
+
+
+def out_degree(rng, distribution, mean, limit):
+    if distribution == 'pareto':
+        # Pareto(shape 2) has mean 2, so halving it gives the requested mean with a heavy tail
+        degree = int(mean * rng.paretovariate(2) / 2)
+    elif distribution == 'uniform':
+        degree = rng.randint(0, 2 * mean)
+    else:
+        degree = mean
+    return min(limit, degree)
+
+
+def follow_targets(rng, follower, users, degree, alpha):
+    """
+    Returns the distinct users (indexes) `follower` follows: `degree` draws
+    by a Zipf law over a fixed popularity ranking, so in-degrees follow a
+    power law and a few accounts are followed by most users.
+    """
+    targets = {scatter(zipf_rank(rng, users, alpha), users) for _ in range(degree)}
+    targets.discard(follower)
+    return targets
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    # bulk_create would overwrite auto_now(_add) fields with the current time
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def dataset_users(prefix):
+    return User.objects.filter(email__startswith=f'{prefix}-', email__endswith='@example.com')
+
+
+def delete_dataset(prefix):
+    deleted, _ = dataset_users(prefix).delete()
+    return deleted
+
+
+def seed_dataset(users=1000, posts_per_user=5, comments_per_post=2, follows_per_user=20, alpha=1.1,
+                 days=30, batch_size=1000, random_seed=1, prefix='bench', password='bench-password'):
+    """
+    Creates a reproducible synthetic dataset and returns the row counts.
+
+    StreamingSeeder in one transaction, plus what the benchmarks need on top:
+    home feed timelines and a rebuilt search index. Users are
+    <prefix>-<n>@example.com, verified, sharing one password; user 0 is staff.
+    """
+    seeder = StreamingSeeder(
+        users, posts_per_user, comments_per_post, follows_per_user, alpha=alpha, days=days,
+        random_seed=random_seed, prefix=prefix, password=password, batch_size=batch_size,
+    )
+    with transaction.atomic():
+        counts = {'users': seeder.load(User, seeder.user_rows())}
+        seeder.load(Profile, seeder.profile_rows())
+        counts['follows'] = seeder.load(Follow, seeder.follow_rows())
+        counts['posts'] = seeder.load(Post, seeder.post_rows())
+        counts['comments'] = seeder.load(Comment, seeder.comment_rows())
+        seeder.reconcile_follow_counts()
+        counts['timeline_entries'] = seeder.load(TimelineEntry, seeder.timeline_rows())
+
+    get_search_backend().rebuild(batch_size)
+    return counts
+
+
+def _next_id(model):
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    return (last or 0) + 1
+
+
+class StreamingSeeder:
+    """
+    Loads a large synthetic dataset without holding it in memory.
+
+    Rows are generated lazily with explicit primary keys (continuing after
+    the current maximum), so foreign keys are known without reading anything
+    back. They are inserted with bulk_create, `batch_size` rows per INSERT and
+    `transaction_batches` INSERTs per transaction. Only compact arrays are
+    kept: posts per user, comments per post and post timestamps. Run it
+    while nothing else writes to these tables. User 0 is staff.
+    """
+
+    def __init__(self, users, posts_per_user, comments_per_post, follows_per_user, degree='pareto', alpha=1.1,
+                 days=365, random_seed=1, prefix='seed', password='seed-password', batch_size=5000, transaction_batches=20):
+        self.users = users
+        self.posts_per_user = posts_per_user
+        self.comments_per_post = comments_per_post
+        self.follows_per_user = follows_per_user
+        self.degree = degree
+        self.alpha = alpha
+        self.days = days
+        self.random_seed = random_seed
+        self.prefix = prefix
+        self.password = password
+        self.batch_size = batch_size
+        self.transaction_batches = transaction_batches
+        self.now = timezone.now()
+
+    def load(self, model, rows):
+        """
+        Inserts a stream of unsaved model instances and returns how many there were.
+        """
+        loaded = 0
+        rows = iter(rows)
+        with explicit_timestamps(model):
+            while True:
+                with transaction.atomic():
+                    inserted = 0
+                    for _ in range(self.transaction_batches):
+                        batch = list(islice(rows, self.batch_size))
+                        if not batch:
+                            break
+                        model.objects.bulk_create(batch)
+                        inserted += len(batch)
+                loaded += inserted
+                if inserted < self.batch_size * self.transaction_batches:
+                    return loaded
+
+    def user_rows(self):
+        rng = random.Random(f'{self.random_seed}:users')
+        password_hash = make_password(self.password)  # hashed once, not once per user
+        self.first_user_id = _next_id(User)
+        self.post_counts = array('H')
+        joined = self.now - timedelta(days=self.days + 1)
+        for index in range(self.users):
+            posts = rng.randint(0, 2 * self.posts_per_user)
+            self.post_counts.append(posts)
+            yield User(
+                id=self.first_user_id + index, email=f'{self.prefix}-{index}@example.com', first_name=f'User{index}',
+                last_name=self.prefix.title(), password=password_hash, is_verified=True, is_staff=index == 0,
+                date_joined=joined,
+                post_count=posts,  # follower and following counts are reconciled after the follows are loaded
+            )
+
+    def profile_rows(self):
+        rng = random.Random(f'{self.random_seed}:profiles')
+        created = self.now - timedelta(days=self.days)
+        for index in range(self.users):
+            yield Profile(
+                user_id=self.first_user_id + index, bio=sentence(rng, 8), location=rng.choice(WORDS).title(),
+                created_at=created, updated_at=created,
+            )
+
+    def follow_rows(self):
+        rng = random.Random(f'{self.random_seed}:follows')
+        for follower in range(self.users):
+            degree = out_degree(rng, self.degree, self.follows_per_user, self.users - 1)
+            for followed in sorted(follow_targets(rng, follower, self.users, degree, self.alpha)):
+                yield Follow(
+                    follower_id=self.first_user_id + follower, following_id=self.first_user_id + followed,
+                    followed_at=self.now - timedelta(seconds=rng.randint(0, self.days * 86400)),
+                )
+
+    def post_rows(self):
+        rng = random.Random(f'{self.random_seed}:posts')
+        self.first_post_id = _next_id(Post)
+        self.comment_counts = array('H')
+        self.post_times = array('I')  # seconds before now, so comments can come after their post
+        post_id = self.first_post_id
+        for index, count in enumerate(self.post_counts):
+            for _ in range(count):
+                age = rng.randint(0, self.days * 86400)
+                comments = rng.randint(0, 2 * self.comments_per_post)
+                self.comment_counts.append(comments)
+                self.post_times.append(age)
+                content = sentence(rng, rng.randint(8, 40))
+                created_at = self.now - timedelta(seconds=age)
+                yield Post(
+                    id=post_id, author_id=self.first_user_id + index, title=sentence(rng, 5), content=content,
+                    categories=rng.choice(CATEGORIES), comment_count=comments,
+                    content_hash=Post.compute_content_hash(content), created_at=created_at, updated_at=created_at,
+                )
+                post_id += 1
+
+    def comment_rows(self):
+        rng = random.Random(f'{self.random_seed}:comments')
+        for offset, count in enumerate(self.comment_counts):
+            age = self.post_times[offset]
+            for _ in range(count):
+                yield Comment(
+                    post_id=self.first_post_id + offset,
+                    user_id=self.first_user_id + rng.randrange(self.users),
+                    comments=sentence(rng, rng.randint(3, 20)),
+                    created_at=self.now - timedelta(seconds=rng.randint(0, age)),
+                )
+
+    def timeline_rows(self):
+        """
+        Home feeds as fan_out_post would have filled them: for every user, the
+        newest FEED_BACKFILL_SIZE posts of the followed authors that are fanned
+        out. Replays follow_rows, so call it after the posts are generated.
+        """
+        followers = array('I', bytes(4 * self.users))
+        for follow in self.follow_rows():
+            followers[follow.following_id - self.first_user_id] += 1
+        first_posts = array('I')
+        offset = 0
+        for count in self.post_counts:
+            first_posts.append(offset)
+            offset += count
+
+        for follower_id, group in groupby(self.follow_rows(), key=lambda follow: follow.follower_id):
+            authors = [follow.following_id - self.first_user_id for follow in group]
+            candidates = (
+                (self.post_times[offset], -offset)
+                for author in authors if followers[author] < settings.FEED_FANOUT_LIMIT
+                for offset in range(first_posts[author], first_posts[author] + self.post_counts[author])
+            )
+            # Newest first: smallest age, then highest id
+            for age, negative_offset in nsmallest(settings.FEED_BACKFILL_SIZE, candidates):
+                yield TimelineEntry(
+                    owner_id=follower_id, post_id=self.first_post_id - negative_offset,
+                    created_at=self.now - timedelta(seconds=age),
+                )
+
+    def reconcile_follow_counts(self):
+        # One correlated COUNT per user over the follow indexes, a pk range per transaction
+        columns = {name: expression for name, expression in expected_counters()[User].items()
+                   if name in ('follower_count', 'following_count')}
+        stop = self.first_user_id + self.users
+        for start in range(self.first_user_id, stop, self.batch_size):
+            with transaction.atomic():
+                reconcile_counters(User, columns, start, min(start + self.batch_size, stop))
+        return self.users
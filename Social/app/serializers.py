@@ -1,21 +1,34 @@
 from django.utils.encoding import smart_str, smart_bytes, force_str
 from django.urls import reverse
-from .models import User,Profile,Post,Comment,Follow
+from .models import User,Profile,Post,Comment,Follow,FollowSuggestion
 from .utilis import send_normal_email
+from .images import srcset
+from .hashers import verify_password
 from django.contrib.sites.shortcuts import get_current_site
 from rest_framework_simplejwt.tokens import RefreshToken,TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .blacklist import CachedBlacklistRefreshToken
+from .metrics import serialization_timer
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed
 from django.contrib.auth import authenticate
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from django.utils.http import urlsafe_base64_encode,urlsafe_base64_decode 
 from django.contrib.auth import get_user_model
+from django.conf import settings
 
 
 
 
 
-class UserRegisterSerializer(serializers.ModelSerializer):
+class TimedRepresentationMixin:
+    # Adds the time spent building response data to the request's serialization time
+    def to_representation(self, instance):
+        with serialization_timer():
+            return super().to_representation(instance)
+
+
+class UserRegisterSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     password = serializers.CharField(max_length=70, min_length=6, write_only=True)
     password2 = serializers.CharField(max_length=70, min_length=6, write_only=True)
 
@@ -62,13 +75,10 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         # User retrieval
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise AuthenticationFailed('Invalid credentials, try again')
+        user = User.objects.filter(email=email).first()
 
-        # Password check
-        if not user.check_password(password):
+        # Password check, on the hashing pool; unknown emails hash a dummy so both take the same time
+        if not verify_password(user, password):
             raise AuthenticationFailed('Invalid credentials, try again')
 
         # Check if user is verified
@@ -163,23 +173,27 @@ class LogoutUserSerializer(serializers.Serializer):
     }
 
     def validate(self, attrs):
-          self.token=attrs.get('refresh_token ')
+          self.token=attrs.get('refresh_token')
           return (attrs)
     def save(self, **kwargs):
         try:
-            token = RefreshToken(self.token)
+            token = CachedBlacklistRefreshToken(self.token)
             token.blacklist()
         except TokenError: 
             return self.fail('bad_token')     
 
 User = get_user_model()
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     email = serializers.EmailField(source='user.email', read_only=True)
+    follower_count = serializers.IntegerField(source='user.follower_count', read_only=True)
+    following_count = serializers.IntegerField(source='user.following_count', read_only=True)
+    post_count = serializers.IntegerField(source='user.post_count', read_only=True)
+    profile_picture_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Profile
-        fields = ['id','email', 'bio', 'profile_picture', 'location', 'created_at', 'updated_at']
+        fields = ['id','email', 'bio', 'profile_picture', 'profile_picture_srcset', 'location', 'follower_count', 'following_count', 'post_count', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
     def validate(self, data):
@@ -209,37 +223,81 @@ class ProfileSerializer(serializers.ModelSerializer):
         profile = Profile.objects.create(user=user, **validated_data)
         return profile
 
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj.picture_variants, obj.profile_picture.storage)
+
     def update(self, instance, validated_data):
         # Update the profile details, similar to how you're already doing it
         instance.bio = validated_data.get('bio', instance.bio)
-        instance.profile_picture = validated_data.get('profile_picture', instance.profile_picture)
         instance.location = validated_data.get('location', instance.location)
-        instance.save()
+        fields = ['bio', 'location', 'updated_at']
+        if 'profile_picture' in validated_data:
+            instance.profile_picture = validated_data['profile_picture']
+            instance.picture_variants = {}  # rendered from the old picture, see app.images
+            fields += ['profile_picture', 'picture_variants']
+        # Leaves picture_variants alone otherwise, the image worker may have just written it
+        instance.save(update_fields=fields)
 
         return instance
 
 
 
-class PostSerializer(serializers.ModelSerializer):
+class AuthorSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'first_name', 'last_name']
+
+
+class ExpandableFieldsMixin:
+    """
+    Replaces primary key fields with nested objects when asked, e.g. ?expand=author,post.
+
+    expandable_fields maps the name used in ?expand= to (field name, serializer class).
+    Views pass the requested names as context['expand'] and select_related the
+    same relations, so the query count does not grow with the page size.
+    """
+    expandable_fields = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        for name in self.context.get('expand', ()):
+            if name in self.expandable_fields:
+                field_name, serializer_class = self.expandable_fields[name]
+                fields[field_name] = serializer_class(read_only=True)
+        return fields
+
+
+class PostSerializer(TimedRepresentationMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'author': ('author', AuthorSerializer)}
     author = serializers.PrimaryKeyRelatedField(read_only=True)
-    
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'content', 'image', 'categories', 'created_at', 'updated_at']
+        fields = ['id', 'author', 'content', 'image', 'image_srcset', 'categories', 'comment_count', 'created_at', 'updated_at']
+        read_only_fields = ['comment_count']
+
+    def get_image_srcset(self, obj):
+        return srcset(obj.image_variants, obj.image.storage)
 
     def create(self, validated_data):
         return Post.objects.create(**validated_data)
 
     def update(self, instance, validated_data):
         instance.content = validated_data.get('content', instance.content)
-        instance.image = validated_data.get('image', instance.image)
         instance.categories = validated_data.get('categories', instance.categories)
-        instance.save()
+        fields = ['content', 'categories', 'updated_at']
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_variants = {}  # rendered from the old image, see app.images
+            fields += ['image', 'image_variants']
+        # Leaves image_variants alone otherwise, the image worker may have just written it
+        instance.save(update_fields=fields)
         return instance
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedRepresentationMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'author': ('user', AuthorSerializer), 'post': ('post', PostSerializer)}
     user  = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     post = serializers.PrimaryKeyRelatedField(queryset=Post.objects.all())
 
@@ -249,11 +307,29 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id','created_at']
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields  = ['follower','following','followed_at']
         read_only_fields = ['follower','followed_at']
 
 
+class FollowSuggestionSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    user = AuthorSerializer(source='suggested', read_only=True)
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['user', 'mutual_count', 'score']
+
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    # Checks the rotated refresh token against the in-memory blacklist filter
+    token_class = CachedBlacklistRefreshToken
+
 
+class UserIdsSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS,
+    )
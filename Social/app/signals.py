@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .blacklist import blacklist_filter
+from .models import ClaimsUser, Comment, Post, User
+from .search import comment_text, get_search_backend, post_text
+
+
+# The search index is written once the change commits, so a rolled back save never reaches it
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    pk, text = instance.pk, post_text(instance)
+    transaction.on_commit(lambda: get_search_backend().index_document('post', pk, text))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_document('post', pk))
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    pk, text = instance.pk, comment_text(instance)
+    transaction.on_commit(lambda: get_search_backend().index_document('comment', pk, text))
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: get_search_backend().remove_document('comment', pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def forget_cached_user(sender, instance, **kwargs):
+    # Token-authenticated requests read user columns from this cache entry
+    cache.delete(ClaimsUser.cache_key(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, created, **kwargs):
+    if created:
+        blacklist_filter.add(instance.token.jti, instance.token.expires_at)
@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.fields.files import FieldFile
+
+from .images import VARIANTS
+
+CAS_PREFIX = 'cas'
+
+
+def image_digest(image):
+    """
+    SHA-256 hex digest of an uploaded or stored file's bytes.
+
+    Stored content-addressed files carry the digest in their name. Uploads
+    are read once in chunks and the digest is remembered on the upload, so
+    the duplicate check, Post.save() and the storage share one pass.
+    """
+    if isinstance(image, FieldFile) and image._committed and content_addressed(image.name):
+        return os.path.splitext(os.path.basename(image.name))[0]
+
+    upload = image.file if isinstance(image, FieldFile) else image
+    digest = getattr(upload, 'content_digest', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in upload.chunks():  # chunks() rewinds to the start first
+            hasher.update(chunk)
+        upload.seek(0)
+        digest = upload.content_digest = hasher.hexdigest()
+    return digest
+
+
+def content_addressed(name):
+    return bool(name) and name.startswith(f'{CAS_PREFIX}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, under its digest: cas/ab/abcdef....jpg.
+
+    Uploading bytes that are already stored (under any name, for a post or a
+    profile picture) reuses the existing file and increments its MediaBlob
+    reference count; release_media() deletes the file when the count drops
+    to zero.
+    """
+
+    def _save(self, name, content):
+        digest = image_digest(content)
+        extension = os.path.splitext(name)[1].lower()
+        stored_name = f'{CAS_PREFIX}/{digest[:2]}/{digest}{extension}'
+        with transaction.atomic():
+            # The reference comes first: once it is taken, release_media() cannot
+            # delete the file, so a file seen here stays until this upload lets go
+            acquire_media(stored_name, content.size)
+            if not self.exists(stored_name):
+                try:
+                    super()._save(stored_name, content)  # creates the file with O_EXCL
+                except FileExistsError:
+                    pass  # a concurrent upload of the same bytes stored it first
+        return stored_name
+
+    def get_available_name(self, name, max_length=None):
+        # FileSystemStorage._save asks for another name when the file appeared
+        # meanwhile; for a digest name that file already holds these bytes
+        if content_addressed(name) and self.exists(name):
+            raise FileExistsError(name)
+        return super().get_available_name(name, max_length)
+
+
+content_storage = ContentAddressedStorage()
+
+
+def acquire_media(name, size):
+    """
+    Takes one reference to a stored file, creating its MediaBlob on first use.
+
+    The increment (or the insert) locks the row until the caller's transaction
+    commits, and release_media() deletes files under the same lock.
+    """
+    from .models import MediaBlob
+
+    while not MediaBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, size=size, ref_count=1)
+            return
+        except IntegrityError:
+            pass  # another upload created it first, count on that row
+
+
+def delete_media_files(name):
+    # The file itself plus the WebP variants rendered from it (app.images)
+    content_storage.delete(name)
+    base_name = os.path.splitext(os.path.basename(name))[0]
+    for variant in VARIANTS:
+        content_storage.delete(f'variants/{base_name}_{variant}.webp')
+
+
+def release_media(name):
+    """
+    Drops one reference to a stored file, deleting it once nothing uses it.
+
+    Files saved before content addressing was enabled are left alone.
+    """
+    from .models import MediaBlob
+
+    if not content_addressed(name):
+        return False
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+        if blob is None:
+            return False
+        if blob.ref_count > 1:
+            MediaBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+            return False
+        blob.delete()
+        # Still under the row lock: an upload of the same bytes waits in
+        # acquire_media() until the files are gone, then writes them again
+        delete_media_files(name)
+    return True
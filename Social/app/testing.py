@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin that pins the exact number of SQL queries an endpoint runs.
+
+        class PostQueryTests(QueryCountAssertionsMixin, APITestCase):
+            def test_list_posts(self):
+                self.assertEndpointQueries(1, 'get', reverse('list_posts'), {'expand': 'author'})
+
+    On failure every captured statement is listed, so an N+1 shows up in CI output.
+    """
+
+    def assertEndpointQueries(self, expected, method, url, data=None, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, **extra)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)  # streamed rows are only fetched while consumed
+
+        if len(queries) != expected:
+            statements = '\n'.join(
+                f"{number}. {query['sql']}" for number, query in enumerate(queries.captured_queries, start=1)
+            )
+            self.fail(f'{method.upper()} {url} ran {len(queries)} queries, expected {expected}:\n{statements}')
+        return response
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests against a throwaway search index, so saving posts in tests
+    never appends to the real SEARCH_INDEX_PATH.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.search_index_path = tempfile.mkdtemp(prefix='search-index-')
+        self.search_index_override = override_settings(SEARCH_INDEX_PATH=self.search_index_path)
+        self.search_index_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.search_index_override.disable()
+        shutil.rmtree(self.search_index_path, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
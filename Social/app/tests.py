@@ -1,3 +1,1250 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused
+from array import array
+from unittest import mock, skipIf
+from urllib.parse import parse_qs, quote, urlsplit
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.test.client import MULTIPART_CONTENT, encode_multipart, BOUNDARY
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .bench import summarize
+from .blacklist import BlacklistFilter
+from .caching import get_category_page
+from .counters import adjust_counters, adjust_counters_bulk, expected_counters, reconcile_counters
+from .db import pool as pool_module
+from .db.backends.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from .db.pool import ConnectionPool, PoolTimeout, pool_stats
+from .fastpath import POST_ROWS, PROFILE_ROWS
+from .management.commands.bench_endpoints import SCENARIOS, app_routes
+from .images import _store_variants, schedule_variants
+from .metrics import RequestStats, current_request_stats
+from .models import (
+    ClaimsUser, Comment, Follow, FollowSuggestion, MediaBlob, OneTimePassword, OutgoingEmail, Post, Profile, SuggestionRefresh,
+    TimelineEntry, User,
+)
+from .outbox import drain_outbox, enqueue_email
+from .recommendations import ADAMIC_ADAR, FollowGraph, numpy, rebuild_suggestions, refresh_suggestions
+from .renderers import FastJSONRenderer
+from .search import InvertedIndexBackend, get_search_backend
+from .serializers import PostSerializer, ProfileSerializer
+from .storage import acquire_media, content_storage, image_digest, release_media
+from .testing import QueryCountAssertionsMixin
+from .throttling import get_throttle_store
+from .seeding import delete_dataset, seed_dataset
+from .timeline import fan_out_authors, fan_out_post
+from .utilis import issue_otp, verify_otp
+
+
+def make_user(number, **extra):
+    return User.objects.create_user(
+        f'user{number}@example.com', 'password-123', first_name=f'First{number}', last_name=f'Last{number}', **extra
+    )
+
+
+def png_upload(name='picture.png', color=(200, 10, 10)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, format='PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+def auth(user):
+    return {'HTTP_AUTHORIZATION': f"Bearer {user.tokens()['access']}"}
+
+
+def create_post(author, content, **extra):
+    # What creating_post does besides the insert
+    post = Post.objects.create(author=author, title=content[:20], content=content, categories='news', **extra)
+    fan_out_post(post)
+    return post
+
+
+def walk_pages(client, url, params):
+    # Follows the keyset cursors of a listing and returns the ids of every page
+    pages, params = [], dict(params)
+    while True:
+        response = client.get(url, params)
+        assert response.status_code == 200, response.content
+        pages.append([row['id'] for row in response.json()['results']])
+        if not response.json()['next']:
+            return pages
+        params['cursor'] = parse_qs(urlsplit(response.json()['next']).query)['cursor'][0]
+
+
+class MediaRootMixin:
+    # Uploaded files go to a throwaway MEDIA_ROOT
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class FastPathTests(MediaRootMixin, TestCase):
+    VARIANTS = {'thumbnail': {'name': 'variants/abc_thumbnail.webp', 'width': 150, 'height': 150}}
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user(1)
+        self.other = make_user(2)
+        self.plain_post = Post.objects.create(author=self.user, title='t', content='Plain   "post" é', categories='news')
+        self.image_post = Post.objects.create(
+            author=self.user, title='t', content='With image', categories='science',
+            image=png_upload(), image_variants=self.VARIANTS,
+        )
+        self.plain_profile = Profile.objects.create(user=self.user, bio='bio', location=None)
+        self.image_profile = Profile.objects.create(
+            user=self.other, bio='', location='Nairobi', profile_picture=png_upload('me.png', (1, 2, 3)),
+            picture_variants=self.VARIANTS,
+        )
+
+    def assertSameRows(self, row_serializer, serializer_class, queryset):
+        objects = list(queryset.order_by('id'))
+        rows = row_serializer.many(row_serializer.project(queryset.order_by('id')))
+        expected = serializer_class(objects, many=True).data
+        self.assertEqual(rows, expected)
+        self.assertEqual(FastJSONRenderer().render(rows), JSONRenderer().render(expected))
+
+    def test_posts_with_and_without_image(self):
+        self.assertTrue(self.image_post.image)
+        self.assertSameRows(POST_ROWS, PostSerializer, Post.objects.all())
+
+    def test_profiles_with_and_without_picture(self):
+        self.assertTrue(self.image_profile.profile_picture)
+        self.assertSameRows(PROFILE_ROWS, ProfileSerializer, Profile.objects.select_related('user'))
+
+    def test_list_endpoints_return_serializer_output(self):
+        response = self.client.get('/app/list_posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], PostSerializer(Post.objects.order_by('id'), many=True).data)
+
+        response = self.client.get('/app/list_posts/', {'category': 'science'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post['id'] for post in response.json()['results']], [self.image_post.id])
+
+        response = self.client.get('/app/view-profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'],
+            ProfileSerializer(Profile.objects.select_related('user').order_by('id'), many=True).data,
+        )
+
+        response = self.client.get('/app/list_posts/', {'stream': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 2)
+
+
+class ListQueryCountTests(QueryCountAssertionsMixin, TestCase):
+    # Query counts must not grow with the number of rows on a page
+
+    def setUp(self):
+        cache.clear()
+        self.users = [make_user(number) for number in range(4)]
+        for user in self.users:
+            Profile.objects.create(user=user, bio='bio')
+        for user in self.users[1:]:
+            Follow.objects.create(follower=self.users[0], following=user)
+        for number in range(6):
+            post = create_post(self.users[number % 4], f'post {number}')
+            for other in self.users[:3]:
+                Comment.objects.create(user=other, post=post, comments=f'comment on {number}')
+        self.auth = auth(self.users[0])
+
+    def test_list_posts(self):
+        self.assertEndpointQueries(1, 'get', '/app/list_posts/')
+        self.assertEndpointQueries(1, 'get', '/app/list_posts/', {'expand': 'author'})
+
+    def test_list_comments(self):
+        self.assertEndpointQueries(1, 'get', '/app/list_comments/')
+        self.assertEndpointQueries(1, 'get', '/app/list_comments/', {'expand': 'author,post'})
+
+    def test_post_comments(self):
+        post_id = Post.objects.values_list('id', flat=True).first()
+        self.assertEndpointQueries(2, 'get', f'/app/posts/{post_id}/comments/', {'expand': 'author'})
+
+    def test_view_profile(self):
+        self.assertEndpointQueries(1, 'get', '/app/view-profile/')
+
+    def test_feed(self):
+        self.assertEndpointQueries(3, 'get', '/app/feed/', **self.auth)
+        self.assertEndpointQueries(3, 'get', '/app/feed/', {'expand': 'author'}, **self.auth)
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader, self.author, self.stranger = make_user(1), make_user(2), make_user(3)
+
+    def feed_ids(self, **params):
+        response = self.client.get('/app/feed/', params, **auth(self.reader))
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.json()['results']]
+
+    def publish(self, user, content):
+        response = self.client.post(
+            '/app/creating_post/', {'title': content, 'content': content, 'categories': 'news'}, **auth(user)
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        old = create_post(self.author, 'before the follow')
+        create_post(self.stranger, 'not followed')
+
+        self.assertEqual(self.client.post(f'/app/follow/{self.author.id}/', **auth(self.reader)).status_code, 201)
+        self.assertEqual(self.feed_ids(), [old.id])
+
+        new = self.publish(self.author, 'after the follow')
+        self.assertEqual(self.feed_ids(), [new, old.id])
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post_id=new).exists())
+
+    def test_unfollow_prunes_the_timeline(self):
+        self.client.post(f'/app/follow/{self.author.id}/', **auth(self.reader))
+        self.publish(self.author, 'soon gone')
+        self.assertEqual(self.client.delete(f'/app/unfollow/{self.author.id}/', **auth(self.reader)).status_code, 204)
+        self.assertEqual(self.feed_ids(), [])
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_high_follower_authors_are_merged_at_read_time(self):
+        self.client.post(f'/app/follow/{self.author.id}/', **auth(self.reader))
+        post = self.publish(self.author, 'too popular to fan out')
+        self.assertFalse(TimelineEntry.objects.filter(post_id=post).exists())
+        self.assertEqual(self.feed_ids(), [post])
+
+    def test_cursor_walks_the_feed_newest_first(self):
+        self.client.post(f'/app/follow/{self.author.id}/', **auth(self.reader))
+        posts = [self.publish(self.author, f'post {number}') for number in range(3)]
+
+        seen, params = [], {'page_size': 2}
+        while True:
+            response = self.client.get('/app/feed/', params, **auth(self.reader)).json()
+            seen.extend(post['id'] for post in response['results'])
+            if not response['next']:
+                break
+            params['cursor'] = parse_qs(urlsplit(response['next']).query)['cursor'][0]
+        self.assertEqual(seen, posts[::-1])
+
+
+class CategoryListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = make_user(1)
+        now = timezone.now()
+        for hours, category in [(5, 'news'), (1, 'news'), (3, 'sports'), (3, 'news'), (2, 'news')]:
+            post = Post.objects.create(author=self.author, content=f'{category} {hours}', categories=category)
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(hours=hours))
+        self.news = list(Post.objects.filter(categories='news').order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def listing(self, **params):
+        response = self.client.get('/app/list_posts/', params)
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.json()['results']]
+
+    def test_category_newest_first_in_pages(self):
+        self.assertEqual(self.listing(category='news'), self.news)
+        self.assertEqual(walk_pages(self.client, '/app/list_posts/', {'category': 'news', 'page_size': 3}),
+                         [self.news[:3], self.news[3:]])
+
+    def test_since(self):
+        since = (timezone.now() - timedelta(hours=2, minutes=30)).isoformat()
+        self.assertEqual(self.listing(category='news', since=since), self.news[:2])
+        self.assertEqual(len(self.listing(since=(timezone.now() - timedelta(hours=4)).isoformat())), 4)
+
+    def test_bad_filters(self):
+        self.assertEqual(self.client.get('/app/list_posts/', {'category': 'gossip'}).status_code, 400)
+        self.assertEqual(self.client.get('/app/list_posts/', {'since': 'last week'}).status_code, 400)
+
+    def test_writes_invalidate_the_cached_page(self):
+        self.assertEqual(self.listing(category='news'), self.news)
+        self.assertIsNotNone(get_category_page('news'))
+
+        response = self.client.post('/app/creating_post/', {'content': 'fresh', 'categories': 'news'}, **auth(self.author))
+        self.assertEqual(response.status_code, 201)
+        fresh = response.json()['id']
+        self.assertEqual(self.listing(category='news'), [fresh] + self.news)
+
+        response = self.client.put(f'/app/update_posts/{fresh}/', {'content': 'fresh', 'categories': 'sports'},
+                                   content_type='application/json', **auth(self.author))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listing(category='news'), self.news)
+        self.assertEqual(self.listing(category='sports')[0], fresh)
+
+        self.assertEqual(self.client.delete(f'/app/delete_post/{self.news[0]}/', **auth(self.author)).status_code, 204)
+        self.assertEqual(self.listing(category='news'), self.news[1:])
+
+
+class PostCommentsTests(TestCase):
+    def setUp(self):
+        self.reader = make_user(1)
+        self.posts = [Post.objects.create(author=self.reader, content=f'post {n}', categories='news') for n in range(3)]
+        now = timezone.now()
+        for post in self.posts[:2]:
+            for minutes in (1, 4, 2, 3):
+                comment = Comment.objects.create(user=self.reader, post=post, comments=f'{minutes} minutes ago')
+                Comment.objects.filter(pk=comment.pk).update(created_at=now - timedelta(minutes=minutes))
+
+    def oldest_first(self, post):
+        return list(post.comments.order_by('created_at', 'id').values_list('id', flat=True))
+
+    def test_comments_of_one_post_oldest_first(self):
+        post = self.posts[0]
+        expected = self.oldest_first(post)
+        self.assertEqual(walk_pages(self.client, f'/app/posts/{post.id}/comments/', {'page_size': 3}), [expected[:3], expected[3:]])
+        self.assertEqual(walk_pages(self.client, f'/app/posts/{self.posts[2].id}/comments/', {}), [[]])
+        self.assertEqual(self.client.get('/app/posts/999999/comments/').status_code, 404)
+
+    def test_previews_in_one_query(self):
+        ids = ','.join(str(post.id) for post in self.posts)
+        with self.assertNumQueries(1):
+            response = self.client.get('/app/posts/comments/preview/', {'post_ids': ids, 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        previews = {int(post_id): [comment['id'] for comment in comments] for post_id, comments in response.json().items()}
+        self.assertEqual(previews, {
+            self.posts[0].id: self.oldest_first(self.posts[0])[:2],
+            self.posts[1].id: self.oldest_first(self.posts[1])[:2],
+            self.posts[2].id: [],
+        })
+
+    def test_preview_arguments(self):
+        self.assertEqual(self.client.get('/app/posts/comments/preview/').status_code, 400)
+        self.assertEqual(self.client.get('/app/posts/comments/preview/', {'post_ids': '1,x'}).status_code, 400)
+        too_many = ','.join(str(n) for n in range(settings.MAX_PAGE_SIZE + 1))
+        self.assertEqual(self.client.get('/app/posts/comments/preview/', {'post_ids': too_many}).status_code, 400)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol = make_user(1), make_user(2), make_user(3)
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return user.follower_count, user.following_count, user.post_count
+
+    def test_follow_and_unfollow(self):
+        self.client.post(f'/app/follow/{self.bob.id}/', **auth(self.alice))
+        self.client.post('/app/follow/bulk/', {'user_ids': [self.bob.id, self.carol.id]},
+                         content_type='application/json', **auth(self.alice))
+        self.assertEqual(self.counters(self.alice), (0, 2, 0))
+        self.assertEqual(self.counters(self.bob), (1, 0, 0))
+        self.assertEqual(self.counters(self.carol), (1, 0, 0))
+
+        self.client.delete(f'/app/unfollow/{self.bob.id}/', **auth(self.alice))
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+
+    def test_unfollows_count_only_the_rows_they_delete(self):
+        for user in (self.bob, self.carol):
+            self.client.post(f'/app/follow/{user.id}/', **auth(self.alice))
+
+        def unfollowed_meanwhile(user_id):
+            # Another request removed Alice -> Bob (and lowered the counters) just before this one got the lock
+            if Follow.objects.filter(follower=self.alice, following=self.bob).delete()[0]:
+                adjust_counters(User, self.alice.id, following_count=-1)
+                adjust_counters(User, self.bob.id, follower_count=-1)
+
+        with mock.patch('app.views.lock_follows_of', side_effect=unfollowed_meanwhile):
+            self.assertEqual(self.client.delete(f'/app/unfollow/{self.bob.id}/', **auth(self.alice)).status_code, 400)
+            response = self.client.delete('/app/unfollow/bulk/', {'user_ids': [self.bob.id, self.carol.id]},
+                                          content_type='application/json', **auth(self.alice))
+        self.assertEqual(response.json()['unfollowed'], [self.carol.id])
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 0, 0))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+    def test_posts_and_comments(self):
+        response = self.client.post('/app/creating_post/', {'title': 't', 'content': 'counted', 'categories': 'news'},
+                                    **auth(self.alice))
+        post_id = response.json()['id']
+        self.assertEqual(self.counters(self.alice), (0, 0, 1))
+
+        self.client.post(f'/app/comments/{post_id}/', {'comments': 'first'}, **auth(self.bob))
+        response = self.client.post(f'/app/comments/{post_id}/', {'comments': 'second'}, **auth(self.bob))
+        self.assertEqual(Post.objects.get(pk=post_id).comment_count, 2)
+
+        self.client.delete(f"/app/delete_comment/{response.json()['data']['id']}/", **auth(self.bob))
+        self.assertEqual(Post.objects.get(pk=post_id).comment_count, 1)
+
+        self.client.delete(f'/app/delete_post/{post_id}/', **auth(self.alice))
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+
+    def test_counters_never_go_negative(self):
+        with CaptureQueriesContext(connection) as queries:
+            adjust_counters(User, self.alice.id, follower_count=-5)
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        # Never computes 0 - 5 first: MySQL rejects that for unsigned columns before clamping
+        self.assertIn('CASE WHEN', queries[0]['sql'])
+        adjust_counters(User, self.alice.id, follower_count=3)
+        adjust_counters_bulk(User, [self.alice.id, self.bob.id], follower_count=-2)
+        self.assertEqual(self.counters(self.alice)[0], 1)
+        self.assertEqual(self.counters(self.bob)[0], 0)
+
+    def test_reconcile_repairs_drift(self):
+        Follow.objects.create(follower=self.alice, following=self.bob)
+        create_post(self.bob, 'uncounted')
+        User.objects.filter(pk=self.carol.pk).update(follower_count=7)
+
+        call_command('reconcile_counters', stdout=io.StringIO())
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+        self.assertEqual(self.counters(self.bob), (1, 0, 1))
+        self.assertEqual(self.counters(self.carol), (0, 0, 0))
+
+
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(1)
+        self.post = create_post(self.user, 'cached post')
+        self.url = f'/app/list_posts/{self.post.id}/'
+
+    def test_if_none_match_is_answered_without_queries(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['content'], 'cached post')
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, first.content)
+
+    def test_if_modified_since(self):
+        first = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_update_changes_the_etag(self):
+        first = self.client.get(self.url)
+        response = self.client.put(
+            f'/app/update_posts/{self.post.id}/', {'title': 't', 'content': 'edited', 'categories': 'news'},
+            content_type='application/json', **auth(self.user),
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response.json()['content'], 'edited')
+
+    def test_new_comment_changes_the_post_etag(self):
+        first = self.client.get(self.url)
+        self.client.post(f'/app/comments/{self.post.id}/', {'comments': 'hi'}, **auth(self.user))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['comment_count'], 1)
+
+    def test_missing_object(self):
+        self.assertEqual(self.client.get('/app/list_posts/999999/').status_code, 404)
+
+    def test_if_none_match_star_needs_the_object(self):
+        self.assertEqual(self.client.get('/app/list_posts/999999/', HTTP_IF_NONE_MATCH='*').status_code, 404)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+
+    def test_deleting_a_post_drops_its_cached_comments(self):
+        self.client.post(f'/app/comments/{self.post.id}/', {'comments': 'hi'}, **auth(self.user))
+        url = f'/app/list_comments/{Comment.objects.get().id}/'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+
+        self.assertEqual(self.client.delete(f'/app/delete_post/{self.post.id}/', **auth(self.user)).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 404)
+
+
+class AsyncListPostsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = make_user(1)
+        for n in range(3):
+            create_post(author, f'news {n}')
+        Post.objects.create(author=author, content='sports', categories='sports')
+        self.async_client = AsyncClient()
+
+    async def compare(self, query):
+        sync = await sync_to_async(self.client.get)(f'/app/list_posts/{query}')
+        response = await self.async_client.get(f'/app/async/list_posts/{query}')
+        self.assertEqual(response.status_code, sync.status_code)
+        self.assertEqual(response.content.replace(b'/async', b''), sync.content)
+        return response
+
+    async def test_matches_the_sync_view(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        for query in ['?category=news', '?category=news&page_size=2', '?category=news&expand=author',
+                      f'?since={quote(since)}', '?category=nonsense', '?since=yesterday']:
+            with self.subTest(query=query):
+                await self.compare(query)
+
+    async def test_shares_the_cached_category_page(self):
+        response = await self.compare('?category=news')
+        self.assertIsNotNone(await sync_to_async(get_category_page)('news'))
+        await Post.objects.filter(categories='news').aupdate(content='changed')  # update() invalidates nothing
+        cached = await self.async_client.get('/app/async/list_posts/?category=news')
+        self.assertEqual(cached.content, response.content)
+
+
+@override_settings(FEED_FANOUT_LIMIT=4, FEED_BACKFILL_SIZE=3)
+class SeedingTests(TestCase):
+    def seed(self, **options):
+        return seed_dataset(users=25, posts_per_user=2, comments_per_post=1, follows_per_user=4, batch_size=7, **options)
+
+    def test_seeded_rows_are_consistent(self):
+        counts = self.seed()
+        self.assertEqual(counts, {
+            'users': User.objects.count(), 'follows': Follow.objects.count(), 'posts': Post.objects.count(),
+            'comments': Comment.objects.count(), 'timeline_entries': TimelineEntry.objects.count(),
+        })
+        self.assertEqual(list(User.objects.filter(is_staff=True).values_list('email', flat=True)), ['bench-0@example.com'])
+        for model, columns in expected_counters().items():
+            self.assertEqual(reconcile_counters(model, columns, 0, 10 ** 6), 0)
+
+        # Every feed holds what fan_out_post and backfill_timeline would have put there
+        for user in User.objects.all():
+            authors = fan_out_authors(Follow.objects.filter(follower=user).values_list('following_id', flat=True))
+            expected = Post.objects.filter(author_id__in=authors).order_by('-created_at', '-id')[:settings.FEED_BACKFILL_SIZE]
+            self.assertEqual(set(user.timeline.values_list('post_id', flat=True)), {post.id for post in expected})
+
+    def test_same_options_produce_the_same_rows(self):
+        def rows():
+            return list(Post.objects.order_by('id').values_list('author__email', 'content', 'categories'))
+
+        self.seed(random_seed=7)
+        first = rows()
+        delete_dataset('bench')
+        self.seed(random_seed=7)
+        self.assertEqual(rows(), first)
+
+
+class UnreachableMailBackend(BaseEmailBackend):
+    def open(self):
+        raise ConnectionRefusedError('connection refused')
+
+    def send_messages(self, messages):
+        self.open()
+
+
+class RejectingMailBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPRecipientsRefused({})
+
+
+class CrashingMailBackend(locmem.EmailBackend):
+    # Delivers the first message, then the worker dies before the next one
+    def send_messages(self, messages):
+        if mail.outbox:
+            raise SystemExit
+        return super().send_messages(messages)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.emails = [enqueue_email('Subject', 'Body', [f'to{number}@example.com']) for number in range(2)]
+
+    def states(self):
+        return list(OutgoingEmail.objects.order_by('id').values_list('status', 'attempts'))
+
+    def test_sends_due_mail(self):
+        self.assertEqual(drain_outbox(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(self.states(), [(OutgoingEmail.SENT, 0)] * 2)
+        self.assertEqual(drain_outbox(), (0, 0))
+
+    @override_settings(OUTBOX_RETRY_DELAY=60, OUTBOX_MAX_ATTEMPTS=2)
+    def test_failed_sends_back_off_then_give_up(self):
+        started = timezone.now()
+        self.assertEqual(drain_outbox(RejectingMailBackend()), (0, 2))
+        self.assertEqual(self.states(), [(OutgoingEmail.PENDING, 1)] * 2)
+        self.assertTrue(all(email.next_attempt_at >= started + timedelta(seconds=60) for email in OutgoingEmail.objects.all()))
+
+        # Not due yet
+        self.assertEqual(drain_outbox(RejectingMailBackend()), (0, 0))
+
+        OutgoingEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(RejectingMailBackend()), (0, 2))
+        self.assertEqual(self.states(), [(OutgoingEmail.FAILED, 2)] * 2)
+
+    def test_unreachable_server_backs_off_the_batch(self):
+        self.assertEqual(drain_outbox(UnreachableMailBackend()), (0, 2))
+        self.assertEqual(self.states(), [(OutgoingEmail.PENDING, 1)] * 2)
+        self.assertIn('connection refused', OutgoingEmail.objects.first().last_error)
+
+    def test_crash_does_not_resend_delivered_mail(self):
+        with self.assertRaises(SystemExit):
+            drain_outbox(CrashingMailBackend())
+        self.assertEqual(self.states(), [(OutgoingEmail.SENT, 0), (OutgoingEmail.SENDING, 0)])
+
+        # The crashed worker's lease still holds the second message
+        self.assertEqual(drain_outbox(), (0, 0))
+        OutgoingEmail.objects.filter(status=OutgoingEmail.SENDING).update(next_attempt_at=timezone.now())
+        self.assertEqual(drain_outbox(), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [['to0@example.com'], ['to1@example.com']])
+        self.assertEqual(self.states(), [(OutgoingEmail.SENT, 0)] * 2)
+
+    def test_loop_worker_survives_errors(self):
+        class Stop(Exception):
+            pass
+
+        with mock.patch('app.management.commands.send_queued_mail.drain_outbox', side_effect=[DatabaseError('gone'), (0, 0)]), \
+                mock.patch('app.management.commands.send_queued_mail.time.sleep', side_effect=[None, Stop]), \
+                self.assertLogs('app', 'ERROR'):
+            with self.assertRaises(Stop):
+                call_command('send_queued_mail', loop=True, stdout=io.StringIO())
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class OneTimePasswordTests(TestCase):
+    def setUp(self):
+        self.user, self.other = make_user(1), make_user(2)
+        self.code = issue_otp(self.user)
+
+    def verify(self, code, email=None):
+        return self.client.post('/app/verify-email/', {'email': email or self.user.email, 'otp': code})
+
+    def wrong(self, code):
+        return f'{(int(code) + 1) % 10 ** 6:06d}'
+
+    def test_right_code_verifies_once(self):
+        self.assertEqual(self.verify(self.code).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+        self.assertEqual(self.verify(self.code).status_code, 404)
+
+    def test_expired_code(self):
+        OneTimePassword.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.verify(self.code).status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_verified)
+
+    def test_locked_after_max_attempts(self):
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.assertEqual(self.verify(self.wrong(self.code)).status_code, 404)
+        self.assertEqual(self.verify(self.code).status_code, 429)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_verified)
+
+    def test_new_code_replaces_the_old_one_and_resets_attempts(self):
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.verify(self.wrong(self.code))
+        new_code = issue_otp(self.user)
+        self.assertEqual(OneTimePassword.objects.filter(user=self.user).count(), 1)
+        if new_code != self.code:
+            self.assertEqual(self.verify(self.code).status_code, 404)
+        self.assertEqual(self.verify(new_code).status_code, 200)
+
+    def test_code_is_scoped_to_its_user(self):
+        other_code = issue_otp(self.other)
+        if other_code != self.code:
+            self.assertEqual(self.verify(other_code).status_code, 404)
+        self.assertEqual(verify_otp(self.other.email, other_code), (self.other, None))
+
+    def test_code_is_scoped_to_its_purpose(self):
+        # Only email verification is issued today; any other purpose is a separate key
+        self.assertEqual(verify_otp(self.user.email, self.code, 'password_reset'), (None, 'invalid'))
+        reset_code = issue_otp(self.user, 'password_reset')
+        self.assertEqual(OneTimePassword.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(verify_otp(self.user.email, reset_code, 'password_reset'), (self.user, None))
+        self.assertEqual(verify_otp(self.user.email, self.code), (self.user, None))
+
+    def resend(self, email=None):
+        return self.client.post('/app/resend-otp/', {'email': email or self.user.email})
+
+    def new_code(self):
+        code = OneTimePassword.objects.get(user=self.user).code
+        self.assertIn(code, OutgoingEmail.objects.latest('pk').body)
+        return code
+
+    def test_expired_code_is_replaced_on_request(self):
+        OneTimePassword.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.verify(self.code).status_code, 400)
+        self.assertEqual(self.resend().status_code, 200)
+        self.assertEqual(self.verify(self.new_code()).status_code, 200)
+
+    def test_locked_code_is_replaced_on_request(self):
+        for _ in range(settings.OTP_MAX_ATTEMPTS):
+            self.verify(self.wrong(self.code))
+        self.assertEqual(self.verify(self.code).status_code, 429)
+        self.assertEqual(self.resend().status_code, 200)
+        self.assertEqual(self.verify(self.new_code()).status_code, 200)
+
+    def test_resend_answers_alike_for_unknown_and_verified_accounts(self):
+        self.other.is_verified = True
+        self.other.save()
+        for email in ('nobody@example.com', self.other.email):
+            response = self.resend(email)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), self.resend().json())
+        self.assertEqual(OutgoingEmail.objects.filter(to=self.other.email).count(), 0)
+        self.assertEqual(self.client.post('/app/resend-otp/', {}).status_code, 400)
+
+    @override_settings(THROTTLE_ENABLED=True)
+    def test_resend_is_throttled(self):
+        get_throttle_store().clear()
+        self.addCleanup(get_throttle_store().clear)
+        statuses = [self.resend().status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_sweep_keeps_recently_expired_codes(self):
+        OneTimePassword.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('sweep_otps', pause=0, stdout=io.StringIO())
+        self.assertEqual(self.verify(self.code).json()['message'], 'Passcode has expired, request a new one at resend-otp/')
+        OneTimePassword.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(days=2))
+        call_command('sweep_otps', pause=0, stdout=io.StringIO())
+        self.assertFalse(OneTimePassword.objects.exists())
+
+    def test_email_and_code_are_required(self):
+        self.assertEqual(self.client.post('/app/verify-email/', {'email': self.user.email}).status_code, 400)
+        self.assertEqual(self.client.post('/app/verify-email/', {'otp': self.code}).status_code, 400)
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        # 0 follows 1, 2 and 3; 1 and 2 both follow 4..10; 3 follows only 11
+        edges = [(0, 1), (0, 2), (0, 3)] + [(via, node) for via in (1, 2) for node in range(4, 11)] + [(3, 11)]
+        self.graph = FollowGraph.from_dense(12, array('i', [s for s, _ in edges]), array('i', [t for _, t in edges]))
+
+    def assertTop(self, expected, **options):
+        for backend in ['python'] + (['numpy'] if numpy is not None else []):
+            top = self.graph.top(0, backend=backend, **options)
+            self.assertEqual([(node, mutual) for node, _, mutual in top], expected, backend)
+
+    def test_mutual_ranks_by_shared_follows_then_older_user(self):
+        self.assertTop([(4, 2), (5, 2), (6, 2)], limit=3)
+
+    def test_adamic_adar_favours_mutuals_that_follow_few(self):
+        # 11 is reached only through 3, which follows nobody else
+        self.assertTop([(11, 1), (4, 2)], method=ADAMIC_ADAR, limit=2)
+
+    def test_hubs_are_skipped(self):
+        self.assertTop([(11, 1)], hub_degree=5)
+
+    @skipIf(numpy is None, 'NumPy is not installed')
+    def test_backends_agree_on_scores(self):
+        for method in ('mutual', ADAMIC_ADAR):
+            python = self.graph.top(0, method, backend='python')
+            for (node, score, mutual), expected in zip(self.graph.top(0, method, backend='numpy'), python):
+                self.assertEqual((node, mutual), (expected[0], expected[2]))
+                self.assertAlmostEqual(score, expected[1])
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class SuggestionTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave, self.erin = (make_user(n) for n in range(1, 6))
+        for follower, following in [
+            (self.alice, self.bob), (self.alice, self.carol), (self.bob, self.dave), (self.bob, self.erin),
+            (self.carol, self.dave), (self.carol, self.alice),
+        ]:
+            Follow.objects.create(follower=follower, following=following)
+
+    def suggested(self, user):
+        return list(FollowSuggestion.objects.filter(user=user).order_by('rank').values_list('suggested_id', 'mutual_count'))
+
+    def test_rebuild_ranks_friends_of_friends(self):
+        self.assertEqual(rebuild_suggestions(), (5, 3))
+        # Never the user themselves or someone they already follow
+        self.assertEqual(self.suggested(self.alice), [(self.dave.id, 2), (self.erin.id, 1)])
+        self.assertEqual(self.suggested(self.carol), [(self.bob.id, 1)])
+        self.assertEqual(self.suggested(self.dave), [])
+
+    def test_endpoint(self):
+        rebuild_suggestions()
+        response = self.client.get('/app/suggestions/?limit=1', **auth(self.alice))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            'user': {
+                'id': self.dave.id, 'email': self.dave.email,
+                'first_name': self.dave.first_name, 'last_name': self.dave.last_name,
+            },
+            'mutual_count': 2, 'score': 2.0,
+        }])
+        self.assertEqual(self.client.get('/app/suggestions/?limit=x', **auth(self.alice)).status_code, 400)
+        self.assertEqual(self.client.get('/app/suggestions/').status_code, 401)
+
+    def test_follow_drops_the_suggestion_until_refresh(self):
+        rebuild_suggestions()
+        self.assertEqual(self.client.post(f'/app/follow/{self.dave.id}/', **auth(self.alice)).status_code, 201)
+        self.assertEqual(self.suggested(self.alice), [(self.erin.id, 1)])
+        self.assertTrue(SuggestionRefresh.objects.filter(user=self.alice).exists())
+
+        # Alice and Carol, who follows her, are recomputed
+        self.assertEqual(refresh_suggestions(), (2, 2))
+        self.assertEqual(self.suggested(self.alice), [(self.erin.id, 1)])
+        self.assertEqual(self.suggested(self.carol), [(self.bob.id, 1)])
+        self.assertFalse(SuggestionRefresh.objects.exists())
+        self.assertEqual(refresh_suggestions(), (0, 0))
+
+    def test_refresh_picks_up_new_friends_of_friends(self):
+        rebuild_suggestions()
+        self.assertEqual(self.client.post(f'/app/follow/{self.erin.id}/', **auth(self.dave)).status_code, 201)
+        self.assertEqual(self.client.delete(f'/app/unfollow/{self.carol.id}/', **auth(self.alice)).status_code, 204)
+        refresh_suggestions()
+        # Dave now reaches nobody new; Alice only has Bob's follows left
+        self.assertEqual(self.suggested(self.alice), [(self.dave.id, 1), (self.erin.id, 1)])
+        self.assertEqual(self.suggested(self.dave), [])
+
+
+class SerializationTimeTests(TestCase):
+    def setUp(self):
+        author = make_user(1)
+        for n in range(3):
+            Post.objects.create(author=author, content=f'post {n}', categories='news')
+        self.stats = RequestStats()
+        token = current_request_stats.set(self.stats)
+        self.addCleanup(current_request_stats.reset, token)
+
+    def test_serializers_count_once_per_object(self):
+        posts = list(Post.objects.select_related('author'))
+        with mock.patch('app.metrics.record_serialization') as record:
+            PostSerializer(posts, many=True, context={'expand': ['author']}).data
+        # The nested author serializers run inside their post's timer
+        self.assertEqual(record.call_count, 3)
+
+    def test_fast_path_rows_and_rendering_are_timed(self):
+        data = POST_ROWS.many(POST_ROWS.project(Post.objects.all()))
+        FastJSONRenderer().render(data)
+        self.assertGreater(self.stats.serialization_seconds, 0)
+
+
+class ContentHashTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.create(author=make_user(1), content='hello', image=png_upload(), categories='news')
+        self.post = Post.objects.get(pk=self.post.pk)
+
+    def hashes_on(self, **save_options):
+        with mock.patch.object(Post, 'compute_content_hash', wraps=Post.compute_content_hash) as compute:
+            self.post.save(**save_options)
+        return compute.call_count
+
+    def test_unchanged_post_is_not_rehashed(self):
+        self.post.categories = 'sports'
+        self.assertEqual(self.hashes_on(), 0)
+        self.assertEqual(self.hashes_on(update_fields=['categories']), 0)
+
+    def test_changed_content_is_rehashed(self):
+        self.post.content = 'hello again'
+        self.assertEqual(self.hashes_on(update_fields=['content']), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content_hash, Post.compute_content_hash('hello again', self.post.image))
+        self.post.content = 'third'
+        self.assertEqual(self.hashes_on(), 1)
+        self.assertEqual(self.hashes_on(), 0)
+
+    def test_new_image_is_rehashed(self):
+        self.post.image = png_upload(color=(0, 0, 255))
+        self.assertEqual(self.hashes_on(), 1)
+        self.assertEqual(self.post.content_hash, Post.compute_content_hash('hello', png_upload(color=(0, 0, 255))))
+
+    def test_missing_file_hashes_the_text(self):
+        # Uploaded before content addressing, then lost
+        Post.objects.filter(pk=self.post.pk).update(image='post_images/gone.png')
+        post = Post.objects.get(pk=self.post.pk)
+        post.content = 'edited'
+        post.save()
+        self.assertEqual(post.content_hash, Post.compute_content_hash('edited'))
+
+    def test_backfill_hashes_legacy_posts(self):
+        author = self.post.author
+        twin = Post.objects.create(author=author, content='twin', categories='news')
+        Post.objects.filter(pk=twin.pk).update(content='hello', image=self.post.image.name)
+        Post.objects.update(content_hash=None)  # rows written before the column existed
+        updated_at = Post.objects.get(pk=self.post.pk).updated_at
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('backfill_content_hashes', batch_size=1, stdout=stdout, stderr=stderr)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.content_hash, Post.compute_content_hash('hello', self.post.image))
+        self.assertEqual(self.post.updated_at, updated_at)
+        self.assertIsNone(Post.objects.get(pk=twin.pk).content_hash)
+        self.assertIn('filled 1 content hash(es), 1 duplicate(s)', stdout.getvalue())
+        self.assertIn(f'post {twin.pk} duplicates', stderr.getvalue())
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    def test_concurrently_stored_file_is_reused(self):
+        upload = png_upload()
+        name = f'cas/{image_digest(upload)[:2]}/{image_digest(upload)}.png'
+        content_storage.save('post_images/first.png', png_upload())
+        exists, raced = content_storage.exists, []
+
+        def exists_after_our_check(checked):
+            # The other upload wrote the file between our exists() check and our open()
+            if checked == name and not raced:
+                raced.append(checked)
+                return False
+            return exists(checked)
+
+        with mock.patch.object(content_storage, 'exists', side_effect=exists_after_our_check):
+            self.assertEqual(content_storage.save('post_images/picture.png', upload), name)
+        self.assertEqual(raced, [name])
+        self.assertEqual(content_storage.listdir(f'cas/{name[4:6]}')[1], [name.rsplit('/', 1)[1]])
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 2)
+
+
+    def test_release_during_upload_of_the_same_bytes(self):
+        name = content_storage.save('post_images/first.png', png_upload())
+
+        def released_meanwhile(stored_name, size):
+            # The last reference went away while the second upload was being hashed
+            self.assertTrue(release_media(stored_name))
+            acquire_media(stored_name, size)
+
+        with mock.patch('app.storage.acquire_media', side_effect=released_meanwhile):
+            self.assertEqual(content_storage.save('post_images/second.png', png_upload()), name)
+        self.assertTrue(content_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).ref_count, 1)
+
+    def test_last_release_deletes_the_file(self):
+        name = content_storage.save('post_images/first.png', png_upload())
+        content_storage.save('post_images/second.png', png_upload())
+        self.assertFalse(release_media(name))
+        self.assertTrue(content_storage.exists(name))
+        self.assertTrue(release_media(name))
+        self.assertFalse(content_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+class UpdatePostConflictTests(MediaRootMixin, TransactionTestCase):
+    # Autocommit, as in production, so the conflict does not poison a test transaction
+    def test_conflicting_edit_releases_the_new_image(self):
+        author = make_user(1)
+        Post.objects.create(author=author, content='same', categories='news', image=png_upload())
+        other = Post.objects.create(author=author, content='other', categories='news')
+        body = encode_multipart(BOUNDARY, {'content': 'same', 'categories': 'news', 'image': png_upload()})
+        response = self.client.put(f'/app/update_posts/{other.id}/', body, content_type=MULTIPART_CONTENT, **auth(author))
+        self.assertEqual(response.status_code, 400)
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(content_storage.exists(blob.name))
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(1, is_verified=True)
+        self.claims = {'is_active': True, 'is_verified': True}
+
+    def test_claims_user_needs_no_query_until_other_columns_are_read(self):
+        with self.assertNumQueries(0):
+            user = ClaimsUser.from_claims(self.user.pk, self.claims)
+            self.assertTrue(user.is_verified)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertEqual(user.first_name, self.user.first_name)
+
+    def test_counter_changes_reach_the_cached_row(self):
+        self.assertEqual(ClaimsUser.from_claims(self.user.pk, self.claims).follower_count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            adjust_counters(User, self.user.pk, follower_count=1)
+        self.assertEqual(ClaimsUser.from_claims(self.user.pk, self.claims).follower_count, 1)
+
+    def test_revoked_staff_access_is_not_served_from_the_cache(self):
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        headers = auth(self.user)
+        self.assertEqual(self.client.get('/app/db/pool/', **headers).status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_staff=False)  # no post_save, the cached row is stale
+        self.assertEqual(self.client.get('/app/db/pool/', **headers).status_code, 403)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        self.user = make_user(1, is_verified=True)
+
+    def login(self, email, password='password-123'):
+        return self.client.post('/app/login/', {'email': email, 'password': password})
+
+    def test_right_password(self):
+        response = self.login(self.user.email)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.json())
+
+    def test_wrong_password(self):
+        self.assertEqual(self.login(self.user.email, 'wrong-password').status_code, 401)
+
+    def test_unknown_email_is_rejected_after_the_same_hashing(self):
+        with mock.patch('app.hashers.make_password', wraps=make_password) as hash_dummy:
+            self.assertEqual(self.login('nobody@example.com').status_code, 401)
+        hash_dummy.assert_called_once_with('password-123')
+
+    def test_unverified_user(self):
+        self.user.is_verified = False
+        self.user.save()
+        self.assertEqual(self.login(self.user.email).status_code, 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        self.user = make_user(1)
+        self.refresh = self.user.tokens()['refresh']
+
+    def refresh_with(self, token):
+        return self.client.post('/app/token/refresh/', {'refresh': token})
+
+    def test_logged_out_token_cannot_refresh(self):
+        response = self.client.post('/app/logout/', {'refresh_token': self.refresh}, **auth(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_rotated_token_cannot_be_reused(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(response.json()['refresh']).status_code, 200)
+
+    @override_settings(BLACKLIST_SYNC_INTERVAL=3600)
+    def test_filter_loads_rows_blacklisted_elsewhere_then_answers_from_memory(self):
+        token = OutstandingToken.objects.get(jti=RefreshToken(self.refresh)['jti'])
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token)])  # no post_save, as in another process
+        blacklist = BlacklistFilter()
+        self.assertIn(token.jti, blacklist)
+        with self.assertNumQueries(0):
+            self.assertNotIn('unknown-jti', blacklist)
+
+    def test_prune_deletes_only_expired_tokens(self):
+        now = timezone.now()
+        expired = [
+            OutstandingToken.objects.create(jti=f'expired-{n}', token='t', expires_at=now - timedelta(hours=1))
+            for n in range(3)
+        ]
+        BlacklistedToken.objects.create(token=expired[0])
+        kept = set(OutstandingToken.objects.filter(expires_at__gt=now).values_list('pk', flat=True))
+
+        stdout = io.StringIO()
+        call_command('prune_tokens', batch_size=2, pause=0, stdout=stdout)
+        self.assertEqual(set(OutstandingToken.objects.values_list('pk', flat=True)), kept)
+        self.assertFalse(BlacklistedToken.objects.filter(token__in=expired).exists())
+        self.assertIn('deleted 3 expired token(s)', stdout.getvalue())
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_released_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(FakeConnection, lambda connection: True)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection, lambda connection: True), first)
+        stats = pool.stats()
+        self.assertEqual((stats['connects'], stats['checkouts'], stats['open'], stats['in_use']), (1, 2, 1, 1))
+
+    def test_waits_for_a_release_then_times_out(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        held = pool.acquire(FakeConnection, lambda connection: True)
+        threading.Timer(0.05, pool.release, [held]).start()
+        self.assertIs(pool.acquire(FakeConnection, lambda connection: True), held)
+
+        pool.timeout = 0.01
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection, lambda connection: True)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts'], stats['open']), (2, 1, 1))
+
+    def test_broken_connections_are_replaced(self):
+        pool = ConnectionPool(max_size=1)
+        broken = pool.acquire(FakeConnection, lambda connection: True)
+        pool.release(broken)
+        replacement = pool.acquire(FakeConnection, lambda connection: False)  # failed health check
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(broken.closed)
+
+        pool.release(replacement, reusable=False)  # e.g. closed mid-transaction
+        self.assertTrue(replacement.closed)
+        stats = pool.stats()
+        self.assertEqual((stats['discarded'], stats['open'], stats['in_use']), (2, 0, 0))
+
+    def test_pooled_backend_returns_connections_on_close(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        alias = 'pool-test'
+        self.addCleanup(pool_module._pools.pop, alias, None)
+        database = PooledSQLiteWrapper({**connection.settings_dict, 'NAME': f'{directory}/db.sqlite3', 'POOL': {'MAX_SIZE': 2}}, alias)
+
+        raw = []
+        for _ in range(3):  # three requests
+            with database.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            raw.append(database.connection)
+            database.close()
+        self.assertEqual(len({id(connection) for connection in raw}), 1)
+        self.assertEqual(pool_stats()[alias]['connects'], 1)
+        self.assertEqual(pool_stats()[alias]['in_use'], 0)
+
+    def test_failed_connect_frees_its_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        with self.assertRaises(ConnectionRefusedError):
+            pool.acquire(mock.Mock(side_effect=ConnectionRefusedError), lambda connection: True)
+        self.assertIsInstance(pool.acquire(FakeConnection, lambda connection: True), FakeConnection)
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        settings_override = override_settings(SEARCH_INDEX_PATH=path, SEARCH_JOURNAL_MAX_BYTES=1000)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = make_user(1)
+
+    def post(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=self.author, title='title', content=content, categories='news')
+
+    def found(self, query):
+        return [pk for _, pk, _ in get_search_backend().search(query, kinds=('post',))]
+
+    def test_saves_and_deletes_are_indexed_on_commit(self):
+        post = self.post('zebra crossing')
+        self.assertEqual(self.found('zebra'), [post.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.found('zebra'), [])
+
+    def test_rolled_back_saves_are_not_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                Post.objects.create(author=self.author, title='title', content='okapi', categories='news')
+                raise DatabaseError('rolled back')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.found('okapi'), [])
+
+    def test_journal_is_compacted_past_its_size_limit(self):
+        posts = [self.post(f'giraffe number {n} ' + 'padding ' * 10) for n in range(20)]
+        backend = get_search_backend()
+        self.assertLessEqual(backend.journal_path.stat().st_size, 1000)
+        self.assertTrue(backend.snapshot_path.exists())
+        # A fresh process loads the snapshot and whatever the journal gained since
+        self.assertEqual(sorted(pk for _, pk, _ in InvertedIndexBackend().search('giraffe', limit=50)), [post.pk for post in posts])
+
+
+@override_settings(THROTTLE_ENABLED=True)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        get_throttle_store().clear()
+        self.addCleanup(get_throttle_store().clear)
+
+    def login(self, number, **extra):
+        return self.client.post('/app/login/', {'email': f'user{number}@example.com', 'password': 'x'}, **extra)
+
+    def test_ip_bucket_ignores_forged_forwarded_for(self):
+        # Many accounts from one address: only the per-IP bucket can stop it
+        statuses = [self.login(n, HTTP_X_FORWARDED_FOR=f'203.0.113.{n}').status_code for n in range(11)]
+        self.assertEqual(statuses, [401] * 10 + [429])
+
+    def test_account_bucket_holds_across_addresses(self):
+        statuses = [self.login(1, REMOTE_ADDR=f'198.51.100.{n}').status_code for n in range(11)]
+        self.assertEqual(statuses, [401] * 10 + [429])
+        self.assertTrue(self.login(1, REMOTE_ADDR='198.51.100.99').has_header('Retry-After'))
+
+    def test_forwarded_for_is_used_behind_trusted_proxies(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            statuses = [self.login(n, HTTP_X_FORWARDED_FOR=f'203.0.113.{n}').status_code for n in range(11)]
+        self.assertEqual(statuses, [401] * 11)
+
+
+class ImageVariantTests(MediaRootMixin, TestCase):
+    VARIANTS = {'thumbnail': {'name': 'variants/old_thumbnail.webp', 'width': 150, 'height': 150}}
+
+    def setUp(self):
+        super().setUp()
+        self.author = make_user(1)
+        self.post = Post.objects.create(author=self.author, content='c', categories='news', image=png_upload())
+        Post.objects.filter(pk=self.post.pk).update(image_variants=self.VARIANTS)
+
+    def test_new_image_drops_the_old_variants(self):
+        body = encode_multipart(BOUNDARY, {'content': 'c', 'categories': 'news', 'image': png_upload(color=(0, 0, 9))})
+        with mock.patch('app.views.schedule_variants') as schedule:
+            response = self.client.put(f'/app/update_posts/{self.post.id}/', body, content_type=MULTIPART_CONTENT,
+                                       **auth(self.author))
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()['data']['image_srcset'])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).image_variants, {})
+        schedule.assert_called_once()
+
+    def test_other_edits_keep_variants_written_meanwhile(self):
+        post = Post.objects.get(pk=self.post.pk)
+        fresh = {'thumbnail': {'name': 'variants/new_thumbnail.webp', 'width': 150, 'height': 150}}
+        Post.objects.filter(pk=post.pk).update(image_variants=fresh)  # the worker finished after post was read
+        serializer = PostSerializer(post, data={'content': 'edited', 'categories': 'news'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).image_variants, fresh)
+
+    def test_rendering_starts_after_commit(self):
+        with mock.patch('app.images._get_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_variants(self.post, 'image', 'image_variants', 'post')
+                executor.assert_not_called()
+        executor.return_value.submit.assert_called_once()
+
+
+class StoreVariantsTests(TransactionTestCase):
+    # The result callback runs on the executor's own thread, with its own connection
+    def store(self, post, name, variants):
+        future = Future()
+        future.set_result(variants)
+        thread = threading.Thread(target=_store_variants, args=(Post, post.pk, 'image', name, 'image_variants', 'post', future))
+        thread.start()
+        thread.join()
+
+    def test_only_the_current_image_gets_its_variants(self):
+        post = Post.objects.create(author=make_user(1), content='c', categories='news', image='cas/ab/current.png')
+        self.store(post, 'cas/cd/replaced.png', {'medium': {}})
+        self.assertEqual(Post.objects.get(pk=post.pk).image_variants, {})
+        self.store(post, 'cas/ab/current.png', {'thumbnail': {}})
+        self.assertEqual(Post.objects.get(pk=post.pk).image_variants, {'thumbnail': {}})
+
+
+class BenchmarkTests(TransactionTestCase):
+    def test_summary_percentiles(self):
+        summary = summarize([n / 1000 for n in range(100, 0, -1)], elapsed=2)
+        self.assertEqual((summary['count'], summary['p50_ms'], summary['p95_ms'], summary['p99_ms']), (100, 50.0, 95.0, 99.0))
+        self.assertEqual(summary['per_second'], 50.0)
+        self.assertEqual(summarize([])['p99_ms'], 0.0)
+
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(set(app_routes()) - {scenario.route for scenario in SCENARIOS}, set())
+
+    def test_run_reports_every_scenario(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        # One request at a time: the shared in-memory test database locks whole tables on write
+        call_command('bench_endpoints', users=12, posts_per_user=2, comments_per_post=1, follows_per_user=3,
+                     requests=2, concurrency=1, stdout=stdout, stderr=stderr)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(set(report['results']), {scenario.name for scenario in SCENARIOS})
+        self.assertEqual(report['failed'], [])
+        listing = report['results']['list_posts']
+        self.assertEqual(listing['count'], 2)
+        self.assertEqual(listing['statuses'], {'200': 2})
+        self.assertGreaterEqual(listing['queries_per_request'], 1)
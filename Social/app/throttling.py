@@ -0,0 +1,177 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    # '10/min' -> (10, 60): bucket capacity and seconds to refill it completely
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """
+    Token buckets held in this process's memory.
+
+    No network round trip, but every worker process keeps its own buckets,
+    so the effective limit is multiplied by the number of workers. The least
+    recently used buckets are dropped past `max_keys`.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        """
+        Takes one token from the bucket and returns 0, or returns the seconds
+        until a token is available when the bucket is empty.
+        """
+        now = time.monotonic()
+        refill = capacity / period  # tokens per second
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheWindowStore:
+    """
+    Sliding-window counters kept in a shared cache (THROTTLE_CACHE), so the
+    limit holds across processes and hosts.
+
+    A read-modify-write token bucket is not atomic over the cache API, so
+    this store counts requests per fixed window with cache.incr() (atomic on
+    memcached and Redis) and weights the previous window by how much of it
+    still overlaps the sliding window.
+    """
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or settings.THROTTLE_CACHE]
+
+    def consume(self, key, capacity, period):
+        now = time.time()
+        window, offset = divmod(now, period)
+        current_key = f'{key}:{int(window)}'
+        self.cache.add(current_key, 0, timeout=period * 2)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:  # expired between add() and incr()
+            self.cache.set(current_key, 1, timeout=period * 2)
+            current = 1
+        previous = self.cache.get(f'{key}:{int(window) - 1}', 0)
+
+        elapsed = offset / period
+        if previous * (1 - elapsed) + current <= capacity:
+            return 0
+
+        self.cache.decr(current_key)  # rejected requests do not use up the allowance
+        current -= 1
+        if current >= capacity or not previous:
+            return period - offset
+        # Wait until enough of the previous window has slid out
+        needed = 1 - (capacity - current) / previous
+        return max((needed - elapsed) * period, 1)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_store = None
+
+
+def get_throttle_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLE_STORE)()
+    return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limits a scope (one endpoint or group of endpoints) per client IP and per
+    account, with the rate from THROTTLE_RATES[scope], e.g. '10/min': a burst
+    of 10 requests, refilled at 10 per minute.
+
+    The account is the authenticated user, or for anonymous endpoints the
+    account named in `identity_field` of the request body, so one address
+    cannot be brute forced from many IPs. Throttles run before the view and
+    token authentication does not hit the database, so rejected requests
+    never reach it. DRF adds the Retry-After header from wait().
+    """
+    scope = None
+    identity_field = 'email'
+
+    def __init__(self):
+        self.capacity, self.period = parse_rate(settings.THROTTLE_RATES[self.scope])
+        self._wait = None
+
+    def get_identity(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        if not self.identity_field or not hasattr(request.data, 'get'):
+            return None
+        value = request.data.get(self.identity_field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        # Hashed so arbitrary input is a valid, bounded cache key
+        return 'id:' + hashlib.sha256(value.strip().lower().encode('utf-8')).hexdigest()[:32]
+
+    def get_keys(self, request):
+        keys = [f'throttle:{self.scope}:ip:{self.get_ident(request)}']
+        identity = self.get_identity(request)
+        if identity:
+            keys.append(f'throttle:{self.scope}:{identity}')
+        return keys
+
+    def allow_request(self, request, view):
+        if not settings.THROTTLE_ENABLED:
+            return True
+        store = get_throttle_store()
+        self._wait = max(store.consume(key, self.capacity, self.period) for key in self.get_keys(request))
+        return self._wait <= 0
+
+    def wait(self):
+        return self._wait
+
+
+class LoginThrottle(TokenBucketThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(TokenBucketThrottle):
+    scope = 'register'
+
+
+class VerifyEmailThrottle(TokenBucketThrottle):
+    scope = 'verify_email'
+
+
+class PasswordResetThrottle(TokenBucketThrottle):
+    scope = 'password_reset'
+
+
+class ResendOtpThrottle(TokenBucketThrottle):
+    scope = 'resend_otp'
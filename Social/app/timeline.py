@@ -0,0 +1,108 @@
+from django.conf import settings
+
+from .models import Follow, Post, TimelineEntry, User
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def fan_out_authors(author_ids):
+    """
+    Returns the subset of author_ids whose posts are pushed into follower feeds.
+
+    Authors at or above FEED_FANOUT_LIMIT followers are skipped; their posts
+    are merged into the feed when it is read instead.
+    """
+    return list(
+        User.objects.filter(id__in=author_ids, follower_count__lt=settings.FEED_FANOUT_LIMIT)
+        .values_list('id', flat=True)
+    )
+
+
+def merged_authors(user):
+    # Followed accounts too big to fan out, read straight from Post at query time
+    followed = Follow.objects.filter(follower=user).values('following_id')
+    return list(
+        User.objects.filter(id__in=followed, follower_count__gte=settings.FEED_FANOUT_LIMIT)
+        .values_list('id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """
+    Writes a new post into the timeline of every follower of its author.
+    """
+    if not fan_out_authors([post.author_id]):
+        return 0
+
+    follower_ids = Follow.objects.filter(following_id=post.author_id).values_list('follower_id', flat=True)
+    written = 0
+    for batch in _batched(follower_ids.iterator(chunk_size=settings.FEED_BATCH_SIZE), settings.FEED_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=follower_id, post_id=post.id, created_at=post.created_at) for follower_id in batch],
+            ignore_conflicts=True,
+        )
+        written += len(batch)
+    return written
+
+
+def backfill_timeline(follower_id, author_ids):
+    """
+    Copies the most recent posts of newly followed authors into a timeline.
+    """
+    author_ids = fan_out_authors(list(author_ids))
+    if not author_ids:
+        return 0
+
+    recent = (
+        Post.objects.filter(author_id__in=author_ids)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:settings.FEED_BACKFILL_SIZE]
+    )
+    entries = [TimelineEntry(owner_id=follower_id, post_id=post_id, created_at=created_at) for post_id, created_at in recent]
+    TimelineEntry.objects.bulk_create(entries, batch_size=settings.FEED_BATCH_SIZE, ignore_conflicts=True)
+    return len(entries)
+
+
+def prune_timeline(follower_id, author_ids):
+    """
+    Removes the posts of unfollowed authors from a timeline.
+    """
+    deleted, _ = TimelineEntry.objects.filter(owner_id=follower_id, post__author_id__in=list(author_ids)).delete()
+    return deleted
+
+
+def feed_page(request, paginator, posts=None):
+    """
+    Reads one page of the caller's home feed, newest first.
+
+    The precomputed timeline and the posts of merged (high follower) authors
+    are both read from the cursor position and merged here, so a page costs
+    at most two index range scans plus one primary key lookup on `posts`
+    (default Post.objects, pass a select_related queryset to embed authors).
+    """
+    page_size, cursor, values, reverse = paginator.read_cursor(request, Post)
+    limit = page_size + 1
+
+    entries = paginator.window(
+        TimelineEntry.objects.filter(owner=request.user), values, reverse, ordering=('-created_at', '-post_id')
+    )
+    keys = {(created_at, post_id) for post_id, created_at in entries.values_list('post_id', 'created_at')[:limit]}
+
+    authors = merged_authors(request.user)
+    if authors:
+        direct = paginator.window(Post.objects.filter(author_id__in=authors), values, reverse)
+        keys.update((created_at, post_id) for post_id, created_at in direct.values_list('id', 'created_at')[:limit])
+
+    keys = sorted(keys, reverse=not reverse)[:limit]
+    found = (posts if posts is not None else Post.objects).in_bulk([post_id for _, post_id in keys])
+    rows = [found[post_id] for _, post_id in keys if post_id in found]
+    return paginator.finish(rows, page_size, cursor, reverse)
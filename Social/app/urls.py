@@ -1,13 +1,18 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from . import views 
+from . import async_views
+from .serializers import CachedTokenRefreshSerializer
 urlpatterns = [
     path('register/', views.user_register, name='user-register'),  # User registration
     path('login/', views.login_user, name='login-user'),          # User login
     path('verify-email/', views.verify_user_email, name='verify-email'),  # Email verification
+    path('resend-otp/', views.resend_otp, name='resend-otp'),  # New passcode after one expired or locked
     path('set-new-password/', views.set_new_password, name='set-new-password'),  # Set new password
     path('password-reset-request/', views.password_reset_request, name='password-reset-request'),  # Password reset request
     path('password-reset-confirm/<str:uidb64>/<str:token>/', views.password_reset_confirm, name='password-reset-confirm'),  # Password reset confirmation
     path('logout/', views.logout_user, name='logout-user'),        # User logout
+    path('token/refresh/', TokenRefreshView.as_view(serializer_class=CachedTokenRefreshSerializer), name='token-refresh'),  # Rotate refresh token
     path('create-profile/', views.create_profile, name='create-profile'),  # Create user profile
     path('view-profile/', views.view_profile, name='view-profile'),  # View all profiles
     path('update-profile/<int:profile_id>/',views.update_profile, name='update-profile'),  # Update a specific profile
@@ -25,12 +30,38 @@ urlpatterns = [
    path('list_comments/', views.list_comments, name='list_comments'),
    path('list_comments/<int:comment_id>/', views.list_comments, name='list_comment'),
    path('delete_comment/<int:comment_id>/', views.delete_comment, name='delete_comment'),
+   path('posts/<int:post_id>/comments/', views.post_comments, name='post_comments'),
+   path('posts/comments/preview/', views.comment_previews, name='comment_previews'),
 
     #follow
     path('follow/<int:user_id>/', views.follow_user, name='follow-user'),
     path('unfollow/<int:user_id>/', views.unfollow_user, name='unfollow-user'),
+    path('follow/bulk/', views.bulk_follow, name='bulk-follow'),
+    path('unfollow/bulk/', views.bulk_unfollow, name='bulk-unfollow'),
+    path('relationships/', views.relationships, name='relationships'),
     path('followers/', views.get_followers, name='followers'),
     path('following/', views.get_following, name='following'),
+    path('suggestions/', views.suggestions, name='suggestions'),  # Who to follow
+
+    #feed
+    path('feed/', views.feed, name='feed'),
+
+    #search
+    path('search/', views.search, name='search'),
+
+    #operations
+    path('db/pool/', views.db_pool_status, name='db-pool-status'),
+    path('metrics/', views.metrics, name='metrics'),
+
+    #async read endpoints, for ASGI deployments (see Social/asgi.py)
+    path('async/view-profile/', async_views.view_profile, name='async-view-profile'),
+    path('async/view-profile/<int:profile_id>/', async_views.view_profile, name='async-view-profile'),
+    path('async/list_posts/', async_views.list_posts, name='async-list-posts'),
+    path('async/list_posts/<int:post_id>/', async_views.list_posts, name='async-list-posts'),
+    path('async/list_comments/', async_views.list_comments, name='async-list-comments'),
+    path('async/list_comments/<int:comment_id>/', async_views.list_comments, name='async-list-comment'),
+    path('async/followers/', async_views.get_followers, name='async-followers'),
+    path('async/following/', async_views.get_following, name='async-following'),
 
 
 ]
@@ -1,25 +1,72 @@
-import random
-from django.core.mail import EmailMessage
-from django.core.mail import BadHeaderError
+import logging
+import secrets
+from datetime import timedelta
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
 from Social import settings
 from .models import User, OneTimePassword
+from .outbox import enqueue_email
+
+logger = logging.getLogger(__name__)
 
 def generate_otp():
-    otp = "".join([str(random.randint(1, 9)) for _ in range(6)])  # Generate 6-digit OTP
-    return otp
+    return f"{secrets.randbelow(10 ** 6):06d}"  # 6 digits from the full 000000-999999 range
+
+
+def issue_otp(user, purpose=OneTimePassword.EMAIL_VERIFICATION):
+    # Replaces any earlier code for the same purpose, so a user has at most one live code per purpose
+    code = generate_otp()
+    OneTimePassword.objects.update_or_create(
+        user=user,
+        purpose=purpose,
+        defaults={
+            'code': code,
+            'expires_at': timezone.now() + timedelta(seconds=settings.OTP_TTL),
+            'attempts': 0,
+            'is_active': True,
+        },
+    )
+    return code
+
+
+def verify_otp(email, code, purpose=OneTimePassword.EMAIL_VERIFICATION):
+    """
+    Checks a passcode for the account with `email`.
+
+    Returns (user, None) when it matches, otherwise (None, reason) with reason
+    one of 'invalid', 'expired' or 'locked'. The code is found by a single
+    lookup on the (user, purpose) key and compared in constant time; after
+    OTP_MAX_ATTEMPTS wrong guesses it stops being accepted.
+    """
+    otp = (
+        OneTimePassword.objects.select_related('user')
+        .filter(user__email=email, purpose=purpose, is_active=True)
+        .first()
+    )
+    if otp is None:
+        return None, 'invalid'
+    if otp.is_expired:
+        return None, 'expired'
+    # Count the attempt first, so concurrent guesses cannot exceed the limit
+    if not OneTimePassword.objects.filter(pk=otp.pk, attempts__lt=settings.OTP_MAX_ATTEMPTS).update(attempts=F('attempts') + 1):
+        return None, 'locked'
+    if not constant_time_compare(otp.code, str(code)):
+        return None, 'invalid'
+    otp.delete()
+    return otp.user, None
 
 
 
 def send_code_to_user(email):
     subject = "One-time passcode for Email Verification"
-    otp_code = generate_otp()
-    print(f"Generated OTP: {otp_code}")  # Debugging: Print OTP to console
-
     try:
         user = User.objects.get(email=email)
     except User.DoesNotExist:
         return {"error": "User with this email does not exist."}
 
+    otp_code = issue_otp(user)
+
     current_site = "Social"
     email_body = (
         f"Hi {user.first_name},\n\n"
@@ -27,40 +74,19 @@ def send_code_to_user(email):
         f"Please verify your email with the following one-time passcode: {otp_code}."
     )
 
-    # Save the OTP to the database
-    OneTimePassword.objects.create(user=user, code=otp_code)
-
-    # Send the email
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to_email = [email]
-    
-    email_message = EmailMessage(
-        subject=subject,
-        body=email_body,
-        from_email=from_email,
-        to=to_email,
-    )
-
-    try:
-        email_message.send(fail_silently=False)
-        print(f"Email sent to {email}")
-    except BadHeaderError as e:
-        print(f"Failed to send email due to bad header: {e}")
-        return {"error": "Invalid header found."}
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        return {"error": "Failed to send email."}
+    # Queue the email, the send_queued_mail worker delivers it
+    enqueue_email(subject, email_body, [email], from_email=settings.DEFAULT_FROM_EMAIL)
+    logger.info("Verification email queued for user %s", user.pk)
     
 
 
 def send_normal_email(data):
-    email=EmailMessage(
+    enqueue_email(
         subject=data['email_subject'],
         body=data['email_body'],
-       from_email=settings.EMAIL_HOST_USER,
-        to=[data['to_email']]
+        to=[data['to_email']],
+        from_email=settings.EMAIL_HOST_USER,
     )
-    email.send()
 
 
 
@@ -1,17 +1,85 @@
+import logging
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Exists, F, OuterRef, Value, Window
+from django.db.models.functions import RowNumber
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
-from .serializers import FollowSerializer, LogoutUserSerializer, PasswordResetRequestSerializer, SetNewPasswordSerializer, UserRegisterSerializer, LoginSerializer, ProfileSerializer,PostSerializer,CommentSerializer
-from .utilis import send_code_to_user
-from .models import OneTimePassword, Post, User, Profile,Comment,Follow
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .serializers import UserIdsSerializer, FollowSerializer, FollowSuggestionSerializer, LogoutUserSerializer, PasswordResetRequestSerializer, SetNewPasswordSerializer, UserRegisterSerializer, LoginSerializer, ProfileSerializer,PostSerializer,CommentSerializer
+from .utilis import send_code_to_user, verify_otp
+from .throttling import LoginThrottle, PasswordResetThrottle, RegisterThrottle, ResendOtpThrottle, VerifyEmailThrottle
+from .pagination import KeysetPaginator, stream_ndjson, wants_stream
+from .fastpath import COMMENT_ROWS, FOLLOW_ROWS, POST_ROWS, PROFILE_ROWS, stream_rows
+from .renderers import FAST_RENDERER_CLASSES
+from .caching import (
+    cached_object_response, get_category_page, invalidate_category_pages, invalidate_object, invalidate_profiles_of,
+    set_category_page,
+)
+from .images import schedule_variants
+from .storage import release_media
+from .counters import adjust_counters, adjust_counters_bulk
+from .search import KINDS, get_search_backend
+from .db.pool import pool_stats
+from .metrics import render_prometheus
+from .timeline import backfill_timeline, fan_out_post, feed_page, prune_timeline
+from .recommendations import forget_suggestions, mark_stale
+from .models import Post, User, Profile,Comment,Follow,FollowSuggestion
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import smart_str, DjangoUnicodeDecodeError
 from django.contrib.auth.tokens import PasswordResetTokenGenerator 
 from django.shortcuts import get_object_or_404
 
+logger = logging.getLogger(__name__)
+
+
+def requested_expansions(request):
+    # ?expand=author,post -> {'author', 'post'}; request.GET so async (plain Django) views can use it too
+    return {name.strip() for name in request.GET.get('expand', '').split(',') if name.strip()}
+
+
+def fast_path(expand=()):
+    # The compiled row serializers in app.fastpath only cover the plain representation
+    return settings.FAST_READ_PATH and not expand
+
+
+def post_queryset(expand=()):
+    posts = Post.objects.all()
+    if 'author' in expand:
+        posts = posts.select_related('author')
+    return posts
+
+
+def comment_queryset(expand=()):
+    related = []
+    if 'author' in expand:
+        related.append('user')
+    if 'post' in expand:
+        # The embedded post expands its own author too
+        related.append('post__author' if 'author' in expand else 'post')
+    comments = Comment.objects.all()
+    if related:
+        comments = comments.select_related(*related)
+    return comments
+
+
+def render_object(queryset, serializer_class, modified_field):
+    # Used by cached_object_response on a cache miss
+    def render():
+        obj = get_object_or_404(queryset)
+        return JSONRenderer().render(serializer_class(obj).data), getattr(obj, modified_field)
+    return render
+
+
 @api_view(['POST'])
+@throttle_classes([RegisterThrottle])
 def user_register(request):
     serializer = UserRegisterSerializer(data=request.data)
 
@@ -21,8 +89,8 @@ def user_register(request):
 
         try:
             send_code_to_user(user['email'])
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+        except Exception:
+            logger.exception("Failed to queue the verification email")
             return Response({"error": "Email sending failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         return Response({
@@ -34,6 +102,7 @@ def user_register(request):
 
 
 @api_view(['POST'])
+@throttle_classes([LoginThrottle])
 def login_user(request):
     serializer = LoginSerializer(data=request.data)
     
@@ -44,26 +113,49 @@ def login_user(request):
 
 
 @api_view(['POST'])
+@throttle_classes([VerifyEmailThrottle])
 def verify_user_email(request):
     otp_code = request.data.get('otp')
-    if not otp_code:
-        return Response({"message": "Passcode not provided"}, status=status.HTTP_400_BAD_REQUEST)
+    email = request.data.get('email')
+    if not otp_code or not email:
+        return Response({"message": "Email and passcode are required"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        user_code_obj = OneTimePassword.objects.get(code=otp_code)
-        user = user_code_obj.user
+        user, reason = verify_otp(email, otp_code)
+        if reason == 'expired':
+            return Response({"message": "Passcode has expired, request a new one at resend-otp/"}, status=status.HTTP_400_BAD_REQUEST)
+        if reason == 'locked':
+            return Response({"message": "Too many attempts, request a new passcode at resend-otp/"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if user is None:
+            return Response({"message": "Invalid passcode"}, status=status.HTTP_404_NOT_FOUND)
         if not user.is_verified:
             user.is_verified = True
-            user.save()
+            user.save(update_fields=['is_verified'])
             return Response({"message": "Account verified successfully"}, status=status.HTTP_200_OK)
         return Response({"message": "User already verified"}, status=status.HTTP_200_OK)
-    except OneTimePassword.DoesNotExist:
-        return Response({"message": "Invalid passcode"}, status=status.HTTP_404_NOT_FOUND)
-    except Exception as e:
-        print(f"Error during verification: {e}")
+    except Exception:
+        logger.exception("Error during verification")
         return Response({"message": "Something went wrong"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@throttle_classes([ResendOtpThrottle])
+def resend_otp(request):
+    # Replaces the passcode of an account still awaiting verification, e.g. after it expired or was locked
+    email = request.data.get('email')
+    if not email:
+        return Response({"message": "Email is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if User.objects.filter(email=email, is_verified=False).exists():
+        try:
+            send_code_to_user(email)
+        except Exception:
+            logger.exception("Failed to queue the verification email")
+            return Response({"error": "Email sending failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # The same answer for unknown and verified accounts, so this cannot be used to find out which exist
+    return Response({"message": "If the account is awaiting verification, a new passcode has been sent"}, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 def set_new_password(request):
     serializer = SetNewPasswordSerializer(data=request.data)
@@ -75,6 +167,7 @@ def set_new_password(request):
 
 
 @api_view(['POST'])
+@throttle_classes([PasswordResetThrottle])
 def password_reset_request(request):
     serializer = PasswordResetRequestSerializer(data=request.data, context={'request': request})
     serializer.is_valid(raise_exception=True)
@@ -120,23 +213,36 @@ def create_profile(request):
 
     serializer = ProfileSerializer(data=request.data)
     if serializer.is_valid():
-        serializer.save(user=user)
+        profile = serializer.save(user=user)
+        schedule_variants(profile, 'profile_picture', 'picture_variants', 'profile')
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
+@renderer_classes(FAST_RENDERER_CLASSES)
 def view_profile(request,profile_id=None):
     if profile_id:
         #if profile id provided , return specific profile
-        profile =get_object_or_404(Profile, id=profile_id)    
-        serializer = ProfileSerializer(profile)
-    else:
-        profiles  = Profile.objects.all().order_by('id')
-        serializer = ProfileSerializer(profiles, many=True)    
+        profiles = Profile.objects.select_related('user').filter(id=profile_id)
+        return cached_object_response(request, 'profile', profile_id, render_object(profiles, ProfileSerializer, 'updated_at'))
 
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    if fast_path():
+        profiles = Profile.objects.all()
+        if wants_stream(request):
+            return stream_rows(profiles.order_by('id'), PROFILE_ROWS)
+        paginator = KeysetPaginator(ordering=('id',))
+        page = paginator.paginate(request, PROFILE_ROWS.project(profiles))
+        return paginator.get_response(PROFILE_ROWS.many(page))
+
+    profiles  = Profile.objects.select_related('user')
+    if wants_stream(request):
+        return stream_ndjson(profiles.order_by('id'), ProfileSerializer)
+    paginator = KeysetPaginator(ordering=('id',))
+    page = paginator.paginate(request, profiles)
+    serializer = ProfileSerializer(page, many=True)
+    return paginator.get_response(serializer.data)
 
 
 
@@ -166,14 +272,19 @@ def update_profile(request, profile_id):
         return Response({"message": "No changes detected."}, status=status.HTTP_204_NO_CONTENT)
 
     # Use the serializer to update the profile with the new data
+    previous_picture = profile.profile_picture.name
     serializer = ProfileSerializer(profile, data=updated_data, partial=True)
 
     if serializer.is_valid():
         serializer.save()
+        invalidate_object('profile', profile.id)
+        if 'profile_picture' in updated_data:
+            release_media(previous_picture)  # the new upload already holds its own reference
+            schedule_variants(profile, 'profile_picture', 'picture_variants', 'profile')
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     # Handle validation errors
-    print(serializer.errors)  # Log errors for debugging
+    logger.info("Profile %s update rejected: %s", profile_id, serializer.errors)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -192,18 +303,25 @@ def creating_post(request):
     if serializer.is_valid():
         validated_data = serializer.validated_data
 
-        # Checking for existing posts with the same details
-        existing_posts = Post.objects.filter(
-            image=validated_data['image'],
-            content=validated_data['content'],
-        ).exists()
+        # Checking for existing posts with the same details (index probe on author + content_hash)
+        content_hash = Post.compute_content_hash(validated_data['content'], validated_data.get('image'))
+        existing_posts = Post.objects.filter(author=request.user, content_hash=content_hash).exists()
 
         # If a duplicate exists, throw an error
         if existing_posts:
             return Response({"error": "A Post with these details already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Saving the Post with the current authenticated user as the author
-        serializer.save(author=request.user)
+        post = serializer.save(author=request.user)
+        adjust_counters(User, request.user.id, post_count=1)
+        invalidate_category_pages(post.categories)
+        invalidate_profiles_of(request.user.id)
+
+        # Push the new post into the home feed of every follower
+        fan_out_post(post)
+
+        # Resize the image off the request thread
+        schedule_variants(post, 'image', 'image_variants', 'post')
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -213,18 +331,87 @@ def creating_post(request):
 
 
 @api_view(['GET'])
+@renderer_classes(FAST_RENDERER_CLASSES)
 def list_posts(request,post_id=None):
-    if post_id:
+    expand = requested_expansions(request)
+    if post_id and not expand:
+        posts = Post.objects.filter(id=post_id)
+        return cached_object_response(request, 'post', post_id, render_object(posts, PostSerializer, 'updated_at'))
+    elif post_id:
         #if post id provided , return specific profile
-        post =get_object_or_404(Post, id=post_id)    
-        serializer = PostSerializer(post)
+        post =get_object_or_404(post_queryset(expand), id=post_id)    
+        serializer = PostSerializer(post, context={'expand': expand})
+    elif 'category' in request.query_params or 'since' in request.query_params:
+        return list_posts_by_category(request, expand)
     else:
-        posts  = Post.objects.all().order_by('id')
-        serializer = PostSerializer(posts, many=True)    
+        posts  = post_queryset(expand)
+        if wants_stream(request):
+            if fast_path(expand):
+                return stream_rows(posts.order_by('id'), POST_ROWS)
+            return stream_ndjson(posts.order_by('id'), PostSerializer, context={'expand': expand})
+        paginator = KeysetPaginator(ordering=('id',))
+        if fast_path(expand):
+            page = paginator.paginate(request, POST_ROWS.project(posts))
+            return paginator.get_response(POST_ROWS.many(page))
+        page = paginator.paginate(request, posts)
+        serializer = PostSerializer(page, many=True, context={'expand': expand})
+        return paginator.get_response(serializer.data)
 
     return Response(serializer.data, status=status.HTTP_200_OK)  
 
 
+def newest_posts_query(params, expand):
+    """
+    Parses ?category and ?since for the newest first listing, shared with the async view.
+
+    Returns (error, posts, cache_category): error is the message of a 400
+    response, and cache_category is set only when the request is for the
+    plain newest page of a category, the one page that is cached.
+    """
+    category = params.get('category')
+    if category is not None and category not in dict(Post.CATEGORY_CHOICES):
+        return "Unknown category", None, None
+
+    since = params.get('since')
+    since_value = parse_datetime(since) if since else None
+    if since and since_value is None:
+        return "since must be an ISO 8601 datetime", None, None
+
+    posts = post_queryset(expand)
+    if category:
+        posts = posts.filter(categories=category)
+    if since_value:
+        posts = posts.filter(created_at__gte=since_value)
+
+    # Only the plain newest page of a category is cached, everything else goes to the database
+    cacheable = category and not since and not expand and not set(params) - {'category'}
+    return None, posts, category if cacheable else None
+
+
+def list_posts_by_category(request, expand):
+    # Newest first, served by the (categories, created_at, id) index
+    error, posts, cache_category = newest_posts_query(request.query_params, expand)
+    if error:
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPaginator(ordering=('-created_at', '-id'))
+    if cache_category:
+        cached = get_category_page(cache_category)
+        if cached is not None:
+            results, next_cursor = cached
+            paginator.restore(request, next_cursor)
+            return paginator.get_response(results)
+
+    if fast_path(expand):
+        results = POST_ROWS.many(paginator.paginate(request, POST_ROWS.project(posts)))
+    else:
+        page = paginator.paginate(request, posts)
+        results = PostSerializer(page, many=True, context={'expand': expand}).data
+    if cache_category:
+        set_category_page(cache_category, results, paginator.next_cursor)
+    return paginator.get_response(results)
+
+
 @api_view(['PUT'])
 def update_posts(request, post_id):
     # Find the post in the database using post_id
@@ -238,12 +425,26 @@ def update_posts(request, post_id):
     partial = request.method == "PATCH"
     
     # Pass the existing post and new data to the serializer
+    previous_category = post.categories
+    previous_image = post.image.name
     serializer = PostSerializer(post, data=request.data, partial=partial)
     
     # Check if the provided data is valid
     if serializer.is_valid():
         # Save the updated post to the database
-        serializer.save()
+        try:
+            serializer.save()
+        except IntegrityError:
+            # The edit made it identical to another post by the same author. The new
+            # image was already stored, with a reference this post will never hold
+            if serializer.validated_data.get('image'):
+                release_media(post.image.name)
+            return Response({"error": "A Post with these details already exists"}, status=status.HTTP_400_BAD_REQUEST)
+        invalidate_category_pages(previous_category, post.categories)
+        invalidate_object('post', post.id)
+        if 'image' in serializer.validated_data:
+            release_media(previous_image)
+            schedule_variants(post, 'image', 'image_variants', 'post')
         # Respond with updated post data and a success message
         return Response({"message": "Post updated successfully", "data": serializer.data}, status=status.HTTP_200_OK)
     
@@ -255,7 +456,14 @@ def update_posts(request, post_id):
 def delete_post(request, post_id):
     try:
         post = Post.objects.get(pk=post_id)
+        comment_ids = list(post.comments.values_list('id', flat=True))  # deleted with the post by the cascade
         post.delete()
+        adjust_counters(User, post.author_id, post_count=-1)
+        invalidate_category_pages(post.categories)
+        invalidate_object('post', post_id)
+        invalidate_object('comment', *comment_ids)
+        invalidate_profiles_of(post.author_id)
+        release_media(post.image.name)  # deletes the file once no other post or profile uses it
         return Response({"message": "Post deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
     except Post.DoesNotExist:
         return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -282,6 +490,8 @@ def post_comment(request, post_id):
     if serializer.is_valid():
         # Save the comment to the database
         serializer.save()
+        adjust_counters(Post, post.id, comment_count=1)
+        invalidate_object('post', post.id)
         return Response({"message": "Comment posted successfully", "data": serializer.data}, status=status.HTTP_201_CREATED)
     
     return Response({"error": "Invalid data", "details": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -289,24 +499,86 @@ def post_comment(request, post_id):
 
 
 @api_view(['GET'])
+@renderer_classes(FAST_RENDERER_CLASSES)
 def list_comments(request,comment_id=None):
-    if comment_id:
+    expand = requested_expansions(request)
+    if comment_id and not expand:
+        comments = Comment.objects.filter(id=comment_id)
+        # Comments cannot be edited, so creation time is their last modification
+        return cached_object_response(request, 'comment', comment_id, render_object(comments, CommentSerializer, 'created_at'))
+    elif comment_id:
         #if comment id provided , return specific profile
-        comment =get_object_or_404(Comment, id=comment_id)    
-        serializer = CommentSerializer(comment)
+        comment =get_object_or_404(comment_queryset(expand), id=comment_id)    
+        serializer = CommentSerializer(comment, context={'expand': expand})
     else:
-        comments  = Comment.objects.all().order_by('id')
-        serializer = CommentSerializer(comments, many=True)    
+        comments  = comment_queryset(expand)
+        if wants_stream(request):
+            if fast_path(expand):
+                return stream_rows(comments.order_by('id'), COMMENT_ROWS)
+            return stream_ndjson(comments.order_by('id'), CommentSerializer, context={'expand': expand})
+        paginator = KeysetPaginator(ordering=('id',))
+        if fast_path(expand):
+            page = paginator.paginate(request, COMMENT_ROWS.project(comments))
+            return paginator.get_response(COMMENT_ROWS.many(page))
+        page = paginator.paginate(request, comments)
+        serializer = CommentSerializer(page, many=True, context={'expand': expand})
+        return paginator.get_response(serializer.data)
 
     return Response(serializer.data, status=status.HTTP_200_OK)  
     
 
+@api_view(['GET'])
+@renderer_classes(FAST_RENDERER_CLASSES)
+def post_comments(request, post_id):
+    # Comments of one post, oldest first, paged on the (post, created_at, id) index
+    get_object_or_404(Post.objects.only('id'), id=post_id)
+    expand = requested_expansions(request)
+    comments = comment_queryset(expand).filter(post_id=post_id)
+    paginator = KeysetPaginator(ordering=('created_at', 'id'))
+    if fast_path(expand):
+        page = paginator.paginate(request, COMMENT_ROWS.project(comments))
+        return paginator.get_response(COMMENT_ROWS.many(page))
+    page = paginator.paginate(request, comments)
+    serializer = CommentSerializer(page, many=True, context={'expand': expand})
+    return paginator.get_response(serializer.data)
+
+
+@api_view(['GET'])
+def comment_previews(request):
+    # First `limit` comments of each post in ?post_ids=1,2,3, for rendering a feed page
+    try:
+        post_ids = sorted({int(value) for value in request.query_params.get('post_ids', '').split(',') if value.strip()})
+        limit = int(request.query_params.get('limit', settings.COMMENT_PREVIEW_SIZE))
+    except ValueError:
+        return Response({"error": "post_ids and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    if not post_ids or len(post_ids) > settings.MAX_PAGE_SIZE:
+        return Response({"error": f"Provide between 1 and {settings.MAX_PAGE_SIZE} post_ids"}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.PAGE_SIZE))
+
+    # ROW_NUMBER() per post keeps this to one query however many posts are asked for
+    position = Window(RowNumber(), partition_by=[F('post_id')], order_by=[F('created_at').asc(), F('id').asc()])
+    comments = (
+        Comment.objects.filter(post_id__in=post_ids)
+        .annotate(position=position)
+        .filter(position__lte=limit)
+        .order_by('post_id', 'position')
+    )
+
+    previews = {str(post_id): [] for post_id in post_ids}
+    for comment in CommentSerializer(comments, many=True).data:
+        previews[str(comment['post'])].append(comment)
+    return Response(previews, status=status.HTTP_200_OK)
+
+
 @api_view(['DELETE'])
 def  delete_comment(request,comment_id):
 
     try:
         comment = Comment.objects.get(pk=comment_id)
         comment.delete()
+        adjust_counters(Post, comment.post_id, comment_count=-1)
+        invalidate_object('comment', comment_id)
+        invalidate_object('post', comment.post_id)
         return Response({"message","comment deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
     except Comment.DoesNotExist:
         return Response({"error","comment not found"}, status=status.HTTP_400_BAD_REQUEST)
@@ -315,6 +587,12 @@ def  delete_comment(request,comment_id):
 
 
 
+def lock_follows_of(user_id):
+    # Follow changes by one user take turns on their user row (until the transaction
+    # commits), so the pairs each one reads are still as read when it writes and counts them
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def follow_user(request, user_id):
@@ -324,12 +602,20 @@ def follow_user(request, user_id):
         if request.user == following_user:
             return Response({"detail": "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check if the follow relationship already exists
-        if Follow.objects.filter(follower=request.user, following=following_user).exists():
-            return Response({"detail": "You are already following this user."}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Create the follow relationship
-        Follow.objects.create(follower=request.user, following=following_user)
+        with transaction.atomic():
+            lock_follows_of(request.user.id)
+            # Check if the follow relationship already exists
+            if Follow.objects.filter(follower=request.user, following=following_user).exists():
+                return Response({"detail": "You are already following this user."}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Create the follow relationship
+            Follow.objects.create(follower=request.user, following=following_user)
+            adjust_counters(User, request.user.id, following_count=1)
+            adjust_counters(User, following_user.id, follower_count=1)
+        invalidate_profiles_of(request.user.id, following_user.id)
+        backfill_timeline(request.user.id, [following_user.id])
+        forget_suggestions(request.user.id, [following_user.id])
+        mark_stale(request.user.id)
         return Response({"detail": f"You are now following {following_user.email}"}, status=status.HTTP_201_CREATED)
     
     except User.DoesNotExist:
@@ -342,30 +628,195 @@ def unfollow_user(request, user_id):
     try:
         following_user = User.objects.get(id=user_id)
 
-        # Checking if the follow relationship exists
-        follow_instance = Follow.objects.filter(follower=request.user, following=following_user).first()
-        if not follow_instance:
-            return Response({"detail": "You are not following this user."}, status=status.HTTP_400_BAD_REQUEST)
-          
-        # Delete the follow relationship
-        follow_instance.delete()
+        with transaction.atomic():
+            lock_follows_of(request.user.id)
+            # Delete the follow relationship, counting only a row this request removed
+            deleted, _ = Follow.objects.filter(follower=request.user, following=following_user).delete()
+            if not deleted:
+                return Response({"detail": "You are not following this user."}, status=status.HTTP_400_BAD_REQUEST)
+            adjust_counters(User, request.user.id, following_count=-1)
+            adjust_counters(User, following_user.id, follower_count=-1)
+        invalidate_profiles_of(request.user.id, following_user.id)
+        prune_timeline(request.user.id, [following_user.id])
+        mark_stale(request.user.id)
         return Response({"detail": f"You have unfollowed {following_user.email}"}, status=status.HTTP_204_NO_CONTENT)
     
     except User.DoesNotExist:
         return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_follow(request):
+    serializer = UserIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    requested = set(serializer.validated_data['user_ids']) - {request.user.id}
+
+    with transaction.atomic():
+        # The counters are raised by the pairs read here
+        lock_follows_of(request.user.id)
+
+        # One query tells which ids exist and which are already followed
+        already_followed = Follow.objects.filter(follower=request.user, following=OuterRef('pk'))
+        found = dict(User.objects.filter(id__in=requested).annotate(followed=Exists(already_followed)).values_list('id', 'followed'))
+        new_ids = [user_id for user_id, followed in found.items() if not followed]
+        if new_ids:
+            Follow.objects.bulk_create(
+                [Follow(follower=request.user, following_id=user_id) for user_id in new_ids], ignore_conflicts=True
+            )
+            adjust_counters(User, request.user.id, following_count=len(new_ids))
+            adjust_counters_bulk(User, new_ids, follower_count=1)
+
+    if new_ids:
+        backfill_timeline(request.user.id, new_ids)
+        invalidate_profiles_of(request.user.id, *new_ids)
+        forget_suggestions(request.user.id, new_ids)
+        mark_stale(request.user.id)
+
+    return Response({
+        "followed": sorted(new_ids),
+        "already_following": sorted(user_id for user_id, followed in found.items() if followed),
+        "not_found": sorted(requested - set(found)),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def bulk_unfollow(request):
+    serializer = UserIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    requested = set(serializer.validated_data['user_ids'])
+
+    with transaction.atomic():
+        # The counters are lowered by the pairs read here
+        lock_follows_of(request.user.id)
+        follows = Follow.objects.filter(follower=request.user, following_id__in=requested)
+        unfollowed = list(follows.values_list('following_id', flat=True))
+        if unfollowed:
+            Follow.objects.filter(follower=request.user, following_id__in=unfollowed).delete()
+            adjust_counters(User, request.user.id, following_count=-len(unfollowed))
+            adjust_counters_bulk(User, unfollowed, follower_count=-1)
+
+    if unfollowed:
+        prune_timeline(request.user.id, unfollowed)
+        invalidate_profiles_of(request.user.id, *unfollowed)
+        mark_stale(request.user.id)
+
+    return Response({
+        "unfollowed": sorted(unfollowed),
+        "not_following": sorted(requested - set(unfollowed)),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def relationships(request):
+    # For each id: do I follow them, do they follow me
+    serializer = UserIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    requested = set(serializer.validated_data['user_ids'])
+
+    # Both directions in one round trip, each side served by a (follower, following) / (following, follower) index
+    outgoing = Follow.objects.filter(follower=request.user, following_id__in=requested).annotate(
+        direction=Value('following', output_field=CharField())).values_list('following_id', 'direction')
+    incoming = Follow.objects.filter(following=request.user, follower_id__in=requested).annotate(
+        direction=Value('followed_by', output_field=CharField())).values_list('follower_id', 'direction')
+
+    result = {str(user_id): {"following": False, "followed_by": False} for user_id in sorted(requested)}
+    for user_id, direction in outgoing.union(incoming, all=True):
+        result[str(user_id)][direction] = True
+    return Response(result, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(FAST_RENDERER_CLASSES)
 def get_followers(request):
     followers = Follow.objects.filter(following=request.user)
+    if fast_path():
+        return Response(FOLLOW_ROWS.many(FOLLOW_ROWS.project(followers)), status=status.HTTP_200_OK)
     serializer = FollowSerializer(followers, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(FAST_RENDERER_CLASSES)
 def get_following(request):
     following = Follow.objects.filter(follower=request.user)
+    if fast_path():
+        return Response(FOLLOW_ROWS.many(FOLLOW_ROWS.project(following)), status=status.HTTP_200_OK)
     serializer = FollowSerializer(following, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def suggestions(request):
+    # Who to follow, best first; computed ahead of time by `manage.py refresh_suggestions`
+    try:
+        limit = int(request.query_params.get('limit', settings.SUGGESTION_COUNT))
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, settings.SUGGESTION_COUNT))
+    rows = FollowSuggestion.objects.filter(user=request.user).select_related('suggested').order_by('rank')[:limit]
+    serializer = FollowSuggestionSerializer(rows, many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def feed(request):
+    # Posts from accounts the user follows, newest first
+    expand = requested_expansions(request)
+    paginator = KeysetPaginator(ordering=('-created_at', '-id'))
+    page = feed_page(request, paginator, post_queryset(expand))
+    serializer = PostSerializer(page, many=True, context={'expand': expand})
+    return paginator.get_response(serializer.data)
+
+
+@api_view(['GET'])
+def search(request):
+    # Keyword search over post titles/content and comments, best match first
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"error": "Query parameter q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    kind = request.query_params.get('type')
+    if kind is not None and kind not in KINDS:
+        return Response({"error": "type must be post or comment"}, status=status.HTTP_400_BAD_REQUEST)
+    kinds = (kind,) if kind else KINDS
+
+    try:
+        limit = min(max(int(request.query_params.get('limit', settings.PAGE_SIZE)), 1), settings.MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    hits = get_search_backend().search(query, kinds, limit)
+    found = {
+        'post': Post.objects.in_bulk([pk for hit_kind, pk, _ in hits if hit_kind == 'post']),
+        'comment': Comment.objects.in_bulk([pk for hit_kind, pk, _ in hits if hit_kind == 'comment']),
+    }
+    serializers = {'post': PostSerializer, 'comment': CommentSerializer}
+
+    results = []
+    for hit_kind, pk, score in hits:
+        obj = found[hit_kind].get(pk)
+        if obj is None:
+            continue  # deleted after it was indexed
+        results.append({'type': hit_kind, 'score': round(float(score), 4), 'data': serializers[hit_kind](obj).data})
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_status(request):
+    # Connection pool counters of the worker process that served this request
+    return Response({'pid': os.getpid(), 'pools': pool_stats()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    # Request, SQL and connection pool metrics of this worker process, for Prometheus to scrape
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')